@@ -17,15 +17,53 @@ CREATE TABLE IF NOT EXISTS DIM_CITY (
     NB_INHABITANTS INTEGER
 );
 
-DROP TABLE FACT_STATION_STATEMENT;
 CREATE TABLE IF NOT EXISTS FACT_STATION_STATEMENT (
     STATION_ID VARCHAR NOT NULL,
     CITY_ID VARCHAR NOT NULL,
     BICYCLE_DOCKS_AVAILABLE INTEGER,
     BICYCLE_AVAILABLE INTEGER,
-    LAST_STATEMENT_DATE DATE,
+    LAST_STATEMENT_DATE TIMESTAMP,
     CREATED_DATE DATE DEFAULT current_date,
-    PRIMARY KEY (STATION_ID, CITY_ID, CREATED_DATE),
+    SNAPSHOT_TS TIMESTAMP NOT NULL,
+    PRIMARY KEY (STATION_ID, CITY_ID, SNAPSHOT_TS),
     FOREIGN KEY (STATION_ID) REFERENCES DIM_STATION (ID),
     FOREIGN KEY (CITY_ID) REFERENCES DIM_CITY (ID)
 );
+
+CREATE TABLE IF NOT EXISTS ROLLUP_CITY_SNAPSHOT (
+    CITY_ID VARCHAR NOT NULL,
+    SNAPSHOT_TS TIMESTAMP NOT NULL,
+    CREATED_DATE DATE NOT NULL,
+    NB_STATIONS INTEGER,
+    SUM_BICYCLE_DOCKS_AVAILABLE BIGINT,
+    SUM_BICYCLE_AVAILABLE BIGINT,
+    PRIMARY KEY (CITY_ID, SNAPSHOT_TS)
+);
+
+CREATE TABLE IF NOT EXISTS ROLLUP_STATION_DAILY (
+    STATION_ID VARCHAR NOT NULL,
+    CREATED_DATE DATE NOT NULL,
+    CITY_ID VARCHAR,
+    COUNT_BICYCLE_AVAILABLE BIGINT,
+    SUM_BICYCLE_AVAILABLE BIGINT,
+    COUNT_BICYCLE_DOCKS_AVAILABLE BIGINT,
+    SUM_BICYCLE_DOCKS_AVAILABLE BIGINT,
+    PRIMARY KEY (STATION_ID, CREATED_DATE)
+);
+
+CREATE TABLE IF NOT EXISTS ROLLUP_STATION_TOTAL (
+    STATION_ID VARCHAR PRIMARY KEY,
+    CITY_ID VARCHAR,
+    COUNT_BICYCLE_AVAILABLE BIGINT,
+    SUM_BICYCLE_AVAILABLE BIGINT,
+    COUNT_BICYCLE_DOCKS_AVAILABLE BIGINT,
+    SUM_BICYCLE_DOCKS_AVAILABLE BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS ETL_WATERMARK (
+    TARGET_TABLE VARCHAR NOT NULL,
+    SOURCE_TABLE VARCHAR NOT NULL,
+    PARTITION_KEY VARCHAR NOT NULL,
+    HIGH_WATER_MARK TIMESTAMP NOT NULL,
+    PRIMARY KEY (TARGET_TABLE, SOURCE_TABLE, PARTITION_KEY)
+);
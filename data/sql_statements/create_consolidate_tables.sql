@@ -1,4 +1,3 @@
-DROP TABLE CONSOLIDATE_STATION;
 CREATE TABLE IF NOT EXISTS CONSOLIDATE_STATION  (
     ID VARCHAR NOT NULL,
     CODE VARCHAR NOT NULL,
@@ -13,7 +12,13 @@ CREATE TABLE IF NOT EXISTS CONSOLIDATE_STATION  (
     CAPACITTY INTEGER,
     PRIMARY KEY (ID, CREATED_DATE)
 );
-DROP TABLE CONSOLIDATE_CITY ;
+CREATE TABLE IF NOT EXISTS STATION_KEY_REGISTRY (
+    SOURCE VARCHAR NOT NULL,
+    CODE VARCHAR NOT NULL,
+    ID VARCHAR NOT NULL UNIQUE,
+    CREATED_AT TIMESTAMP,
+    PRIMARY KEY (SOURCE, CODE)
+);
 CREATE TABLE IF NOT EXISTS CONSOLIDATE_CITY (
     ID VARCHAR,
     NAME VARCHAR,
@@ -21,13 +26,98 @@ CREATE TABLE IF NOT EXISTS CONSOLIDATE_CITY (
     CREATED_DATE VARCHAR,
     PRIMARY KEY (ID, CREATED_DATE)
 );
+CREATE TABLE IF NOT EXISTS REFERENCE_DATA (
+    NAME VARCHAR PRIMARY KEY,
+    SHA256 VARCHAR NOT NULL,
+    CREATED_DATE VARCHAR,
+    LOADED_AT TIMESTAMP
+);
 
-DROP TABLE CONSOLIDATE_STATION_STATEMENT ;
 CREATE TABLE IF NOT EXISTS CONSOLIDATE_STATION_STATEMENT (
     STATION_ID VARCHAR NOT NULL,
     BICYCLE_DOCKS_AVAILABLE INTEGER,
     BICYCLE_AVAILABLE INTEGER,
-    LAST_STATEMENT_DATE DATE,
+    LAST_STATEMENT_DATE TIMESTAMP,
     CREATED_DATE VARCHAR,
-    PRIMARY KEY (STATION_ID, CREATED_DATE)
+    SNAPSHOT_TS TIMESTAMP NOT NULL,
+    PRIMARY KEY (STATION_ID, SNAPSHOT_TS)
+);
+
+CREATE TABLE IF NOT EXISTS STATION_STATEMENT_INTERVAL (
+    STATION_ID VARCHAR NOT NULL,
+    SOURCE VARCHAR NOT NULL,
+    BICYCLE_DOCKS_AVAILABLE INTEGER,
+    BICYCLE_AVAILABLE INTEGER,
+    LAST_STATEMENT_DATE TIMESTAMP,
+    VALID_FROM TIMESTAMP NOT NULL,
+    VALID_TO TIMESTAMP,
+    PRIMARY KEY (STATION_ID, VALID_FROM)
+);
+
+CREATE TABLE IF NOT EXISTS STATION_STATEMENT_DELTA (
+    SOURCE VARCHAR PRIMARY KEY,
+    LAST_SNAPSHOT_TS TIMESTAMP NOT NULL,
+    UPDATED_AT TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS CURRENT_STATION_STATE (
+    STATION_ID VARCHAR PRIMARY KEY,
+    SOURCE VARCHAR,
+    CITY_ID VARCHAR,
+    CAPACITTY INTEGER,
+    BICYCLE_DOCKS_AVAILABLE INTEGER,
+    BICYCLE_AVAILABLE INTEGER,
+    LAST_STATEMENT_DATE TIMESTAMP,
+    SNAPSHOT_TS TIMESTAMP NOT NULL,
+    UPDATED_AT TIMESTAMP
+);
+
+CREATE OR REPLACE MACRO STATION_STATEMENT_AS_OF(timestamps) AS TABLE
+    SELECT
+        i.STATION_ID,
+        i.BICYCLE_DOCKS_AVAILABLE,
+        i.BICYCLE_AVAILABLE,
+        i.LAST_STATEMENT_DATE,
+        CAST(CAST(t.SNAPSHOT_TS AS DATE) AS VARCHAR) AS CREATED_DATE,
+        t.SNAPSHOT_TS
+    FROM (SELECT CAST(unnest(timestamps) AS TIMESTAMP) AS SNAPSHOT_TS) t
+    JOIN STATION_STATEMENT_INTERVAL i
+        ON i.VALID_FROM <= t.SNAPSHOT_TS AND (i.VALID_TO IS NULL OR i.VALID_TO > t.SNAPSHOT_TS);
+
+CREATE TABLE IF NOT EXISTS QUARANTINE_STATION_STATEMENT (
+    SOURCE VARCHAR,
+    CODE VARCHAR,
+    STATION_ID VARCHAR,
+    BICYCLE_DOCKS_AVAILABLE VARCHAR,
+    BICYCLE_AVAILABLE VARCHAR,
+    CAPACITTY INTEGER,
+    LAST_STATEMENT_DATE TIMESTAMP,
+    CREATED_DATE VARCHAR,
+    SNAPSHOT_TS TIMESTAMP NOT NULL,
+    REASONS VARCHAR[],
+    REJECTED BOOLEAN,
+    QUARANTINED_AT TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS DATA_QUALITY_METRICS (
+    SNAPSHOT_TS TIMESTAMP NOT NULL,
+    SOURCE VARCHAR NOT NULL,
+    METRIC VARCHAR NOT NULL,
+    NB_ROWS BIGINT,
+    UPDATED_AT TIMESTAMP,
+    PRIMARY KEY (SNAPSHOT_TS, SOURCE, METRIC)
+);
+
+CREATE TABLE IF NOT EXISTS BACKFILL_PARTITION (
+    PARTITION_NAME VARCHAR PRIMARY KEY,
+    FINGERPRINT VARCHAR NOT NULL,
+    LOADED_AT TIMESTAMP,
+    DURATION_SECONDS DOUBLE
+);
+
+CREATE TABLE IF NOT EXISTS ETL_PARTITION (
+    TABLE_NAME VARCHAR NOT NULL,
+    PARTITION_KEY VARCHAR NOT NULL,
+    UPDATED_AT TIMESTAMP NOT NULL,
+    PRIMARY KEY (TABLE_NAME, PARTITION_KEY)
 );
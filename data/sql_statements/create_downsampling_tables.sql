@@ -0,0 +1,31 @@
+CREATE TABLE IF NOT EXISTS STATION_STATEMENT_HOURLY (
+    STATION_ID VARCHAR NOT NULL,
+    CITY_ID VARCHAR,
+    BUCKET_TS TIMESTAMP NOT NULL,
+    NB_STATEMENTS INTEGER,
+    MIN_BICYCLE_AVAILABLE INTEGER,
+    MAX_BICYCLE_AVAILABLE INTEGER,
+    AVG_BICYCLE_AVAILABLE DOUBLE,
+    MIN_BICYCLE_DOCKS_AVAILABLE INTEGER,
+    MAX_BICYCLE_DOCKS_AVAILABLE INTEGER,
+    AVG_BICYCLE_DOCKS_AVAILABLE DOUBLE,
+    EMPTY_RATIO DOUBLE,
+    FULL_RATIO DOUBLE,
+    PRIMARY KEY (STATION_ID, BUCKET_TS)
+);
+
+CREATE TABLE IF NOT EXISTS STATION_STATEMENT_DAILY (
+    STATION_ID VARCHAR NOT NULL,
+    CITY_ID VARCHAR,
+    BUCKET_DATE DATE NOT NULL,
+    NB_STATEMENTS INTEGER,
+    MIN_BICYCLE_AVAILABLE INTEGER,
+    MAX_BICYCLE_AVAILABLE INTEGER,
+    AVG_BICYCLE_AVAILABLE DOUBLE,
+    MIN_BICYCLE_DOCKS_AVAILABLE INTEGER,
+    MAX_BICYCLE_DOCKS_AVAILABLE INTEGER,
+    AVG_BICYCLE_DOCKS_AVAILABLE DOUBLE,
+    EMPTY_RATIO DOUBLE,
+    FULL_RATIO DOUBLE,
+    PRIMARY KEY (STATION_ID, BUCKET_DATE)
+);
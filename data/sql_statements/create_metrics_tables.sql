@@ -0,0 +1,15 @@
+CREATE TABLE IF NOT EXISTS PIPELINE_RUN_METRICS (
+    RUN_ID VARCHAR NOT NULL,
+    STAGE_INDEX INTEGER NOT NULL,
+    STAGE VARCHAR NOT NULL,
+    SNAPSHOT_TS TIMESTAMP,
+    STARTED_AT TIMESTAMP,
+    STATUS VARCHAR,
+    WALL_SECONDS DOUBLE,
+    CPU_SECONDS DOUBLE,
+    ROWS_READ BIGINT,
+    ROWS_WRITTEN BIGINT,
+    BYTES_DOWNLOADED BIGINT,
+    PEAK_RSS_MB DOUBLE,
+    PRIMARY KEY (RUN_ID, STAGE_INDEX)
+);
@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS STAGE_FINGERPRINT (
+    STAGE VARCHAR NOT NULL,
+    PARTITION_KEY VARCHAR NOT NULL,
+    FINGERPRINT VARCHAR NOT NULL,
+    UPDATED_AT TIMESTAMP,
+    PRIMARY KEY (STAGE, PARTITION_KEY)
+);
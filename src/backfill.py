@@ -0,0 +1,216 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import pandas as pd
+
+import data_quality
+from data_consolidation import (
+    create_consolidate_tables,
+    insert_stations,
+    insert_station_statements,
+    normalize_city_data,
+    normalize_stations,
+    normalize_statements,
+)
+from feed_adapters import FEED_ADAPTERS
+from pipeline_context import DUCKDB_PATH, RAW_DATA_DIR, PipelineContext
+from raw_store import RawStore
+from snapshot_cache import SnapshotCache
+import utils
+
+
+def partition_date(partition: str) -> date:
+    """Date d'une partition (`<date>` ou `<date>/<%H%M%S>`)."""
+    return date.fromisoformat(partition.split("/")[0])
+
+
+def partition_snapshot_ts(partition: str) -> datetime:
+    """Horodatage du snapshot d'une partition (minuit pour une partition quotidienne)."""
+    if "/" in partition:
+        return datetime.strptime(partition, "%Y-%m-%d/%H%M%S")
+    return datetime.combine(partition_date(partition), datetime.min.time())
+
+
+def partition_fingerprint(store: RawStore, partition: str) -> str:
+    """Empreinte d'une partition : hash des noms et contenus de tous ses fichiers."""
+    sha256 = hashlib.sha256()
+    for file_name in store.files(partition):
+        sha256.update(f"{file_name}:{store.content_hash(partition, file_name)}\n".encode())
+    return sha256.hexdigest()
+
+
+def discover_partitions(store: RawStore) -> dict:
+    """Partitions de `data/raw_data` regroupées par date, dans l'ordre chronologique."""
+    partitions_by_date = {}
+    for partition in store.partitions():
+        partitions_by_date.setdefault(partition.split("/")[0], []).append(partition)
+    return partitions_by_date
+
+
+def normalize_date(raw_data_dir: str, day: str, partitions: list) -> dict:
+    """
+    Parse et normalise toutes les partitions d'une date (exécuté dans un processus du pool).
+
+    - Toutes les villes du registre `FEED_ADAPTERS` sont normalisées ensemble (un DataFrame par table).
+    - Les stations sont consolidées à partir de la première partition de la journée, comme en mode polling.
+    - Les relevés de chaque partition gardent le code station : leur ID est résolu au chargement (`load_date`).
+    - Les fichiers absents d'une partition (ex. pas de données Nantes avant le 15/11) sont ignorés.
+    - Retourne les DataFrames prêts à être chargés et la durée du traitement.
+    """
+    started_at = time.perf_counter()
+    store = RawStore(raw_data_dir)
+    cache = SnapshotCache()
+    created_date = date.fromisoformat(day)
+
+    def load(city, partition, file_name):
+        path = store.resolve(partition, file_name)
+        if not os.path.exists(path):
+            return None
+        return cache.load(city, partition, path)
+
+    city_frames = []
+    station_snapshots = {}
+    statement_frames = []
+
+    for partition in partitions:
+        snapshot_ts = partition_snapshot_ts(partition)
+
+        communes = load("communes", partition, "communes_data.json")
+        if communes is not None and not city_frames:
+            city_frames.append(normalize_city_data(communes, created_date))
+
+        statement_snapshots = {}
+        for source, adapter in FEED_ADAPTERS.items():
+            realtime = load(source, partition, adapter["realtime"]["file_name"])
+            if realtime is None:
+                continue
+            if source not in station_snapshots:
+                if adapter["localisation"] is None:
+                    station_snapshots[source] = {"realtime": realtime}
+                else:
+                    localisation = load(source, partition, adapter["localisation"]["file_name"])
+                    if localisation is not None:
+                        station_snapshots[source] = {"realtime": realtime, "localisation": localisation}
+            if source in station_snapshots:
+                statement_snapshots[source] = {"realtime": realtime}
+        if statement_snapshots:
+            statement_frames.append(normalize_statements(statement_snapshots, created_date, snapshot_ts))
+
+    return {
+        "day": day,
+        "partitions": partitions,
+        "city": pd.concat(city_frames, ignore_index = True) if city_frames else None,
+        "station": normalize_stations(station_snapshots, created_date) if station_snapshots else None,
+        "statement": pd.concat(statement_frames, ignore_index = True) if statement_frames else None,
+        "duration": time.perf_counter() - started_at,
+    }
+
+
+def load_date(ctx, result: dict, fingerprints: dict):
+    """
+    Charge les DataFrames d'une date dans les tables CONSOLIDATE_* (seul processus écrivain).
+
+    - `INSERT OR REPLACE` : recharger une date déjà chargée donne le même résultat.
+    - Les IDs des stations sont résolus ici, dans le registre STATION_KEY_REGISTRY (les processus de parsing n'y accèdent pas).
+    - Les partitions écrites sont signalées dans ETL_PARTITION pour les agrégations incrémentales.
+    - Les partitions chargées sont enregistrées dans BACKFILL_PARTITION avec leur empreinte,
+      dans la même transaction (un arrêt brutal ne laisse pas de date à moitié marquée).
+    """
+    con = ctx.con
+    city_data_df = result["city"]
+
+    if city_data_df is not None:
+        ctx.record(rows_written = con.execute("INSERT OR REPLACE INTO CONSOLIDATE_CITY SELECT * FROM city_data_df;").fetchone()[0])
+        utils.mark_partition(con, "CONSOLIDATE_CITY", result["day"])
+
+    station_data_df = result["station"]
+    if station_data_df is not None:
+        ctx.record(rows_written = insert_stations(con, station_data_df))
+        utils.mark_partition(con, "CONSOLIDATE_STATION", result["day"])
+
+    station_statement_df = result["statement"]
+    if station_statement_df is not None:
+        for snapshot_ts in station_statement_df["SNAPSHOT_TS"].drop_duplicates():
+            data_quality.clear_snapshot(con, snapshot_ts.to_pydatetime(), list(FEED_ADAPTERS))
+        ctx.record(rows_written = insert_station_statements(con, station_statement_df))
+        for snapshot_ts in station_statement_df["SNAPSHOT_TS"].drop_duplicates():
+            utils.mark_partition(con, "CONSOLIDATE_STATION_STATEMENT", snapshot_ts.to_pydatetime())
+
+    duration = result["duration"] / len(result["partitions"])
+    for partition in result["partitions"]:
+        con.execute(
+            "INSERT OR REPLACE INTO BACKFILL_PARTITION VALUES (?, ?, current_localtimestamp(), ?);",
+            [partition, fingerprints[partition], duration],
+        )
+
+
+def backfill(raw_data_dir: str = RAW_DATA_DIR, duckdb_path: str = DUCKDB_PATH, max_workers: int = None, force: bool = False, days: list = None):
+    """
+    Rattrape l'historique de toutes les partitions de `data/raw_data` dans les tables CONSOLIDATE_*.
+
+    - Les dates dont toutes les partitions sont déjà chargées avec la même empreinte sont ignorées
+      (reprise après un arrêt, relance sans effet), sauf avec `force`.
+    - Le parsing et la normalisation de chaque date sont faits en parallèle dans un pool de processus.
+    - Les résultats sont chargés par un seul écrivain, une transaction par date, dans l'ordre chronologique
+      (les dates suivantes restent normalisées en parallèle) : les IDs des nouvelles stations sont reproductibles.
+    - La progression et la durée de chaque date sont affichées.
+    """
+    store = RawStore(raw_data_dir)
+    partitions_by_date = discover_partitions(store)
+    if days:
+        partitions_by_date = {day: parts for day, parts in partitions_by_date.items() if day in days}
+    fingerprints = {
+        partition: partition_fingerprint(store, partition)
+        for parts in partitions_by_date.values() for partition in parts
+    }
+
+    with PipelineContext(duckdb_path = duckdb_path, raw_data_dir = raw_data_dir) as ctx:
+        ctx.run(create_consolidate_tables)
+        loaded = dict(ctx.con.execute("SELECT PARTITION_NAME, FINGERPRINT FROM BACKFILL_PARTITION").fetchall())
+
+        pending = {
+            day: parts for day, parts in partitions_by_date.items()
+            if force or any(loaded.get(partition) != fingerprints[partition] for partition in parts)
+        }
+        print(f"Backfill : {len(pending)} date(s) à charger, {len(partitions_by_date) - len(pending)} déjà à jour.")
+
+        started_at = time.perf_counter()
+        failed = []
+        with ProcessPoolExecutor(max_workers = max_workers, mp_context = multiprocessing.get_context("spawn")) as executor:
+            futures = {
+                day: executor.submit(normalize_date, raw_data_dir, day, pending[day])
+                for day in sorted(pending)
+            }
+            for index, (day, future) in enumerate(futures.items(), start = 1):
+                try:
+                    result = future.result()
+                    load_started_at = time.perf_counter()
+                    ctx.run(load_date, result, fingerprints)
+                except Exception as error:
+                    failed.append(day)
+                    print(f"[{index}/{len(pending)}] {day} : échec ({error})")
+                    continue
+                nb_rows = 0 if result["statement"] is None else len(result["statement"])
+                print(
+                    f"[{index}/{len(pending)}] {day} : {len(result['partitions'])} partition(s), {nb_rows} relevés, "
+                    f"normalisation {result['duration']:.2f}s, chargement {time.perf_counter() - load_started_at:.2f}s"
+                )
+
+        print(f"Backfill terminé en {time.perf_counter() - started_at:.2f}s.")
+        if failed:
+            raise RuntimeError(f"Dates en échec (relancer le backfill pour les reprendre) : {failed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Chargement de l'historique des données brutes dans les tables de consolidation.")
+    parser.add_argument("--workers", type = int, default = None, help = "Nombre de processus de parsing.")
+    parser.add_argument("--force", action = "store_true", help = "Recharge aussi les partitions déjà chargées.")
+    parser.add_argument("--dates", nargs = "*", default = None, help = "Dates à charger (toutes par défaut).")
+    args = parser.parse_args()
+
+    backfill(max_workers = args.workers, force = args.force, days = args.dates)
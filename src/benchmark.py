@@ -0,0 +1,357 @@
+"""
+Benchmark du pipeline complet sur des données synthétiques.
+
+- Génère des flux au format de Paris, de Nantes et des communes (mêmes clés que les fichiers de `data/raw_data`),
+  pour un nombre configurable de stations, de jours et de snapshots par jour.
+- Les flux sont servis depuis le disque à la vraie fonction d'ingestion (`ingest_all_feeds`) :
+  streaming, compression, hash et manifest sont mesurés, sans réseau.
+- Les étapes ingestion, consolidation et agrégation sont chronométrées séparément, sur une base DuckDB jetable.
+- Les résultats (débit, latence par étape, pic de mémoire RSS atteint à la fin de chaque étape) sont écrits dans un fichier JSON
+  (`data/benchmark/`), à comparer d'une version à l'autre.
+
+    python src/benchmark.py --paris-stations 20000 --nantes-stations 2000 --days 3 --snapshots 12
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import requests
+from requests.adapters import BaseAdapter
+
+from data_agregation import create_agregate_tables, agregate_dim_city, agregate_dim_station, build_fact_station_statement
+from data_consolidation import (
+    create_consolidate_tables,
+    consolidate_city_data,
+    consolidate_station_data,
+    consolidate_station_statement_data,
+)
+from data_ingestion import FEEDS, ingest_all_feeds
+from pipeline_context import PipelineContext
+from run_metrics import peak_rss_mb
+from statement_delta import STATEMENT_STORAGES
+
+BENCHMARK_DIR = "data/benchmark"
+
+PARIS_INSEE_CODES = ["75056"] + [f"751{arrondissement:02d}" for arrondissement in range(1, 21)] + ["92012", "93048", "94028"]
+NANTES_INSEE_CODES = ["44109", "44143", "44162", "44190"]
+COMMUNES = [
+    {"nom": "Paris", "code": "75056", "population": 2100000},
+    {"nom": "Nantes", "code": "44109", "population": 323000},
+    {"nom": "Toulouse", "code": "31555", "population": 504000},
+]
+
+
+def draw_bikes(station: dict, rng: random.Random, change_rate: float) -> int:
+    """Vélos disponibles d'une station : nouveau tirage avec la probabilité `change_rate`, sinon valeur du snapshot précédent."""
+    if "bikes" not in station or change_rate >= 1 or rng.random() < change_rate:
+        station["bikes"] = rng.randint(0, station["capacity"])
+    return station["bikes"]
+
+
+def generate_paris_feed(stations: list, rng: random.Random, snapshot_time: datetime, change_rate: float = 1.0) -> list:
+    """Flux temps réel au format Paris (Vélib') pour un snapshot."""
+    feed = []
+    for station in stations:
+        bikes = draw_bikes(station, rng, change_rate)
+        mechanical = rng.randint(0, bikes)
+        feed.append({
+            "stationcode": station["code"],
+            "name": station["name"],
+            "is_installed": "OUI",
+            "capacity": station["capacity"],
+            "numdocksavailable": station["capacity"] - bikes,
+            "numbikesavailable": bikes,
+            "mechanical": mechanical,
+            "ebike": bikes - mechanical,
+            "is_renting": "OUI",
+            "is_returning": "OUI",
+            "duedate": (snapshot_time - timedelta(seconds = rng.randint(0, 600))).strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+            "coordonnees_geo": {"lon": station["lon"], "lat": station["lat"]},
+            "nom_arrondissement_communes": station["city_name"],
+            "code_insee_commune": station["city_code"],
+            "station_opening_hours": None,
+        })
+    return feed
+
+
+def generate_nantes_feeds(stations: list, rng: random.Random, snapshot_time: datetime, change_rate: float = 1.0) -> tuple:
+    """Flux temps réel et localisation des stations au format Nantes (Naolib) pour un snapshot."""
+    realtime, localisation = [], []
+    for station in stations:
+        bikes = draw_bikes(station, rng, change_rate)
+        realtime.append({
+            "last_update": (snapshot_time - timedelta(seconds = rng.randint(0, 600))).strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+            "available_bike_stands": str(station["capacity"] - bikes),
+            "number": station["code"],
+            "available_bikes": str(bikes),
+            "name": station["name"].upper(),
+            "address": station["address"],
+            "rental_methods": None,
+            "bike_stands": station["capacity"],
+            "position": {"lon": station["lon"], "lat": station["lat"]},
+        })
+        localisation.append({
+            "idobj": int(station["code"]),
+            "nom": f"Station Naolib Vélo libre-service {station['name']} (n°{station['code']})",
+            "adresse": station["address"],
+            "localisation": station["address"],
+            "cp": 44000,
+            "insee": int(station["city_code"]),
+            "commune": station["city_name"],
+            "capacite_num": station["capacity"],
+            "geo_point_2d": {"lon": station["lon"], "lat": station["lat"]},
+        })
+    return realtime, localisation
+
+
+def generate_stations(rng: random.Random, nb_stations: int, insee_codes: list, center: tuple, first_code: int) -> list:
+    """Référentiel de stations synthétiques, stable d'un snapshot à l'autre."""
+    return [
+        {
+            "code": str(first_code + index),
+            "name": f"Station {first_code + index}",
+            "address": f"{index + 1}, rue du Benchmark",
+            "capacity": rng.randint(10, 60),
+            "lon": center[0] + rng.uniform(-0.1, 0.1),
+            "lat": center[1] + rng.uniform(-0.05, 0.05),
+            "city_code": insee_codes[index % len(insee_codes)],
+            "city_name": f"Commune {insee_codes[index % len(insee_codes)]}",
+        }
+        for index in range(nb_stations)
+    ]
+
+
+def generate_feeds(source_dir: str, nb_paris_stations: int, nb_nantes_stations: int, snapshot_times: list, seed: int = 0, change_rate: float = 1.0) -> dict:
+    """
+    Écrit les flux synthétiques de chaque snapshot dans `source_dir/<date>/<%H%M%S>/`.
+
+    - `change_rate` : part des stations dont la disponibilité change d'un snapshot à l'autre.
+    - Retourne, pour chaque snapshot, le dictionnaire de flux (même forme que `FEEDS`) qui pointe vers ces fichiers.
+    """
+    rng = random.Random(seed)
+    paris_stations = generate_stations(rng, nb_paris_stations, PARIS_INSEE_CODES, (2.35, 48.86), 1001)
+    nantes_stations = generate_stations(rng, nb_nantes_stations, NANTES_INSEE_CODES, (-1.55, 47.22), 1)
+
+    feeds_by_snapshot = {}
+    for snapshot_time in snapshot_times:
+        folder = os.path.abspath(f"{source_dir}/{snapshot_time:%Y-%m-%d/%H%M%S}")
+        os.makedirs(folder, exist_ok = True)
+        nantes_realtime, nantes_localisation = generate_nantes_feeds(nantes_stations, rng, snapshot_time, change_rate)
+        contents = {
+            "paris_realtime": generate_paris_feed(paris_stations, rng, snapshot_time, change_rate),
+            "nantes_realtime": nantes_realtime,
+            "nantes_localisation": nantes_localisation,
+            "communes": COMMUNES,
+        }
+        feeds_by_snapshot[snapshot_time] = {}
+        for name, content in contents.items():
+            path = f"{folder}/{FEEDS[name]['file_name']}"
+            with open(path, "w") as fd:
+                json.dump(content, fd, ensure_ascii = False)
+            feeds_by_snapshot[snapshot_time][name] = {**FEEDS[name], "url": f"file://{path}"}
+    return feeds_by_snapshot
+
+
+class LocalFileAdapter(BaseAdapter):
+    """Adaptateur `requests` qui sert les URL `file://` depuis le disque (ingestion sans réseau)."""
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        path = request.url[len("file://"):].split("?")[0]
+        if os.path.exists(path):
+            response.status_code = 200
+            response.raw = open(path, "rb")
+        else:
+            response.status_code = 404
+        return response
+
+    def close(self):
+        pass
+
+
+def summarize(durations: list, rows: int) -> dict:
+    """Statistiques d'une étape : nombre d'exécutions, latences (ms), lignes et débit (lignes/s)."""
+    durations_ms = np.array(durations) * 1000
+    total_seconds = float(np.sum(durations))
+    return {
+        "runs": len(durations),
+        "total_s": round(total_seconds, 4),
+        "mean_ms": round(float(np.mean(durations_ms)), 2),
+        "p50_ms": round(float(np.percentile(durations_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(durations_ms, 95)), 2),
+        "max_ms": round(float(np.max(durations_ms)), 2),
+        "rows": rows,
+        "rows_per_s": round(rows / total_seconds, 1) if total_seconds else None,
+    }
+
+
+def git_commit() -> str:
+    """Commit courant du dépôt (None hors d'un dépôt git)."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True, check = True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    nb_paris_stations: int = 1500,
+    nb_nantes_stations: int = 126,
+    nb_days: int = 2,
+    nb_snapshots: int = 4,
+    engine: str = "pandas",
+    statement_storage: str = "full",
+    change_rate: float = 1.0,
+    seed: int = 0,
+    scratch_dir: str = None,
+) -> dict:
+    """
+    Exécute le pipeline sur des données synthétiques et retourne les mesures par étape.
+
+    - Chaque snapshot passe par l'ingestion (depuis le disque), la consolidation et l'agrégation,
+      dans le même ordre que `main.py` / `scheduler.py`.
+    - Les communes et les stations sont consolidées au premier snapshot de chaque jour.
+    - `statement_storage` : stockage complet ou delta des relevés ; `change_rate` : part des stations modifiées par snapshot.
+      Le nombre de lignes de relevés stockées est rapporté (`stored_statements`).
+    - Le dossier de travail (flux, données brutes, base DuckDB) est supprimé à la fin, sauf si `scratch_dir` est fourni.
+    """
+    work_dir = scratch_dir or tempfile.mkdtemp(prefix = "velo-benchmark-")
+    start_date = datetime(2025, 1, 1)
+    snapshot_times = [
+        start_date + timedelta(days = day, minutes = snapshot * 24 * 60 // nb_snapshots)
+        for day in range(nb_days) for snapshot in range(nb_snapshots)
+    ]
+
+    session = requests.Session()
+    session.mount("file://", LocalFileAdapter())
+    durations = {"ingestion": [], "consolidation": [], "aggregation": []}
+    rows = {"ingestion": 0, "consolidation": 0, "aggregation": 0}
+    peak_rss = {"ingestion": None, "consolidation": None, "aggregation": None}
+    ingested_bytes = 0
+
+    try:
+        generation_started_at = time.perf_counter()
+        feeds_by_snapshot = generate_feeds(f"{work_dir}/source", nb_paris_stations, nb_nantes_stations, snapshot_times, seed, change_rate)
+        generation_seconds = time.perf_counter() - generation_started_at
+
+        for index, snapshot_time in enumerate(snapshot_times):
+            first_of_day = index % nb_snapshots == 0
+            feeds = feeds_by_snapshot[snapshot_time] if first_of_day else {
+                name: feed for name, feed in feeds_by_snapshot[snapshot_time].items() if name != "communes"
+            }
+
+            with PipelineContext(
+                snapshot_time = snapshot_time,
+                duckdb_path = f"{work_dir}/benchmark.duckdb",
+                raw_data_dir = f"{work_dir}/raw_data",
+                consolidation_engines = {"communes": engine, "paris": engine, "nantes": engine},
+                statement_storage = statement_storage,
+            ) as ctx:
+                started_at = time.perf_counter()
+                written = ctx.run(ingest_all_feeds, feeds, session = session)
+                durations["ingestion"].append(time.perf_counter() - started_at)
+                peak_rss["ingestion"] = peak_rss_mb()
+                ingested_bytes += sum(written.values())
+                rows["ingestion"] += nb_paris_stations + 2 * nb_nantes_stations
+
+                started_at = time.perf_counter()
+                ctx.run(create_consolidate_tables)
+                if first_of_day:
+                    ctx.run(consolidate_city_data)
+                    ctx.run(consolidate_station_data)
+                ctx.run(consolidate_station_statement_data)
+                durations["consolidation"].append(time.perf_counter() - started_at)
+                peak_rss["consolidation"] = peak_rss_mb()
+                rows["consolidation"] += nb_paris_stations + nb_nantes_stations
+
+                started_at = time.perf_counter()
+                ctx.run(create_agregate_tables)
+                ctx.run(agregate_dim_station)
+                ctx.run(agregate_dim_city)
+                ctx.run(build_fact_station_statement)
+                durations["aggregation"].append(time.perf_counter() - started_at)
+                peak_rss["aggregation"] = peak_rss_mb()
+                rows["aggregation"] += nb_paris_stations + nb_nantes_stations
+
+            print(f"[{index + 1}/{len(snapshot_times)}] snapshot {snapshot_time} : "
+                  + ", ".join(f"{stage} {stage_durations[-1]:.2f}s" for stage, stage_durations in durations.items()))
+
+        stages = {stage: {**summarize(durations[stage], rows[stage]), "peak_rss_mb": peak_rss[stage]} for stage in durations}
+        stages["ingestion"]["bytes"] = ingested_bytes
+        stages["ingestion"]["mb_per_s"] = round(ingested_bytes / 1024 ** 2 / stages["ingestion"]["total_s"], 2)
+
+        with PipelineContext(duckdb_path = f"{work_dir}/benchmark.duckdb", read_only = True) as ctx:
+            stored_statements = ctx.con.execute(
+                "SELECT (SELECT COUNT(*) FROM CONSOLIDATE_STATION_STATEMENT) + (SELECT COUNT(*) FROM STATION_STATEMENT_INTERVAL)"
+            ).fetchone()[0]
+    finally:
+        if scratch_dir is None:
+            shutil.rmtree(work_dir, ignore_errors = True)
+
+    return {
+        "run_at": datetime.now().isoformat(timespec = "seconds"),
+        "git_commit": git_commit(),
+        "config": {
+            "paris_stations": nb_paris_stations,
+            "nantes_stations": nb_nantes_stations,
+            "days": nb_days,
+            "snapshots_per_day": nb_snapshots,
+            "engine": engine,
+            "statement_storage": statement_storage,
+            "change_rate": change_rate,
+            "seed": seed,
+        },
+        "stored_statements": stored_statements,
+        "generation_s": round(generation_seconds, 4),
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def write_results(results: dict, output: str = None) -> str:
+    """Écrit les résultats en JSON (par défaut `data/benchmark/benchmark_<horodatage>.json`) et retourne le chemin."""
+    output = output or f"{BENCHMARK_DIR}/benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    os.makedirs(os.path.dirname(output) or ".", exist_ok = True)
+    with open(output, "w") as fd:
+        json.dump(results, fd, indent = 2)
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark du pipeline sur des données synthétiques.")
+    parser.add_argument("--paris-stations", type = int, default = 1500, help = "Nombre de stations du flux Paris.")
+    parser.add_argument("--nantes-stations", type = int, default = 126, help = "Nombre de stations du flux Nantes.")
+    parser.add_argument("--days", type = int, default = 2, help = "Nombre de jours simulés.")
+    parser.add_argument("--snapshots", type = int, default = 4, help = "Nombre de snapshots par jour.")
+    parser.add_argument("--engine", choices = ["pandas", "duckdb", "streaming"], default = "pandas", help = "Moteur de consolidation.")
+    parser.add_argument("--statement-storage", choices = STATEMENT_STORAGES, default = "full", help = "Stockage des relevés.")
+    parser.add_argument("--change-rate", type = float, default = 1.0, help = "Part des stations dont la disponibilité change à chaque snapshot.")
+    parser.add_argument("--seed", type = int, default = 0, help = "Graine du générateur.")
+    parser.add_argument("--scratch-dir", default = None, help = "Dossier de travail conservé (temporaire par défaut).")
+    parser.add_argument("--output", default = None, help = "Fichier JSON des résultats.")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        nb_paris_stations = args.paris_stations,
+        nb_nantes_stations = args.nantes_stations,
+        nb_days = args.days,
+        nb_snapshots = args.snapshots,
+        engine = args.engine,
+        statement_storage = args.statement_storage,
+        change_rate = args.change_rate,
+        seed = args.seed,
+        scratch_dir = args.scratch_dir,
+    )
+    print(json.dumps(results["stages"], indent = 2))
+    print(f"Résultats écrits dans {write_results(results, args.output)}")
@@ -0,0 +1,346 @@
+"""
+Exécution du pipeline comme un graphe d'étapes (façon Make), avec saut des étapes à jour.
+
+- `STAGES` déclare chaque étape : module et fonction, dépendances, entrées (ou fichiers produits) et tables écrites.
+- L'empreinte des entrées d'une étape (hash des fichiers bruts, high-water marks des tables de consolidation,
+  fichiers SQL de création) est enregistrée dans STAGE_FINGERPRINT après chaque exécution réussie :
+  une étape dont les entrées n'ont pas changé depuis est sautée (sauf `--force`).
+- L'ingestion est à jour dès que tous les fichiers bruts de la partition existent (comme une cible Make) :
+  une relance après une erreur ne retélécharge pas les flux.
+- Les étapes prêtes qui n'écrivent pas les mêmes tables s'exécutent en parallèle, chacune sur son curseur DuckDB.
+- Les modules des étapes (pandas, requests, ...) ne sont importés qu'au moment d'exécuter l'étape.
+
+    python src/cli.py                                         # pipeline complet, étapes à jour sautées
+    python src/cli.py get_bicycle_dock_availability_by_city --only
+    python src/cli.py build_fact_station_statement --force --run-date 2025-12-04
+"""
+
+import argparse
+import hashlib
+import importlib
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from feed_adapters import ingestion_feeds
+from pipeline_context import STATEMENT_STORAGE, PipelineContext
+from run_metrics import PROFILERS
+from statement_delta import STATEMENT_STORAGES
+
+# Fichier brut des communes (voir `data_ingestion.FEEDS`).
+COMMUNES_FILE_NAME = "communes_data.json"
+REALTIME_FILES = [feed["file_name"] for feed in ingestion_feeds().values()]
+RAW_FILES = REALTIME_FILES + [COMMUNES_FILE_NAME]
+
+# Entrées d'une étape :
+# - ("raw", fichier) : contenu d'un fichier brut de la partition de l'exécution ;
+# - ("partitions", table) : partitions écrites dans une table de consolidation (ETL_PARTITION) ;
+# - ("sql", fichier) : script de `data/sql_statements`.
+# `outputs` : fichiers bruts produits, l'étape est à jour s'ils existent tous.
+# `always` : étape toujours exécutée (requêtes, rétention, publication).
+# `after` : étapes qui, si elles sont sélectionnées, se terminent avant celle-ci (sans être ajoutées aux cibles).
+# `writes` : tables écrites dans la transaction de l'étape, tables de suivi (ETL_PARTITION, ETL_WATERMARK, registre des stations,
+# qualité des relevés) comprises : deux étapes qui écrivent une même table (ou le catalogue) ne s'exécutent jamais en même temps.
+# Les requêtes qui affichent leur résultat écrivent "stdout" : leurs tableaux ne s'entremêlent pas.
+# PIPELINE_RUN_METRICS et STAGE_FINGERPRINT sont écrites après la transaction, une ligne par étape (pas de conflit).
+STAGES = {
+    "ingest_all_feeds": {
+        "module": "data_ingestion",
+        "deps": [],
+        "outputs": RAW_FILES,
+        "writes": ["raw_data"],
+    },
+    "create_consolidate_tables": {
+        "module": "data_consolidation",
+        "deps": [],
+        "inputs": [("sql", "create_consolidate_tables.sql")],
+        "writes": ["catalog"],
+    },
+    "create_agregate_tables": {
+        "module": "data_agregation",
+        "deps": ["create_consolidate_tables"],
+        "inputs": [("sql", "create_agregate_tables.sql")],
+        "writes": ["catalog"],
+    },
+    "create_downsampling_tables": {
+        "module": "downsampling",
+        "deps": ["create_agregate_tables"],
+        "inputs": [("sql", "create_downsampling_tables.sql")],
+        "writes": ["catalog"],
+    },
+    "consolidate_city_data": {
+        "module": "data_consolidation",
+        "deps": ["ingest_all_feeds", "create_consolidate_tables"],
+        "inputs": [("raw", COMMUNES_FILE_NAME)],
+        "writes": ["CONSOLIDATE_CITY", "REFERENCE_DATA", "ETL_PARTITION"],
+    },
+    "consolidate_station_data": {
+        "module": "data_consolidation",
+        "deps": ["ingest_all_feeds", "create_consolidate_tables"],
+        "inputs": [("raw", file_name) for file_name in REALTIME_FILES],
+        "writes": ["CONSOLIDATE_STATION", "STATION_KEY_REGISTRY", "ETL_PARTITION"],
+    },
+    "consolidate_station_statement_data": {
+        "module": "data_consolidation",
+        "deps": ["consolidate_station_data"],
+        "inputs": [("raw", file_name) for file_name in REALTIME_FILES] + [("partitions", "CONSOLIDATE_STATION")],
+        "writes": [
+            "CONSOLIDATE_STATION_STATEMENT",
+            "STATION_STATEMENT_INTERVAL",
+            "STATION_STATEMENT_DELTA",
+            "CURRENT_STATION_STATE",
+            "QUARANTINE_STATION_STATEMENT",
+            "DATA_QUALITY_METRICS",
+            "ETL_PARTITION",
+        ],
+    },
+    "agregate_dim_city": {
+        "module": "data_agregation",
+        "deps": ["consolidate_city_data", "create_agregate_tables"],
+        "inputs": [("partitions", "CONSOLIDATE_CITY")],
+        "writes": ["DIM_CITY", "ETL_WATERMARK"],
+    },
+    "agregate_dim_station": {
+        "module": "data_agregation",
+        "deps": ["consolidate_station_data", "create_agregate_tables"],
+        "inputs": [("partitions", "CONSOLIDATE_STATION")],
+        "writes": ["DIM_STATION", "ETL_WATERMARK"],
+    },
+    "build_fact_station_statement": {
+        "module": "data_agregation",
+        "deps": ["consolidate_station_statement_data", "agregate_dim_city"],
+        "inputs": [("partitions", "CONSOLIDATE_STATION_STATEMENT"), ("partitions", "CONSOLIDATE_CITY")],
+        "writes": ["FACT_STATION_STATEMENT", "ROLLUP_CITY_SNAPSHOT", "ROLLUP_STATION_DAILY", "ROLLUP_STATION_TOTAL", "ETL_WATERMARK"],
+    },
+    "downsample_station_statements": {
+        "module": "downsampling",
+        "deps": ["build_fact_station_statement", "create_downsampling_tables"],
+        "inputs": [("partitions", "CONSOLIDATE_STATION_STATEMENT")],
+        "writes": ["STATION_STATEMENT_HOURLY", "STATION_STATEMENT_DAILY", "ETL_WATERMARK"],
+    },
+    "export_lake": {
+        "module": "data_lake",
+        "deps": ["consolidate_city_data", "consolidate_station_data", "build_fact_station_statement"],
+        "inputs": [
+            ("partitions", "CONSOLIDATE_CITY"),
+            ("partitions", "CONSOLIDATE_STATION"),
+            ("partitions", "CONSOLIDATE_STATION_STATEMENT"),
+        ],
+        "writes": ["lake", "ETL_WATERMARK"],
+    },
+    "apply_retention": {
+        "module": "downsampling",
+        "deps": ["downsample_station_statements", "export_lake"],
+        "options": ["retention_days", "archive_dir"],
+        "always": True,
+        "writes": ["CONSOLIDATE_STATION_STATEMENT", "FACT_STATION_STATEMENT", "STATION_STATEMENT_INTERVAL"],
+    },
+    "get_average_bikes_available_per_station": {
+        "module": "data_agregation",
+        "deps": ["agregate_dim_station", "build_fact_station_statement"],
+        "always": True,
+        "writes": ["stdout"],
+    },
+    "get_bicycle_dock_availability_by_city": {
+        "module": "data_agregation",
+        "deps": ["agregate_dim_city", "build_fact_station_statement"],
+        "always": True,
+        "writes": ["stdout"],
+    },
+    "publish_snapshot": {
+        "module": "publish",
+        "deps": ["agregate_dim_station", "downsample_station_statements", "export_lake"],
+        "after": ["apply_retention"],
+        "always": True,
+        "writes": ["published"],
+    },
+}
+
+# Étapes exécutées sans cible explicite : le pipeline quotidien de `main.py`.
+DEFAULT_TARGETS = [
+    "downsample_station_statements",
+    "export_lake",
+    "get_average_bikes_available_per_station",
+    "get_bicycle_dock_availability_by_city",
+    "publish_snapshot",
+]
+
+
+def resolve_stages(targets: list, only: bool = False) -> list:
+    """Étapes à exécuter pour les cibles demandées, dépendances comprises (sauf `only`), dans l'ordre de `STAGES`."""
+    unknown = [name for name in targets if name not in STAGES]
+    if unknown:
+        raise ValueError(f"Étapes inconnues : {', '.join(unknown)} (choix : {', '.join(STAGES)})")
+
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            if not only:
+                pending.extend(STAGES[name]["deps"])
+    return [name for name in STAGES if name in selected]
+
+
+def input_fingerprint(ctx, stage: dict) -> str:
+    """
+    Empreinte des entrées d'une étape pour la partition de l'exécution.
+
+    - Un fichier brut absent ou une table pas encore créée donnent une empreinte qui ne correspond à aucune exécution passée.
+    - Retourne None pour une étape sans entrées déclarées (toujours exécutée ou jugée sur ses fichiers produits).
+    """
+    if stage.get("always") or "inputs" not in stage:
+        return None
+
+    sha256 = hashlib.sha256(ctx.partition.encode())
+    for kind, name in stage["inputs"]:
+        if kind == "raw":
+            value = ctx.raw_hash(name) if raw_file_exists(ctx, name) else "missing"
+        elif kind == "partitions":
+            import duckdb
+
+            try:
+                value = ctx.con.execute(
+                    "SELECT COUNT(*), MAX(UPDATED_AT) FROM ETL_PARTITION WHERE TABLE_NAME = ?;", [name]
+                ).fetchone()
+            except duckdb.CatalogException:
+                value = "missing"
+        else:
+            with open(ctx.sql_file(name), "rb") as fd:
+                value = hashlib.sha256(fd.read()).hexdigest()
+        sha256.update(f"{kind}:{name}={value}\n".encode())
+    return sha256.hexdigest()
+
+
+def raw_file_exists(ctx, file_name: str) -> bool:
+    """Indique si un fichier brut existe dans la partition de l'exécution."""
+    return os.path.isdir(ctx.raw_data_path) and file_name in ctx.raw_store.files(ctx.partition)
+
+
+def is_up_to_date(ctx, name: str, fingerprint: str) -> bool:
+    """
+    Indique si l'étape est à jour.
+
+    - Étape avec `outputs` : tous ses fichiers bruts existent.
+    - Sinon : elle a déjà été exécutée avec succès sur les mêmes entrées (STAGE_FINGERPRINT).
+    """
+    if "outputs" in STAGES[name]:
+        return all(raw_file_exists(ctx, file_name) for file_name in STAGES[name]["outputs"])
+    if fingerprint is None:
+        return False
+    result = ctx.con.execute(
+        "SELECT FINGERPRINT FROM STAGE_FINGERPRINT WHERE STAGE = ? AND PARTITION_KEY = ?;", [name, ctx.partition]
+    ).fetchone()
+    return result is not None and result[0] == fingerprint
+
+
+def run_stage(ctx, name: str, options: dict, force: bool = False) -> bool:
+    """
+    Exécute une étape sur un curseur dédié, sauf si elle est à jour ; retourne True si elle a été exécutée.
+
+    - Le module de l'étape n'est importé qu'ici.
+    - L'empreinte enregistrée est celle des entrées après l'exécution.
+    """
+    stage = STAGES[name]
+    with ctx.fork() as stage_ctx:
+        if not force and is_up_to_date(stage_ctx, name, input_fingerprint(stage_ctx, stage)):
+            print(f"Étape {name} à jour : ignorée.")
+            return False
+
+        function = getattr(importlib.import_module(stage["module"]), name)
+        stage_ctx.run(function, *[options[option] for option in stage.get("options", [])])
+
+        fingerprint = input_fingerprint(stage_ctx, stage)
+        if fingerprint is not None:
+            stage_ctx.con.execute(
+                "INSERT OR REPLACE INTO STAGE_FINGERPRINT VALUES (?, ?, ?, current_localtimestamp());",
+                [name, ctx.partition, fingerprint],
+            )
+    return True
+
+
+def run_stages(ctx, names: list, options: dict = None, force: bool = False, max_workers: int = 4):
+    """
+    Exécute des étapes dans l'ordre de leurs dépendances, en parallèle quand c'est possible.
+
+    - Une étape démarre quand ses dépendances (et étapes `after`) sélectionnées sont terminées
+      et qu'aucune étape en cours n'écrit les mêmes tables.
+    - Après une erreur, les étapes en cours se terminent, aucune autre ne démarre, puis l'erreur est relevée :
+      les étapes réussies gardent leur empreinte et sont sautées à la relance.
+    """
+    options = options or {}
+    done, running, error = set(), {}, None
+
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        while len(done) < len(names):
+            if error is None:
+                for name in names:
+                    stage = STAGES[name]
+                    busy = {table for other in running.values() for table in STAGES[other]["writes"]}
+                    if (
+                        name not in done
+                        and name not in running.values()
+                        and all(dep in done or dep not in names for dep in stage["deps"] + stage.get("after", []))
+                        and not busy & set(stage["writes"])
+                    ):
+                        running[executor.submit(run_stage, ctx, name, options, force)] = name
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                if future.exception() is not None and error is None:
+                    error = future.exception()
+                    print(f"Étape {name} en erreur : {error}")
+                done.add(name)
+
+    if error is not None:
+        raise error
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Exécute les étapes du pipeline et leurs dépendances, en sautant celles qui sont à jour.")
+    parser.add_argument("targets", nargs = "*", default = DEFAULT_TARGETS, help = f"Étapes cibles (choix : {', '.join(STAGES)}).")
+    parser.add_argument("--only", action = "store_true", help = "N'exécute que les cibles, sans leurs dépendances.")
+    parser.add_argument("--force", action = "store_true", help = "Exécute les étapes même si leurs entrées n'ont pas changé.")
+    parser.add_argument("--dry-run", action = "store_true", help = "Affiche les étapes sélectionnées sans les exécuter.")
+    parser.add_argument("--workers", type = int, default = 4, help = "Nombre maximal d'étapes exécutées en parallèle.")
+    parser.add_argument("--run-date", type = datetime.fromisoformat, default = None, help = "Date d'exécution (partition de data/raw_data), aujourd'hui par défaut.")
+    parser.add_argument("--retention-days", type = int, default = None, help = "Âge (en jours) au-delà duquel les relevés bruts résumés sont supprimés.")
+    parser.add_argument("--no-publish", action = "store_true", help = "Ne pas publier de version en lecture seule à la fin de l'exécution.")
+    parser.add_argument("--archive-dir", default = None, help = "Archive Parquet des relevés supprimés par la rétention.")
+    parser.add_argument("--statement-storage", choices = STATEMENT_STORAGES, default = STATEMENT_STORAGE, help = "Stockage des relevés : complet ou changements seulement.")
+    parser.add_argument("--metrics-log", default = None, help = "Fichier JSON lines des mesures par étape (`-` pour la sortie standard).")
+    parser.add_argument("--profile-stage", default = None, help = "Nom de l'étape à profiler.")
+    parser.add_argument("--profiler", choices = PROFILERS, default = "cprofile", help = "Profileur de l'étape choisie.")
+    args = parser.parse_args()
+
+    targets = list(args.targets)
+    if args.retention_days is not None and "apply_retention" not in targets:
+        targets.append("apply_retention")
+    if args.no_publish:
+        targets = [name for name in targets if name != "publish_snapshot"]
+    names = resolve_stages(targets, only = args.only)
+    if args.dry_run:
+        print("\n".join(names))
+        raise SystemExit(0)
+
+    with PipelineContext(
+        run_date = args.run_date,
+        statement_storage = args.statement_storage,
+        metrics_log = args.metrics_log,
+        profile_stage = args.profile_stage,
+        profiler = args.profiler,
+    ) as ctx:
+        # tables partagées créées avant de lancer des étapes en parallèle
+        ctx.execute_script("create_metrics_tables.sql")
+        ctx.execute_script("create_stage_tables.sql")
+        run_stages(
+            ctx,
+            names,
+            options = {"retention_days": args.retention_days, "archive_dir": args.archive_dir},
+            force = args.force,
+            max_workers = args.workers,
+        )
@@ -1,57 +1,109 @@
-import duckdb
+import pandas as pd
 
+import utils
 
-def create_agregate_tables():
+# Agrégats maintenus avec FACT_STATION_STATEMENT (`refresh_rollups`), lus par les requêtes du tableau de bord.
+# `{where}` restreint les faits recalculés (snapshots ou dates chargés par l'exécution).
+ROLLUP_CITY_SNAPSHOT_SQL = """
+    SELECT
+        CITY_ID,
+        SNAPSHOT_TS,
+        any_value(CREATED_DATE) AS CREATED_DATE,
+        COUNT(*) AS NB_STATIONS,
+        CAST(SUM(BICYCLE_DOCKS_AVAILABLE) AS BIGINT) AS SUM_BICYCLE_DOCKS_AVAILABLE,
+        CAST(SUM(BICYCLE_AVAILABLE) AS BIGINT) AS SUM_BICYCLE_AVAILABLE
+    FROM FACT_STATION_STATEMENT
+    WHERE {where}
+    GROUP BY CITY_ID, SNAPSHOT_TS
+"""
+
+ROLLUP_STATION_DAILY_SQL = """
+    SELECT
+        STATION_ID,
+        CREATED_DATE,
+        arg_max(CITY_ID, SNAPSHOT_TS) AS CITY_ID,
+        COUNT(BICYCLE_AVAILABLE) AS COUNT_BICYCLE_AVAILABLE,
+        CAST(SUM(BICYCLE_AVAILABLE) AS BIGINT) AS SUM_BICYCLE_AVAILABLE,
+        COUNT(BICYCLE_DOCKS_AVAILABLE) AS COUNT_BICYCLE_DOCKS_AVAILABLE,
+        CAST(SUM(BICYCLE_DOCKS_AVAILABLE) AS BIGINT) AS SUM_BICYCLE_DOCKS_AVAILABLE
+    FROM FACT_STATION_STATEMENT
+    WHERE {where}
+    GROUP BY STATION_ID, CREATED_DATE
+"""
+
+ROLLUP_STATION_TOTAL_SQL = """
+    SELECT
+        STATION_ID,
+        arg_max(CITY_ID, CREATED_DATE) AS CITY_ID,
+        CAST(SUM(COUNT_BICYCLE_AVAILABLE) AS BIGINT) AS COUNT_BICYCLE_AVAILABLE,
+        CAST(SUM(SUM_BICYCLE_AVAILABLE) AS BIGINT) AS SUM_BICYCLE_AVAILABLE,
+        CAST(SUM(COUNT_BICYCLE_DOCKS_AVAILABLE) AS BIGINT) AS COUNT_BICYCLE_DOCKS_AVAILABLE,
+        CAST(SUM(SUM_BICYCLE_DOCKS_AVAILABLE) AS BIGINT) AS SUM_BICYCLE_DOCKS_AVAILABLE
+    FROM ROLLUP_STATION_DAILY
+    GROUP BY STATION_ID
+"""
+
+ROLLUP_COUNTERS = ("COUNT_BICYCLE_AVAILABLE", "SUM_BICYCLE_AVAILABLE", "COUNT_BICYCLE_DOCKS_AVAILABLE", "SUM_BICYCLE_DOCKS_AVAILABLE")
+
+def create_agregate_tables(ctx):
 
     """
     Crée les tables d'agrégation dans la base de données DuckDB.
 
     - Lit le fichier SQL situé dans `data/sql_statements/create_agregate_tables.sql`.
     - Découpe le fichier en instructions SQL individuelles.
-    - Exécute chaque instruction pour créer ou recréer les tables d'agrégation nécessaires.
+    - Exécute chaque instruction pour créer les tables d'agrégation manquantes.
+
+    Les tables d'agrégation sont alimentées de façon incrémentale et ne sont jamais recréées,
+    sauf FACT_STATION_STATEMENT si elle date d'un ancien schéma sans `SNAPSHOT_TS`.
+    Les agrégats (ROLLUP_*) sont calculés sur tout l'historique lors de leur création.
     """
      
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
-    with open("data/sql_statements/create_agregate_tables.sql") as fd:
-        statements = fd.read()
-        for statement in statements.split(";"):
-            con.execute(statement)
+    utils.drop_legacy_table(ctx.con, "FACT_STATION_STATEMENT", "SNAPSHOT_TS")
+    ctx.execute_script("create_agregate_tables.sql")
+
+    con = ctx.con
+    nb_rollups = con.execute("SELECT COUNT(*) FROM ROLLUP_CITY_SNAPSHOT").fetchone()[0]
+    nb_facts = con.execute("SELECT COUNT(*) FROM FACT_STATION_STATEMENT").fetchone()[0]
+    if nb_rollups == 0 and nb_facts > 0:
+        ctx.record(rows_written = refresh_rollups(con))
 
 
-def agregate_dim_city():
+def agregate_dim_city(ctx):
     """
     Agrège les données de la table DIM_CITY à partir de la table CONSOLIDATE_CITY.
 
     - Insère ou remplace les données dans la table DIM_CITY.
     - Sélectionne les informations (ID, nom, population) de la table CONSOLIDATE_CITY.
-    - Prend uniquement les données les plus récentes (selon `CREATED_DATE`).
+    - Ne fusionne que les dates (`CREATED_DATE`) écrites depuis le dernier chargement,
+      en gardant pour chaque ville la ligne la plus récente.
     """
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
+    con = ctx.con
     
     sql_statement = """
-    INSERT OR REPLACE INTO DIM_CITY
     SELECT 
         ID,
         NAME,
         NB_INHABITANTS
     FROM CONSOLIDATE_CITY
-    WHERE CREATED_DATE = (SELECT MAX(CREATED_DATE) FROM CONSOLIDATE_CITY);
+    WHERE list_contains(?, CREATED_DATE)
+    QUALIFY row_number() OVER (PARTITION BY ID ORDER BY CREATED_DATE DESC) = 1;
     """
 
-    con.execute(sql_statement)
+    ctx.record(rows_written = merge_dim_partitions(con, "DIM_CITY", "CONSOLIDATE_CITY", sql_statement))
 
-def agregate_dim_station():
+def agregate_dim_station(ctx):
     """
     Agrège les données de la table DIM_STATION à partir de la table CONSOLIDATE_STATION.
 
     - Insère ou remplace les données dans la table DIM_STATION.
     - Sélectionne les informations (ID, code, nom, adresse, longitude, latitude, statut, capacité) de la table CONSOLIDATE_STATION.
-    - Prend uniquement les données les plus récentes (selon `CREATED_DATE`).
+    - Ne fusionne que les dates (`CREATED_DATE`) écrites depuis le dernier chargement,
+      en gardant pour chaque station la ligne la plus récente.
     """
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
+    con = ctx.con
     
     sql_statement = """
-    INSERT OR REPLACE INTO DIM_STATION 
     SELECT 
         ID,
         CODE,
@@ -62,23 +114,67 @@ def agregate_dim_station():
         STATUS,
         CAPACITTY
     FROM CONSOLIDATE_STATION
-    WHERE CREATED_DATE = (SELECT MAX(CREATED_DATE) FROM CONSOLIDATE_STATION);
+    WHERE list_contains(?, CAST(CREATED_DATE AS VARCHAR))
+    QUALIFY row_number() OVER (PARTITION BY ID ORDER BY CREATED_DATE DESC) = 1;
     """
 
-    con.execute(sql_statement)
+    ctx.record(rows_written = merge_dim_partitions(con, "DIM_STATION", "CONSOLIDATE_STATION", sql_statement))
 
-def build_fact_station_statement():
+def merge_dim_partitions(con, dim_table, source_table, sql_statement):
+    """
+    Fusion incrémentale d'une dimension à partir des partitions en attente de sa table source.
+
+    - Les partitions au moins aussi récentes que la dernière déjà fusionnée remplacent les lignes existantes.
+    - Les partitions plus anciennes (ex. un backfill de l'historique) n'ajoutent que les IDs absents :
+      elles n'écrasent pas des données plus récentes, mais les faits de ces dates trouvent leur station.
+    - `sql_statement` est le SELECT des lignes à fusionner, paramétré par la liste des partitions.
+    - Retourne le nombre de lignes écrites.
+    """
+    pending = utils.pending_partitions(con, dim_table, source_table)
+    latest = utils.latest_loaded_partition(con, dim_table, source_table)
+    older_keys = [key for key, _ in pending if latest is not None and key < latest]
+    newer_keys = [key for key, _ in pending if latest is None or key >= latest]
+
+    nb_written = 0
+    if older_keys:
+        nb_written += con.execute(f"INSERT OR IGNORE INTO {dim_table} {sql_statement}", [older_keys]).fetchone()[0]
+    if newer_keys:
+        nb_written += con.execute(f"INSERT OR REPLACE INTO {dim_table} {sql_statement}", [newer_keys]).fetchone()[0]
+    utils.mark_loaded(con, dim_table, source_table, pending)
+    return nb_written
+
+def build_fact_station_statement(ctx):
     """
     Agrège les données de station dans la table FACT_STATION_STATEMENT.
 
     - Insère ou remplace les données dans la table FACT_STATION_STATEMENT.
-    - Joint les données des stations (DIM_STATION) avec les déclarations de station (FACT_STATION_STATEMENT).
+    - Joint les déclarations de station (CONSOLIDATE_STATION_STATEMENT) avec les stations consolidées le même jour (CONSOLIDATE_STATION).
     - Agrège les informations sur les emplacements disponibles et les vélos disponibles par station et par ville.
-    - Prend la date la plus récente pour les déclarations de station.
+    - Ne traite que les snapshots (`SNAPSHOT_TS`) écrits depuis le dernier chargement (high-water mark par partition) :
+      le coût d'une exécution ne dépend pas de la profondeur de l'historique.
+    - Les snapshots sans ligne dans CONSOLIDATE_STATION_STATEMENT (stockage "delta") sont reconstruits
+      depuis les intervalles de validité (`STATION_STATEMENT_AS_OF`), pour les seules sources chargées
+      à ce snapshot (DATA_QUALITY_METRICS), comme en stockage complet.
     """
 
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
+    con = ctx.con
+
+    pending = utils.pending_partitions(con, "FACT_STATION_STATEMENT", "CONSOLIDATE_STATION_STATEMENT")
+    if not pending:
+        return
+    snapshots = [key for key, _ in pending]
+    stored = {
+        snapshot_ts for snapshot_ts, in con.execute(
+            """
+            SELECT DISTINCT CAST(SNAPSHOT_TS AS VARCHAR) FROM CONSOLIDATE_STATION_STATEMENT
+            WHERE SNAPSHOT_TS BETWEEN CAST(? AS TIMESTAMP) AND CAST(? AS TIMESTAMP) AND list_contains(?, CAST(SNAPSHOT_TS AS VARCHAR))
+            """,
+            [snapshots[0], snapshots[-1], snapshots],
+        ).fetchall()
+    }
+    delta_snapshots = [snapshot_ts for snapshot_ts in snapshots if snapshot_ts not in stored]
 
+    # le filtre BETWEEN permet à DuckDB d'ignorer les blocs hors de la plage des snapshots (zonemaps)
     sql_statement = """
         INSERT OR REPLACE INTO FACT_STATION_STATEMENT
         SELECT
@@ -87,78 +183,216 @@ def build_fact_station_statement():
             ss.BICYCLE_DOCKS_AVAILABLE,               
             ss.BICYCLE_AVAILABLE,                     
             ss.LAST_STATEMENT_DATE,                  
-            ss.CREATED_DATE                          
-        FROM
-            CONSOLIDATE_STATION_STATEMENT ss
+            ss.CREATED_DATE,
+            ss.SNAPSHOT_TS
+        FROM (
+            SELECT * FROM CONSOLIDATE_STATION_STATEMENT
+            WHERE SNAPSHOT_TS BETWEEN CAST(? AS TIMESTAMP) AND CAST(? AS TIMESTAMP)
+                AND list_contains(?, CAST(SNAPSHOT_TS AS VARCHAR))
+            UNION ALL
+            SELECT a.*
+            FROM STATION_STATEMENT_AS_OF(?) a
+            JOIN STATION_KEY_REGISTRY k ON k.ID = a.STATION_ID
+            WHERE EXISTS (
+                SELECT 1 FROM DATA_QUALITY_METRICS m
+                WHERE m.SOURCE = k.SOURCE AND m.SNAPSHOT_TS = a.SNAPSHOT_TS AND m.METRIC = 'CHECKED'
+            )
+        ) ss
         JOIN
-            CONSOLIDATE_STATION s ON ss.STATION_ID = s.ID      
+            CONSOLIDATE_STATION s ON ss.STATION_ID = s.ID AND CAST(ss.CREATED_DATE AS DATE) = s.CREATED_DATE
         JOIN
             DIM_CITY c ON s.CITY_CODE = c.ID         
     """
 
-    con.execute(sql_statement)
+    ctx.record(rows_written = con.execute(sql_statement, [snapshots[0], snapshots[-1], snapshots, delta_snapshots]).fetchone()[0])
+    ctx.record(rows_written = refresh_rollups(con, snapshots))
+    utils.mark_loaded(con, "FACT_STATION_STATEMENT", "CONSOLIDATE_STATION_STATEMENT", pending)
 
 
-def get_bicycle_dock_availability_by_city():
-    # Nb d'emplacements disponibles de vélos dans une ville
+def refresh_rollups(con, snapshots: list = None) -> int:
+    """
+    Met à jour les agrégats à partir des faits des snapshots chargés (tout l'historique si `snapshots` est None).
 
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
-    
-    sql_statement = """
-        SELECT 
-            dm.NAME, 
-            tmp.SUM_BICYCLE_DOCKS_AVAILABLE 
-        FROM 
-            DIM_CITY dm 
-        INNER JOIN (
-            SELECT 
-                CITY_ID, 
-                SUM(BICYCLE_DOCKS_AVAILABLE) AS SUM_BICYCLE_DOCKS_AVAILABLE 
-            FROM 
-                FACT_STATION_STATEMENT 
-            WHERE 
-                CREATED_DATE = (
-                    SELECT 
-                        MAX(CREATED_DATE) 
-                    FROM 
-                    CONSOLIDATE_STATION
-                ) 
-            GROUP BY 
-                CITY_ID
-            ) tmp ON dm.ID = tmp.CITY_ID 
-        WHERE 
-            lower(dm.NAME) in ('paris', 'nantes', 'vincennes', 'toulouse');
-
-    """
-
-    df_result = con.execute(sql_statement).fetchdf()
+    - ROLLUP_CITY_SNAPSHOT : disponibilités sommées par ville et par snapshot, recalculées pour les snapshots chargés.
+    - ROLLUP_STATION_DAILY : somme et nombre de relevés par station et par jour, recalculés pour les jours
+      des snapshots chargés (un jour déjà agrégé est recalculé en entier quand un snapshot s'y ajoute).
+    - ROLLUP_STATION_TOTAL : somme et nombre cumulés par station ; l'ancien agrégat des jours recalculés
+      est retranché puis le nouveau ajouté, sans relire l'historique.
+    - Retourne le nombre de lignes écrites.
+    """
+    if snapshots is None:
+        where, parameters = "TRUE", []
+    else:
+        where = "SNAPSHOT_TS BETWEEN CAST(? AS TIMESTAMP) AND CAST(? AS TIMESTAMP) AND list_contains(?, CAST(SNAPSHOT_TS AS VARCHAR))"
+        parameters = [snapshots[0], snapshots[-1], snapshots]
+
+    nb_written = con.execute(
+        f"INSERT OR REPLACE INTO ROLLUP_CITY_SNAPSHOT {ROLLUP_CITY_SNAPSHOT_SQL.format(where = where)}", parameters
+    ).fetchone()[0]
+
+    dates = [
+        str(created_date)
+        for created_date, in con.execute(f"SELECT DISTINCT CREATED_DATE FROM FACT_STATION_STATEMENT WHERE {where} ORDER BY 1", parameters).fetchall()
+    ]
+    if not dates:
+        return nb_written
+    date_filter = "CREATED_DATE BETWEEN CAST(? AS DATE) AND CAST(? AS DATE) AND list_contains(?, CAST(CREATED_DATE AS VARCHAR))"
+    date_parameters = [dates[0], dates[-1], dates]
+
+    def add_daily_to_total(sign: str):
+        # une seule ligne par station dans l'INSERT : ON CONFLICT ne cumule pas les doublons d'une même requête
+        counters = ", ".join(f"{sign}CAST(SUM({column}) AS BIGINT)" for column in ROLLUP_COUNTERS)
+        updates = ", ".join(f"{column} = ROLLUP_STATION_TOTAL.{column} + EXCLUDED.{column}" for column in ROLLUP_COUNTERS)
+        return con.execute(
+            f"""
+            INSERT INTO ROLLUP_STATION_TOTAL
+            SELECT STATION_ID, arg_max(CITY_ID, CREATED_DATE), {counters}
+            FROM ROLLUP_STATION_DAILY
+            WHERE {date_filter}
+            GROUP BY STATION_ID
+            ON CONFLICT (STATION_ID) DO UPDATE SET CITY_ID = EXCLUDED.CITY_ID, {updates};
+            """,
+            date_parameters,
+        ).fetchone()[0]
+
+    add_daily_to_total("-")
+    nb_written += con.execute(
+        f"INSERT OR REPLACE INTO ROLLUP_STATION_DAILY {ROLLUP_STATION_DAILY_SQL.format(where = date_filter)}", date_parameters
+    ).fetchone()[0]
+    nb_written += add_daily_to_total("")
+    return nb_written
+
+
+def rollup_filters(cities: list = None, start_date = None, end_date = None, date_column: str = "r.CREATED_DATE") -> tuple:
+    """Clause WHERE (et ses paramètres) commune aux requêtes sur les agrégats : villes (nom ou code INSEE) et dates incluses."""
+    clauses, parameters = ["TRUE"], []
+    if cities is not None:
+        clauses.append("(list_contains(?, lower(c.NAME)) OR list_contains(?, c.ID))")
+        parameters += [[str(city).lower() for city in cities], [str(city) for city in cities]]
+    if start_date is not None:
+        clauses.append(f"{date_column} >= CAST(? AS DATE)")
+        parameters.append(str(start_date))
+    if end_date is not None:
+        clauses.append(f"{date_column} <= CAST(? AS DATE)")
+        parameters.append(str(end_date))
+    return " AND ".join(clauses), parameters
+
+
+def query_bicycle_dock_availability_by_city(ctx, cities: list = None, start_date = None, end_date = None, latest_only: bool = False) -> pd.DataFrame:
+    """
+    Disponibilités par ville et par snapshot, lues dans ROLLUP_CITY_SNAPSHOT.
+
+    - `cities` : noms (sans tenir compte de la casse) ou codes INSEE des villes ; toutes par défaut.
+    - `start_date` / `end_date` : bornes incluses sur la date des relevés.
+    - `latest_only` : ne garde que le dernier snapshot de la période.
+    """
+    where, parameters = rollup_filters(cities, start_date, end_date)
+    if latest_only:
+        latest_where, latest_parameters = rollup_filters(None, start_date, end_date)
+        where += f" AND r.SNAPSHOT_TS = (SELECT MAX(r.SNAPSHOT_TS) FROM ROLLUP_CITY_SNAPSHOT r WHERE {latest_where})"
+        parameters += latest_parameters
+
+    return ctx.con.execute(
+        f"""
+        SELECT
+            c.NAME,
+            r.CITY_ID,
+            r.SNAPSHOT_TS,
+            r.CREATED_DATE,
+            r.NB_STATIONS,
+            r.SUM_BICYCLE_DOCKS_AVAILABLE,
+            r.SUM_BICYCLE_AVAILABLE
+        FROM ROLLUP_CITY_SNAPSHOT r
+        JOIN DIM_CITY c ON c.ID = r.CITY_ID
+        WHERE {where}
+        ORDER BY r.SNAPSHOT_TS, c.NAME;
+        """,
+        parameters,
+    ).fetchdf()
+
+
+def query_current_availability_by_city(ctx, cities: list = None) -> pd.DataFrame:
+    """
+    Disponibilités actuelles par ville, lues dans l'état courant des stations (CURRENT_STATION_STATE).
+
+    - Une ligne par station : le coût ne dépend pas de la profondeur de l'historique.
+    - Seules les stations du dernier snapshot de leur source sont comptées (avec leur relevé validé) ;
+      `SNAPSHOT_TS` est le snapshot le plus récent de la ville.
+    - `cities` : noms (sans tenir compte de la casse) ou codes INSEE des villes ; toutes par défaut.
+    """
+    where, parameters = rollup_filters(cities)
+    return ctx.con.execute(
+        f"""
+        SELECT
+            c.NAME,
+            s.CITY_ID,
+            MAX(s.SNAPSHOT_TS) AS SNAPSHOT_TS,
+            COUNT(*) AS NB_STATIONS,
+            CAST(SUM(s.BICYCLE_DOCKS_AVAILABLE) AS BIGINT) AS SUM_BICYCLE_DOCKS_AVAILABLE,
+            CAST(SUM(s.BICYCLE_AVAILABLE) AS BIGINT) AS SUM_BICYCLE_AVAILABLE
+        FROM CURRENT_STATION_STATE s
+        JOIN DIM_CITY c ON c.ID = s.CITY_ID
+        WHERE {where}
+        GROUP BY c.NAME, s.CITY_ID
+        ORDER BY c.NAME;
+        """,
+        parameters,
+    ).fetchdf()
+
+
+def query_average_bikes_available_per_station(ctx, cities: list = None, start_date = None, end_date = None) -> pd.DataFrame:
+    """
+    Nombre moyen de vélos et d'emplacements disponibles par station.
+
+    - Sans bornes de dates : lu dans ROLLUP_STATION_TOTAL (une ligne par station).
+    - Avec bornes : cumulé depuis ROLLUP_STATION_DAILY sur les jours de la période.
+    - `cities` : noms ou codes INSEE des villes des stations ; toutes par défaut.
+    """
+    if start_date is None and end_date is None:
+        source = "ROLLUP_STATION_TOTAL"
+        where, parameters = rollup_filters(cities)
+    else:
+        source = "ROLLUP_STATION_DAILY"
+        where, parameters = rollup_filters(cities, start_date, end_date)
+
+    return ctx.con.execute(
+        f"""
+        SELECT
+            ds.NAME,
+            ds.CODE,
+            ds.ADDRESS,
+            r.CITY_ID,
+            CAST(SUM(r.COUNT_BICYCLE_AVAILABLE) AS BIGINT) AS NB_STATEMENTS,
+            SUM(r.SUM_BICYCLE_AVAILABLE) / NULLIF(SUM(r.COUNT_BICYCLE_AVAILABLE), 0) AS AVG_BICYCLE_AVAILABLE,
+            SUM(r.SUM_BICYCLE_DOCKS_AVAILABLE) / NULLIF(SUM(r.COUNT_BICYCLE_DOCKS_AVAILABLE), 0) AS AVG_BICYCLE_DOCKS_AVAILABLE
+        FROM {source} r
+        JOIN DIM_STATION ds ON ds.ID = r.STATION_ID
+        LEFT JOIN DIM_CITY c ON c.ID = r.CITY_ID
+        WHERE {where}
+        GROUP BY ds.ID, ds.NAME, ds.CODE, ds.ADDRESS, r.CITY_ID
+        ORDER BY ds.NAME;
+        """,
+        parameters,
+    ).fetchdf()
+
+
+def get_bicycle_dock_availability_by_city(ctx):
+    # Nb d'emplacements disponibles de vélos dans une ville, au dernier relevé de chaque station (lu dans CURRENT_STATION_STATE)
+
+    df_result = query_current_availability_by_city(
+        ctx, cities = ["paris", "nantes", "vincennes", "toulouse"]
+    )[["NAME", "SUM_BICYCLE_DOCKS_AVAILABLE"]]
     print("exécution requête : Nb d'emplacements disponibles de vélos dans une ville")
     print(df_result)
+    return df_result
 
-def get_average_bikes_available_per_station():
-    #Nb de vélos disponibles en moyenne dans chaque station
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
-    
-    sql_statement = """
-        SELECT 
-            ds.name, 
-            ds.code, 
-            ds.address, 
-            tmp.avg_dock_available 
-        FROM 
-            DIM_STATION ds 
-        JOIN (
-            SELECT 
-                station_id, 
-                AVG(BICYCLE_AVAILABLE) AS avg_dock_available 
-            FROM 
-                FACT_STATION_STATEMENT 
-            GROUP BY 
-                station_id
-            ) AS tmp ON ds.id = tmp.station_id;
-    """
-
-    df_result = con.execute(sql_statement).fetchdf()
+def get_average_bikes_available_per_station(ctx):
+    #Nb de vélos disponibles en moyenne dans chaque station (lu dans ROLLUP_STATION_TOTAL)
+
+    df_result = query_average_bikes_available_per_station(ctx).rename(columns = {
+        "NAME": "name", "CODE": "code", "ADDRESS": "address", "AVG_BICYCLE_AVAILABLE": "avg_dock_available"
+    })[["name", "code", "address", "avg_dock_available"]]
 
     print("exécution requête : Nb de vélos disponibles en moyenne dans chaque station")
-    print(df_result)
\ No newline at end of file
+    print(df_result)
+    return df_result
@@ -1,29 +1,36 @@
-import json
-from datetime import datetime, date
-
-import duckdb
 import pandas as pd
 
+import data_consolidation_duckdb
+import data_quality
+import spatial
+import statement_delta
+import station_state
+import streaming
 import utils
+from feed_adapters import FEED_ADAPTERS
 
-today_date = datetime.now().strftime("%Y-%m-%d")
+# Colonnes produites par le moteur générique, dans l'ordre des tables CONSOLIDATE_* (hors STATION_ID / ID).
+STATION_COLUMNS = ["CODE", "NAME", "CITY_NAME", "CITY_CODE", "ADDRESS", "LONGITUDE", "LATITUDE", "STATUS", "CREATED_DATE", "CAPACITTY"]
+STATEMENT_COLUMNS = ["CODE", "BICYCLE_DOCKS_AVAILABLE", "BICYCLE_AVAILABLE", "LAST_STATEMENT_DATE", "CREATED_DATE", "SNAPSHOT_TS"]
 
-def create_consolidate_tables():
+def create_consolidate_tables(ctx):
     """
     Crée les tables de consolidation dans la base de données DuckDB.
 
     -lit le fichier SQL situé dans `data/sql_statements/create_consolidate_tables.sql`
     -découpe le fichier en instructions SQL individuelles
-    -exécute les requêtes pour créer (ou recréer) les tables nécessaires à l'analyse.
+    -exécute les requêtes pour créer les tables manquantes nécessaires à l'analyse.
 
+    Les tables de consolidation sont historisées (par date ou par snapshot `SNAPSHOT_TS`) et ne sont jamais recréées,
+    sauf CONSOLIDATE_STATION_STATEMENT si elle date d'un ancien schéma sans `SNAPSHOT_TS`.
+    L'état courant des stations (CURRENT_STATION_STATE) est initialisé depuis l'historique lors de sa création.
     """
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
-    with open("data/sql_statements/create_consolidate_tables.sql") as fd:
-        statements = fd.read()
-        for statement in statements.split(";"):
-            con.execute(statement)
+    utils.drop_legacy_table(ctx.con, "CONSOLIDATE_STATION_STATEMENT", "SNAPSHOT_TS")
+    ctx.execute_script("create_consolidate_tables.sql")
+    utils.init_station_key_registry(ctx.con)
+    ctx.record(rows_written = station_state.seed_current_state(ctx.con))
 
-def consolidate_city_data() :
+def consolidate_city_data(ctx):
 
     """
     Consolide les données des villes dans la table CONSOLIDATE_CITY.
@@ -32,232 +39,296 @@ def consolidate_city_data() :
     - Enrichit les données avec la date de création du jour.
     - Supprime les doublons pour garantir l'unicité des villes.
     - Insère ou remplace les données dans la table CONSOLIDATE_CITY.
+    - Si le fichier des communes est identique au dernier chargé (empreinte dans REFERENCE_DATA), rien n'est écrit :
+      ni CONSOLIDATE_CITY, ni DIM_CITY, ni le lac ne sont recalculés.
+
+    """
+    con = ctx.con
+    sha256 = ctx.raw_hash("communes_data.json")
+    loaded = con.execute("SELECT SHA256, CREATED_DATE FROM REFERENCE_DATA WHERE NAME = 'communes';").fetchone()
+    if loaded is not None and loaded[0] == sha256:
+        print(f"Communes inchangées depuis le chargement du {loaded[1]} : consolidation ignorée.")
+        return
+
+    utils.mark_partition(con, "CONSOLIDATE_CITY", ctx.run_date)
+    if ctx.engine("communes") == "duckdb":
+        data_consolidation_duckdb.consolidate_city_data(ctx)
+    else:
+        raw_data_df = ctx.load_snapshot("communes", "communes_data.json")
+        city_data_df = normalize_city_data(raw_data_df, ctx.run_date)
+        ctx.record(rows_written = con.execute("INSERT OR REPLACE INTO CONSOLIDATE_CITY SELECT * FROM city_data_df;").fetchone()[0])
+
+    con.execute(
+        "INSERT OR REPLACE INTO REFERENCE_DATA VALUES ('communes', ?, ?, current_localtimestamp());",
+        [sha256, str(ctx.run_date)],
+    )
+
 
+def normalize_city_data(raw_data_df, created_date):
     """
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
-    data = {}
-    
-    with open(f"data/raw_data/{today_date}/communes_data.json") as fd:
-        data = json.load(fd)
-    raw_data_df = pd.json_normalize(data)
+    Transforme les données brutes des communes au format de la table CONSOLIDATE_CITY.
 
+    - Garde le code INSEE, le nom et la population, sans doublons.
+    - Ajoute la date de création.
+    """
     city_data_df = raw_data_df[[
         "code",
         "nom",
         "population"
     ]]
-    city_data_df.rename(columns={
+    city_data_df = city_data_df.rename(columns={
         "code": "id",
         "nom": "name"
-    }, inplace=True)
-
-    city_data_df.drop_duplicates(inplace = True)
-    city_data_df["created_date"] = date.today()
-    con.execute("INSERT OR REPLACE INTO CONSOLIDATE_CITY SELECT * FROM city_data_df;")
-    
-
-
-
-def consolidate_station_paris_data():
-
-    """
-    Consolide les données de station dans la table CONSOLIDATE_STATION.
-
-    - Extrait les informations de base sur chaque station (nom, ville, capacité, etc.).
-    - Supprime les doublons dans les données.
-    - Génère un ID unique pour chaque station.
-    - Insère ou remplace les données dans la table CONSOLIDATE_STATION.
-    """
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
-    data = {}
-
-    with open(f"data/raw_data/{today_date}/paris_realtime_bicycle_data.json") as fd:
-        data = json.load(fd)
-
-    raw_data_df = pd.json_normalize(data)
-    station_data_df = pd.DataFrame({      
-        "CODE": raw_data_df["stationcode"],
-        "NAME": raw_data_df["name"],
-        "CITY_NAME": raw_data_df["nom_arrondissement_communes"],
-        "CITY_CODE": raw_data_df["code_insee_commune"],
-        "ADDRESS": None,                             
-        "LONGITUDE": raw_data_df["coordonnees_geo.lon"],
-        "LATITUDE": raw_data_df["coordonnees_geo.lat"],
-        "STATUS": raw_data_df["is_installed"],
-        "CREATED_DATE": date.today(),  
-        "CAPACITTY": raw_data_df["capacity"]          
     })
 
-    station_data_df.drop_duplicates(inplace = True)
-    station_data_df.insert(0, "ID", station_data_df.index.astype(str))
-    con.execute("INSERT OR REPLACE INTO CONSOLIDATE_STATION SELECT * FROM station_data_df;")
+    city_data_df = city_data_df.drop_duplicates()
+    city_data_df["created_date"] = created_date
+    return city_data_df
+
 
-def consolidate_station_nantes_data():
+def consolidate_station_data(ctx, sources: list = None):
 
     """
-    Consolide les données de station dans la table CONSOLIDATE_STATION.
+    Consolide les stations de toutes les villes du registre `FEED_ADAPTERS` dans la table CONSOLIDATE_STATION.
 
-    - Extrait les informations de base sur chaque station (nom, ville, capacité, etc.).
-    - Génère un ID unique pour chaque station.
+    - Extrait les informations de base sur chaque station (nom, ville, capacité, etc.) selon le mapping de chaque ville.
     - Supprime les doublons dans les données.
-    - Insère ou remplace les données dans la table CONSOLIDATE_STATION.
+    - Associe à chaque station son ID permanent (registre STATION_KEY_REGISTRY).
+    - Insère ou remplace les stations de toutes les villes en un seul INSERT.
+    - `sources` limite la consolidation à certaines villes ; les villes du moteur "duckdb" gardent leur requête SQL.
+    - Moteur "streaming" : les villes sans flux de localisation sont chargées par lots Arrow (`stream_stations`) ;
+      le rapprochement avec un référentiel de localisation a besoin du flux complet (moteur pandas).
     """
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
-    data = {}
-
-    with open(f"data/raw_data/{today_date}/nantes_realtime_bicycle_data.json") as fd:
-        data_station_real_time = json.load(fd)
-    data_station_real_time = pd.json_normalize(data_station_real_time)
-
-    with open(f"data/raw_data/{today_date}/nantes_bicycle_station_localisation_data.json") as fd:
-        data_station_localisation = json.load(fd)
-    data_station_localisation = pd.json_normalize(data_station_localisation)
-
-    data_station=data_station_real_time.merge(
-        data_station_localisation,
-        how='left',
-        left_on='address',
-        right_on='localisation'
-    )
+    utils.mark_partition(ctx.con, "CONSOLIDATE_STATION", ctx.run_date)
 
-    station_data_df = pd.DataFrame({      
-        "CODE": data_station["number"],
-        "NAME": data_station["name"],
-        "CITY_NAME": data_station["commune"],
-        "CITY_CODE": data_station["insee"],
-        "ADDRESS": data_station["address"],                             
-        "LONGITUDE": data_station["position.lon"],
-        "LATITUDE": data_station["position.lat"],
-        "STATUS": None,
-        "CREATED_DATE": date.today(),  
-        "CAPACITTY": data_station["bike_stands"]          
-    })
-    station_data_df.drop_duplicates(inplace = True)
+    snapshots = {}
+    for source in sources or FEED_ADAPTERS:
+        engine = ctx.engine(source)
+        if engine == "duckdb":
+            data_consolidation_duckdb.STATION_CONSOLIDATIONS[source](ctx)
+        elif engine == "streaming" and FEED_ADAPTERS[source]["localisation"] is None:
+            ctx.record(rows_written = stream_stations(ctx, source))
+        else:
+            snapshots[source] = load_adapter_snapshot(ctx, source, localisation = True)
 
-    max_id = int(utils.get_max_station_id(con))
-    station_data_df.insert(0, "ID", range(max_id + 1, max_id + 1 + len(station_data_df)))
-    con.execute("INSERT OR REPLACE INTO CONSOLIDATE_STATION SELECT * FROM station_data_df;")
+    if snapshots:
+        station_data_df = normalize_stations(snapshots, ctx.run_date)
+        ctx.record(rows_written = insert_stations(ctx.con, station_data_df))
 
 
-def consolidate_station_statement_paris_data():
+def consolidate_station_statement_data(ctx, sources: list = None):
 
     """
-    Consolide les données de disponibilité des stations dans la table CONSOLIDATE_STATION_STATEMENT.
-
-    - Récupère les IDs des stations depuis la table CONSOLIDATE_STATION.
-    - Effectue une jointure entre les données brutes et les IDs des stations.
-    - Insère ou remplace les données dans la table CONSOLIDATE_STATION_STATEMENT.
-    
+    Consolide la disponibilité des stations de toutes les villes du registre dans la table CONSOLIDATE_STATION_STATEMENT.
+
+    - Associe chaque relevé à l'ID permanent de sa station (registre STATION_KEY_REGISTRY).
+    - Insère ou remplace les relevés de toutes les villes en un seul INSERT, pour le snapshot `SNAPSHOT_TS`.
+    - `sources` limite la consolidation à certaines villes ; les villes du moteur "duckdb" gardent leur requête SQL.
+    - Moteur "streaming" : les relevés sont chargés par lots Arrow (`stream_station_statements`).
+    - Les relevés sont validés avant chargement (`data_quality`) : quarantaine et compteurs du snapshot recalculés.
+    - Stockage "delta" (`ctx.statement_storage`) : seules les stations dont la disponibilité a changé sont écrites,
+      en intervalles de validité (STATION_STATEMENT_INTERVAL, voir `statement_delta`).
     """
+    sources = sources or list(FEED_ADAPTERS)
+    utils.mark_partition(ctx.con, "CONSOLIDATE_STATION_STATEMENT", ctx.snapshot_ts)
+    data_quality.clear_snapshot(ctx.con, ctx.snapshot_ts, sources)
+    if ctx.statement_storage == "delta":
+        statement_delta.undo_snapshot(ctx.con, ctx.snapshot_ts, sources)
+
+    snapshots = {}
+    for source in sources:
+        engine = ctx.engine(source)
+        if engine == "duckdb":
+            data_consolidation_duckdb.STATEMENT_CONSOLIDATIONS[source](ctx)
+        elif engine == "streaming":
+            ctx.record(rows_written = stream_station_statements(ctx, source))
+        else:
+            snapshots[source] = load_adapter_snapshot(ctx, source, localisation = False)
+
+    if snapshots:
+        station_statement_df = normalize_statements(snapshots, ctx.run_date, ctx.snapshot_ts)
+        ctx.record(rows_written = insert_station_statements(ctx.con, station_statement_df, ctx.statement_storage))
+
+    data_quality.report_quality(ctx.con, ctx.snapshot_ts, sources)
+    if ctx.statement_storage == "delta":
+        statement_delta.report_delta(ctx.con, ctx.snapshot_ts, sources)
+
+
+def stream_stations(ctx, source: str, batch_size: int = streaming.DEFAULT_BATCH_SIZE) -> int:
+    """
+    Consolide les stations d'une ville par lots Arrow lus en flux (moteur "streaming") ; retourne le nombre de lignes écrites.
 
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
-    data = {}
-    with open(f"data/raw_data/{today_date}/paris_realtime_bicycle_data.json") as fd:
-        data = json.load(fd)
-
-    raw_data_df = pd.json_normalize(data)
-
-    station_data_df = con.execute("SELECT CODE, ID FROM CONSOLIDATE_STATION").fetchdf()
-    merged_df = raw_data_df.merge(station_data_df[['CODE', 'ID']], how='left', left_on='stationcode', right_on='CODE')
-    
-    # Vérifier les lignes sans correspondance (ID manquant)
-    if merged_df['ID'].isnull().any():
-        print("Attention : certaines stations n'ont pas pu être associées à un ID.")
-    
-    # Création du DataFrame consolidé
-    station_statement_df = pd.DataFrame({
-        "STATION_ID": merged_df["ID"],  # Utiliser "ID" comme identifiant de station
-        "BICYCLE_DOCKS_AVAILABLE": merged_df["numdocksavailable"],
-        "BICYCLE_AVAILABLE": merged_df["numbikesavailable"],
-        "LAST_STATEMENT_DATE": pd.to_datetime(merged_df["duedate"]),
-        "CREATED_DATE": date.today()        
-    })
-
-    # Supprimer les doublons et réinitialiser l'index
-    station_statement_df.drop_duplicates(inplace=True, ignore_index=True)
-    
-    # Insérer les données dans la table de faits CONSOLIDATE_STATION_STATEMENT
-    con.execute("INSERT OR REPLACE INTO CONSOLIDATE_STATION_STATEMENT SELECT * FROM station_statement_df;")
-
+    - Le pic de mémoire dépend de `batch_size`, pas de la taille du flux.
+    - Une seule ligne par code station dans un lot (première occurrence) ; entre deux lots, la dernière remplace la première.
+    """
+    adapter = FEED_ADAPTERS[source]
+    constants = {"CREATED_DATE": ctx.run_date, "SOURCE": source}
+    nb_rows = 0
+    for batch in streaming.iter_record_batches(ctx.raw_file(adapter["realtime"]["file_name"]), list(adapter["station_columns"].values()), batch_size):
+        ctx.record(rows_read = batch.num_rows)
+        station_data_table = streaming.map_batch(batch, adapter["station_columns"], adapter["coercions"], STATION_COLUMNS, constants)
+        nb_rows += insert_stations(ctx.con, streaming.first_rows(station_data_table, "CODE"))
+    return nb_rows
 
-def consolidate_station_statement_paris_data():
 
+def stream_station_statements(ctx, source: str, batch_size: int = streaming.DEFAULT_BATCH_SIZE) -> int:
     """
-    Consolide les données de disponibilité des stations dans la table CONSOLIDATE_STATION_STATEMENT.
+    Consolide les relevés d'une ville par lots Arrow lus en flux (moteur "streaming") ; retourne le nombre de lignes écrites.
 
-    - Récupère les IDs des stations depuis la table CONSOLIDATE_STATION.
-    - Effectue une jointure entre les données brutes et les IDs des stations.
-    - Insère ou remplace les données dans la table CONSOLIDATE_STATION_STATEMENT.
-    
+    - Le pic de mémoire dépend de `batch_size`, pas de la taille du flux.
+    - Chaque lot est lu par DuckDB sans copie, puis inséré avec son ID de station (`insert_station_statements`).
+    """
+    adapter = FEED_ADAPTERS[source]
+    constants = {"CREATED_DATE": ctx.run_date, "SNAPSHOT_TS": ctx.snapshot_ts, "SOURCE": source}
+    nb_rows = 0
+    for batch in streaming.iter_record_batches(ctx.raw_file(adapter["realtime"]["file_name"]), list(adapter["statement_columns"].values()), batch_size):
+        ctx.record(rows_read = batch.num_rows)
+        station_statement_table = streaming.map_batch(batch, adapter["statement_columns"], adapter["coercions"], STATEMENT_COLUMNS, constants)
+        nb_rows += insert_station_statements(ctx.con, station_statement_table, ctx.statement_storage)
+    return nb_rows
+
+
+def load_adapter_snapshot(ctx, source: str, localisation: bool) -> dict:
+    """Fichiers bruts d'une ville pour la date d'exécution : `realtime` et, si demandé et déclaré, `localisation`."""
+    adapter = FEED_ADAPTERS[source]
+    snapshot = {"realtime": ctx.load_snapshot(source, adapter["realtime"]["file_name"])}
+    if localisation and adapter["localisation"] is not None:
+        snapshot["localisation"] = ctx.load_snapshot(source, adapter["localisation"]["file_name"])
+    return snapshot
+
+
+def map_columns(raw_data_df, columns: dict, coercions: dict, target_columns: list) -> pd.DataFrame:
     """
+    Renomme les champs d'un flux vers les colonnes cibles (opérations vectorisées, sans boucle sur les lignes).
 
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
-    data = {}
-    with open(f"data/raw_data/{today_date}/paris_realtime_bicycle_data.json") as fd:
-        data = json.load(fd)
-
-    raw_data_df = pd.json_normalize(data)
-
-    station_data_df = con.execute("SELECT CODE, ID FROM CONSOLIDATE_STATION").fetchdf()
-    merged_df = raw_data_df.merge(station_data_df[['CODE', 'ID']], how='left', left_on='stationcode', right_on='CODE')
-    
-    # Vérifier les lignes sans correspondance (ID manquant)
-    if merged_df['ID'].isnull().any():
-        print("Attention : certaines stations n'ont pas pu être associées à un ID.")
-    
-    # Création du DataFrame consolidé
-    station_statement_df = pd.DataFrame({
-        "STATION_ID": merged_df["ID"],  # Utiliser "ID" comme identifiant de station
-        "BICYCLE_DOCKS_AVAILABLE": merged_df["numdocksavailable"],
-        "BICYCLE_AVAILABLE": merged_df["numbikesavailable"],
-        "LAST_STATEMENT_DATE": pd.to_datetime(merged_df["duedate"]),
-        "CREATED_DATE": date.today()        
+    - Les colonnes cibles non déclarées par la ville sont vides (NULL).
+    - Les conversions de type déclarées sont appliquées dans l'ordre (`datetime` ou type pandas).
+    """
+    mapped_df = pd.DataFrame({
+        column: raw_data_df[columns[column]] if column in columns else None
+        for column in target_columns
     })
+    for column, conversions in coercions.items():
+        if column not in columns:
+            continue
+        for conversion in conversions:
+            if conversion == "datetime":
+                mapped_df[column] = pd.to_datetime(mapped_df[column])
+            else:
+                mapped_df[column] = mapped_df[column].astype(conversion)
+    return mapped_df
+
+
+def normalize_stations(snapshots: dict, created_date) -> pd.DataFrame:
+    """
+    Transforme les données brutes de plusieurs villes au format de la table CONSOLIDATE_STATION (sans la colonne ID).
 
-    # Supprimer les doublons et réinitialiser l'index
-    station_statement_df.drop_duplicates(inplace=True, ignore_index=True)
-    
-    # Insérer les données dans la table de faits CONSOLIDATE_STATION_STATEMENT
-    con.execute("INSERT OR REPLACE INTO CONSOLIDATE_STATION_STATEMENT SELECT * FROM station_statement_df;")
+    - `snapshots` : source -> {"realtime": DataFrame, "localisation": DataFrame} (voir `load_adapter_snapshot`).
+    - Les villes avec un flux de localisation sont rapprochées de leur référentiel (commune, code INSEE) :
+      par identifiant, sinon par la localisation la plus proche (`spatial.match_localisation`).
+    - Une seule ligne par (source, code station) : première occurrence dans le flux.
+    - Retourne un seul DataFrame pour toutes les villes, avec une colonne SOURCE.
+    """
+    station_frames = []
+    for source, snapshot in snapshots.items():
+        adapter = FEED_ADAPTERS[source]
+        raw_data_df = snapshot["realtime"]
+
+        localisation = adapter["localisation"]
+        if localisation is not None:
+            raw_data_df, match_stats = spatial.match_localisation(
+                raw_data_df,
+                snapshot["localisation"],
+                code_column = localisation["code_column"],
+                id_column = localisation["id_column"],
+                realtime_coordinates = localisation["realtime_coordinates"],
+                localisation_coordinates = localisation["localisation_coordinates"],
+            )
+            spatial.report_match(adapter["label"], match_stats)
+
+        station_data_df = map_columns(raw_data_df, adapter["station_columns"], adapter["coercions"], STATION_COLUMNS)
+        station_data_df.drop_duplicates(subset = ["CODE"], inplace = True, ignore_index = True)
+        station_frames.append(station_data_df.assign(SOURCE = source))
+
+    return unify_frames(station_frames, {"CREATED_DATE": created_date})
+
+
+def normalize_statements(snapshots: dict, created_date, snapshot_ts) -> pd.DataFrame:
+    """
+    Transforme les données brutes de plusieurs villes au format de la table CONSOLIDATE_STATION_STATEMENT.
 
+    - `snapshots` : source -> {"realtime": DataFrame}.
+    - La colonne CODE (code station) remplace STATION_ID, résolu au chargement par `insert_station_statements`.
+    - Retourne un seul DataFrame pour toutes les villes, avec une colonne SOURCE, sans doublons.
+    """
+    statement_frames = [
+        map_columns(snapshot["realtime"], FEED_ADAPTERS[source]["statement_columns"], FEED_ADAPTERS[source]["coercions"], STATEMENT_COLUMNS)
+        .assign(SOURCE = source)
+        for source, snapshot in snapshots.items()
+    ]
+    station_statement_df = unify_frames(statement_frames, {"CREATED_DATE": created_date, "SNAPSHOT_TS": snapshot_ts})
+    station_statement_df.drop_duplicates(inplace = True, ignore_index = True)
+    return station_statement_df
 
-def consolidate_station_statement_nantes_data():
 
+def unify_frames(frames: list, constants: dict) -> pd.DataFrame:
     """
-    Consolide les données de disponibilité des stations dans la table CONSOLIDATE_STATION_STATEMENT.
+    Concatène les DataFrames de plusieurs villes et harmonise les types des colonnes communes.
 
-    - Récupère les IDs des stations depuis la table CONSOLIDATE_STATION.
-    - Effectue une jointure entre les données brutes et les IDs des stations.
-    - Insère ou remplace les données dans la table CONSOLIDATE_STATION_STATEMENT.
-    
+    - CODE et CITY_CODE sont convertis en texte (codes numériques pour certaines villes, texte pour d'autres).
+    - Les colonnes constantes (`CREATED_DATE`, `SNAPSHOT_TS`) sont ajoutées une seule fois, après la concaténation.
     """
+    unified_df = pd.concat(frames, ignore_index = True)
+    for column in ("CODE", "CITY_CODE"):
+        if column in unified_df:
+            unified_df[column] = unified_df[column].astype("string")
+    for column, value in constants.items():
+        unified_df[column] = value
+    return unified_df
 
-    con = duckdb.connect(database = "data/duckdb/mobility_analysis.duckdb", read_only = False)
-    data = {}
-    with open(f"data/raw_data/{today_date}/nantes_realtime_bicycle_data.json") as fd:
-        data = json.load(fd)
-
-    raw_data_df = pd.json_normalize(data)
-
-    station_data_df = con.execute("SELECT CODE, ID,CITY_NAME FROM CONSOLIDATE_STATION").fetchdf()
-    merged_df = raw_data_df.merge(station_data_df[['CODE', 'ID','CITY_NAME']], how='inner', left_on='number', right_on='CODE')
-    
-    # Vérifier les lignes sans correspondance (ID manquant)
-    if merged_df['ID'].isnull().any():
-        print("Attention : certaines stations n'ont pas pu être associées à un ID.")
-
-    # Création du DataFrame consolidé
-    station_statement_df = pd.DataFrame({
-        "STATION_ID": merged_df["ID"],  # Utiliser "ID" comme identifiant de station
-        "BICYCLE_DOCKS_AVAILABLE": merged_df["available_bike_stands"],
-        "BICYCLE_AVAILABLE": merged_df["available_bikes"],
-        "LAST_STATEMENT_DATE": pd.to_datetime(merged_df["last_update"]),
-        "CREATED_DATE": date.today()        
-    })
 
-    # Supprimer les doublons et réinitialiser l'index
-    station_statement_df.drop_duplicates(inplace=True, ignore_index=True)
-    
-    # Insérer les données dans la table de faits CONSOLIDATE_STATION_STATEMENT
-    con.execute("INSERT OR REPLACE INTO CONSOLIDATE_STATION_STATEMENT SELECT * FROM station_statement_df;")
+def insert_stations(con, station_data_df):
+    """
+    Insère des stations normalisées (toutes villes confondues) dans CONSOLIDATE_STATION avec leur ID permanent.
 
+    - `station_data_df` : DataFrame pandas ou table Arrow (moteur "streaming").
+    - Les stations jamais vues sont ajoutées au registre STATION_KEY_REGISTRY en un seul INSERT.
+    - Les IDs sont résolus par une seule jointure sur le registre (source, code station).
+    - Retourne le nombre de lignes écrites.
+    """
+    utils.register_station_keys(con, station_data_df["SOURCE"], station_data_df["CODE"])
+    return con.execute(
+        f"""
+        INSERT OR REPLACE INTO CONSOLIDATE_STATION
+        SELECT k.ID, {", ".join(f"s.{column}" for column in STATION_COLUMNS)}
+        FROM station_data_df s
+        {utils.station_key_join_sql("s.CODE", source_expression = "s.SOURCE")};
+        """
+    ).fetchone()[0]
+
+
+def insert_station_statements(con, station_statement_df, storage: str = "full"):
+    """
+    Insère des relevés normalisés (toutes villes confondues) dans CONSOLIDATE_STATION_STATEMENT.
+
+    - `station_statement_df` : DataFrame pandas ou table Arrow (moteur "streaming") ; les lignes en double sont ignorées.
+    - STATION_ID est résolu par une seule jointure sur le registre des stations (source, code station).
+    - Les relevés sans station connue sont mis en quarantaine pour les villes en jointure LEFT (UNKNOWN_STATION),
+      ignorés pour les villes en jointure INNER (`statement_join` du registre).
+    - Les relevés sont validés par les règles de `data_quality` avant chargement.
+    - `storage = "delta"` : seuls les changements sont écrits dans STATION_STATEMENT_INTERVAL.
+    - Retourne le nombre de lignes écrites.
+    """
+    left_join_sources = [source for source, adapter in FEED_ADAPTERS.items() if adapter["statement_join"] == "LEFT"]
+    candidates_sql = f"""
+        SELECT s.SOURCE, s.CODE, k.ID AS STATION_ID, {", ".join(f"s.{column}" for column in STATEMENT_COLUMNS if column != "CODE")}
+        FROM (SELECT DISTINCT * FROM station_statement_df) s
+        {utils.station_key_join_sql("s.CODE", "LEFT", source_expression = "s.SOURCE")}
+        WHERE k.ID IS NOT NULL OR list_contains(?, s.SOURCE)
+    """
+    # la validation s'exécute dans `data_quality` : le DataFrame y est visible sous un nom enregistré
+    con.register("station_statement_df", station_statement_df)
+    try:
+        return data_quality.load_statements(con, candidates_sql, [left_join_sources], storage = storage)
+    finally:
+        con.unregister("station_statement_df")
@@ -0,0 +1,307 @@
+"""
+Moteur de consolidation "duckdb" : les fichiers bruts sont lus directement par DuckDB
+(`read_json`) et le mapping vers les tables `CONSOLIDATE_*` est fait en SQL.
+
+Ces fonctions produisent les mêmes lignes que les fonctions pandas de `data_consolidation.py`,
+elles sont sélectionnées par ville via `PipelineContext(consolidation_engines = {...})`.
+"""
+
+import time
+
+import data_quality
+import spatial
+import utils
+
+# Projection des colonnes lues dans chaque flux : seules ces clés sont matérialisées par DuckDB.
+PARIS_REALTIME_COLUMNS = """{
+    stationcode: 'VARCHAR',
+    name: 'VARCHAR',
+    is_installed: 'VARCHAR',
+    capacity: 'BIGINT',
+    numdocksavailable: 'BIGINT',
+    numbikesavailable: 'BIGINT',
+    duedate: 'VARCHAR',
+    coordonnees_geo: 'STRUCT(lon DOUBLE, lat DOUBLE)',
+    nom_arrondissement_communes: 'VARCHAR',
+    code_insee_commune: 'VARCHAR'
+}"""
+
+NANTES_REALTIME_COLUMNS = """{
+    number: 'VARCHAR',
+    name: 'VARCHAR',
+    address: 'VARCHAR',
+    bike_stands: 'BIGINT',
+    available_bike_stands: 'VARCHAR',
+    available_bikes: 'VARCHAR',
+    last_update: 'VARCHAR',
+    position: 'STRUCT(lon DOUBLE, lat DOUBLE)'
+}"""
+
+NANTES_LOCALISATION_COLUMNS = """{
+    idobj: 'BIGINT',
+    localisation: 'VARCHAR',
+    insee: 'BIGINT',
+    commune: 'VARCHAR',
+    geo_point_2d: 'STRUCT(lon DOUBLE, lat DOUBLE)'
+}"""
+
+COMMUNES_COLUMNS = """{
+    code: 'VARCHAR',
+    nom: 'VARCHAR',
+    population: 'BIGINT'
+}"""
+
+
+def read_json_sql(columns: str) -> str:
+    """Appel `read_json` paramétré (`?` = chemin du fichier) avec projection des colonnes."""
+    return f"read_json(?, format = 'array', columns = {columns})"
+
+
+def consolidate_city_data(ctx):
+    """
+    Consolide les données des communes dans la table CONSOLIDATE_CITY, en SQL.
+
+    - Lit uniquement les colonnes `code`, `nom` et `population` du fichier des communes.
+    - Supprime les doublons et ajoute la date d'exécution.
+    """
+    sql_statement = f"""
+        INSERT OR REPLACE INTO CONSOLIDATE_CITY
+        SELECT DISTINCT
+            code AS ID,
+            nom AS NAME,
+            population AS NB_INHABITANTS,
+            CAST(? AS DATE) AS CREATED_DATE
+        FROM {read_json_sql(COMMUNES_COLUMNS)};
+    """
+    ctx.record(rows_written = ctx.con.execute(sql_statement, [ctx.run_date, ctx.raw_file("communes_data.json")]).fetchone()[0])
+
+
+def consolidate_station_paris_data(ctx):
+    """
+    Consolide les stations de Paris dans la table CONSOLIDATE_STATION, en SQL.
+
+    - Dépile la structure `coordonnees_geo` en LONGITUDE / LATITUDE.
+    - Garde une ligne par code station (première occurrence).
+    - L'ID est l'ID permanent de la station dans STATION_KEY_REGISTRY (attribué aux nouvelles stations).
+    """
+    con = ctx.con
+    raw_file = ctx.raw_file("paris_realtime_bicycle_data.json")
+    register_codes(ctx, "paris", "stationcode", PARIS_REALTIME_COLUMNS, raw_file)
+
+    sql_statement = f"""
+        INSERT OR REPLACE INTO CONSOLIDATE_STATION
+        WITH raw AS (
+            SELECT
+                row_number() OVER () AS ROW_INDEX,
+                stationcode AS CODE,
+                name AS NAME,
+                nom_arrondissement_communes AS CITY_NAME,
+                code_insee_commune AS CITY_CODE,
+                NULL AS ADDRESS,
+                coordonnees_geo.lon AS LONGITUDE,
+                coordonnees_geo.lat AS LATITUDE,
+                is_installed AS STATUS,
+                CAST(? AS DATE) AS CREATED_DATE,
+                capacity AS CAPACITTY
+            FROM {read_json_sql(PARIS_REALTIME_COLUMNS)}
+        )
+        SELECT k.ID, raw.* EXCLUDE (ROW_INDEX)
+        FROM raw
+        {utils.station_key_join_sql("raw.CODE")}
+        QUALIFY row_number() OVER (PARTITION BY raw.CODE ORDER BY ROW_INDEX) = 1
+        ORDER BY ROW_INDEX;
+    """
+    ctx.record(rows_written = con.execute(sql_statement, [ctx.run_date, raw_file, "paris"]).fetchone()[0])
+
+
+def consolidate_station_nantes_data(ctx):
+    """
+    Consolide les stations de Nantes dans la table CONSOLIDATE_STATION, en SQL.
+
+    - Rapproche chaque station de sa localisation : par identifiant (`number` = `idobj`), sinon par la
+      localisation la plus proche de sa position, en ne comparant que les cellules voisines d'une grille.
+    - Dépile la structure `position` en LONGITUDE / LATITUDE.
+    - L'ID est l'ID permanent de la station dans STATION_KEY_REGISTRY (attribué aux nouvelles stations).
+    """
+    con = ctx.con
+    realtime_file = ctx.raw_file("nantes_realtime_bicycle_data.json")
+    register_codes(ctx, "nantes", "number", NANTES_REALTIME_COLUMNS, realtime_file)
+
+    max_distance_m = spatial.LOCALISATION_MAX_DISTANCE_M
+    realtime_cell_x, realtime_cell_y = spatial.grid_cell_sql("position.lon", "position.lat", max_distance_m)
+    localisation_cell_x, localisation_cell_y = spatial.grid_cell_sql("geo_point_2d.lon", "geo_point_2d.lat", max_distance_m)
+    distance = spatial.haversine_sql("r.position.lon", "r.position.lat", "l.geo_point_2d.lon", "l.geo_point_2d.lat")
+
+    station_sql = f"""
+        WITH realtime AS (
+            SELECT row_number() OVER () AS LEFT_INDEX, *, {realtime_cell_x} AS CELL_X, {realtime_cell_y} AS CELL_Y
+            FROM {read_json_sql(NANTES_REALTIME_COLUMNS)}
+        ),
+        localisation AS (
+            SELECT row_number() OVER () AS RIGHT_INDEX, *, {localisation_cell_x} AS CELL_X, {localisation_cell_y} AS CELL_Y
+            FROM {read_json_sql(NANTES_LOCALISATION_COLUMNS)}
+        ),
+        by_id AS (
+            SELECT r.LEFT_INDEX, l.RIGHT_INDEX, 'id' AS MATCH_METHOD, {distance} AS MATCH_DISTANCE_M
+            FROM realtime r
+            JOIN localisation l ON CAST(l.idobj AS VARCHAR) = r.number
+            QUALIFY row_number() OVER (PARTITION BY r.LEFT_INDEX ORDER BY l.RIGHT_INDEX) = 1
+        ),
+        by_distance AS (
+            SELECT r.LEFT_INDEX, l.RIGHT_INDEX, 'distance' AS MATCH_METHOD, {distance} AS MATCH_DISTANCE_M
+            FROM realtime r
+            JOIN localisation l
+                ON l.CELL_X BETWEEN r.CELL_X - 1 AND r.CELL_X + 1
+                AND l.CELL_Y BETWEEN r.CELL_Y - 1 AND r.CELL_Y + 1
+            WHERE r.LEFT_INDEX NOT IN (SELECT LEFT_INDEX FROM by_id)
+                AND {distance} <= {max_distance_m}
+            QUALIFY row_number() OVER (PARTITION BY r.LEFT_INDEX ORDER BY MATCH_DISTANCE_M, l.RIGHT_INDEX) = 1
+        ),
+        matched AS (
+            SELECT * FROM by_id
+            UNION ALL
+            SELECT * FROM by_distance
+        )
+        SELECT
+            r.LEFT_INDEX,
+            m.MATCH_METHOD,
+            m.MATCH_DISTANCE_M,
+            r.number AS CODE,
+            r.name AS NAME,
+            l.commune AS CITY_NAME,
+            CAST(l.insee AS VARCHAR) AS CITY_CODE,
+            r.address AS ADDRESS,
+            r.position.lon AS LONGITUDE,
+            r.position.lat AS LATITUDE,
+            NULL AS STATUS,
+            CAST(? AS DATE) AS CREATED_DATE,
+            r.bike_stands AS CAPACITTY
+        FROM realtime r
+        LEFT JOIN matched m ON m.LEFT_INDEX = r.LEFT_INDEX
+        LEFT JOIN localisation l ON l.RIGHT_INDEX = m.RIGHT_INDEX
+    """
+    parameters = [
+        realtime_file,
+        ctx.raw_file("nantes_bicycle_station_localisation_data.json"),
+        ctx.run_date,
+    ]
+
+    started_at = time.perf_counter()
+    nb_stations, by_id, by_distance, unmatched, max_distance = con.execute(
+        f"""
+        SELECT
+            COUNT(*),
+            count_if(MATCH_METHOD = 'id'),
+            count_if(MATCH_METHOD = 'distance'),
+            count_if(MATCH_METHOD IS NULL),
+            MAX(MATCH_DISTANCE_M)
+        FROM ({station_sql})
+        """,
+        parameters,
+    ).fetchone()
+    spatial.report_match("Nantes", {
+        "nb_stations": nb_stations,
+        "by_id": by_id,
+        "by_distance": by_distance,
+        "unmatched": unmatched,
+        "max_distance_m": max_distance,
+        "duration_ms": (time.perf_counter() - started_at) * 1000,
+    })
+
+    sql_statement = f"""
+        INSERT OR REPLACE INTO CONSOLIDATE_STATION
+        SELECT k.ID, station.* EXCLUDE (LEFT_INDEX, MATCH_METHOD, MATCH_DISTANCE_M)
+        FROM ({station_sql}) station
+        {utils.station_key_join_sql("station.CODE")}
+        QUALIFY row_number() OVER (PARTITION BY station.CODE ORDER BY LEFT_INDEX) = 1
+        ORDER BY LEFT_INDEX;
+    """
+    ctx.record(rows_written = con.execute(sql_statement, parameters + ["nantes"]).fetchone()[0])
+
+
+def register_codes(ctx, source, code_column, columns, raw_file):
+    """Ajoute au registre STATION_KEY_REGISTRY les codes station d'un flux encore inconnus."""
+    codes = ctx.con.execute(f"SELECT list({code_column}) FROM {read_json_sql(columns)}", [raw_file]).fetchone()[0] or []
+    ctx.record(rows_read = len(codes))
+    utils.register_station_keys(ctx.con, source, codes)
+
+
+def consolidate_station_statement_paris_data(ctx):
+    """
+    Consolide la disponibilité des stations de Paris dans CONSOLIDATE_STATION_STATEMENT, en SQL.
+
+    - Joint les données brutes au registre des stations (STATION_KEY_REGISTRY) sur le code station.
+    - Insère ou remplace les données dans la table CONSOLIDATE_STATION_STATEMENT.
+    """
+    insert_statement(
+        ctx,
+        file_name = "paris_realtime_bicycle_data.json",
+        columns = PARIS_REALTIME_COLUMNS,
+        source = "paris",
+        code_column = "stationcode",
+        docks_column = "numdocksavailable",
+        bikes_column = "numbikesavailable",
+        statement_date_column = "duedate",
+        join_type = "LEFT",
+    )
+
+
+def consolidate_station_statement_nantes_data(ctx):
+    """
+    Consolide la disponibilité des stations de Nantes dans CONSOLIDATE_STATION_STATEMENT, en SQL.
+
+    - Joint les données brutes au registre des stations (STATION_KEY_REGISTRY) sur le numéro de station.
+    - Insère ou remplace les données dans la table CONSOLIDATE_STATION_STATEMENT.
+    """
+    insert_statement(
+        ctx,
+        file_name = "nantes_realtime_bicycle_data.json",
+        columns = NANTES_REALTIME_COLUMNS,
+        source = "nantes",
+        code_column = "number",
+        docks_column = "available_bike_stands",
+        bikes_column = "available_bikes",
+        statement_date_column = "last_update",
+        join_type = "INNER",
+    )
+
+
+def insert_statement(ctx, file_name, columns, source, code_column, docks_column, bikes_column, statement_date_column, join_type):
+    """
+    Requête commune aux deux villes pour CONSOLIDATE_STATION_STATEMENT.
+
+    - Les relevés sans ID de station (jointure LEFT) sont mis en quarantaine par la validation (`data_quality`).
+    - Les compteurs sont validés puis castés en INTEGER, la date de relevé est castée en TIMESTAMPTZ.
+    """
+    con = ctx.con
+    raw_file = ctx.raw_file(file_name)
+
+    candidates_sql = f"""
+        SELECT DISTINCT
+            CAST(? AS VARCHAR) AS SOURCE,
+            r.{code_column} AS CODE,
+            k.ID AS STATION_ID,
+            r.{docks_column} AS BICYCLE_DOCKS_AVAILABLE,
+            r.{bikes_column} AS BICYCLE_AVAILABLE,
+            CAST(r.{statement_date_column} AS TIMESTAMPTZ) AS LAST_STATEMENT_DATE,
+            CAST(? AS DATE) AS CREATED_DATE,
+            CAST(? AS TIMESTAMP) AS SNAPSHOT_TS
+        FROM {read_json_sql(columns)} r
+        {utils.station_key_join_sql(f"r.{code_column}", join_type)}
+    """
+    parameters = [source, ctx.run_date, ctx.snapshot_ts, raw_file, source]
+
+    ctx.record(rows_read = con.execute(f"SELECT COUNT(*) FROM ({candidates_sql})", parameters).fetchone()[0])
+    ctx.record(rows_written = data_quality.load_statements(con, candidates_sql, parameters, storage = ctx.statement_storage))
+
+
+# Requêtes SQL propres à chaque ville, appelées par les étapes génériques de `data_consolidation.py`
+# pour les villes consolidées avec le moteur "duckdb".
+STATION_CONSOLIDATIONS = {
+    "paris": consolidate_station_paris_data,
+    "nantes": consolidate_station_nantes_data,
+}
+STATEMENT_CONSOLIDATIONS = {
+    "paris": consolidate_station_statement_paris_data,
+    "nantes": consolidate_station_statement_nantes_data,
+}
@@ -1,73 +1,196 @@
-import os
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 import requests
-import utils
+from requests.adapters import HTTPAdapter
 
-def get_paris_realtime_bicycle_data():
+from feed_adapters import ingestion_feeds
+
+COMMUNES_URL = "https://geo.api.gouv.fr/communes"
+
+# Flux ingérés par le pipeline : URL, fichier de destination et timeout (connexion, lecture) en secondes.
+# Les flux des villes viennent du registre `feed_adapters.FEED_ADAPTERS`.
+# Un flux de référence (`ttl_hours`) n'est redemandé qu'après expiration du cache, par une requête conditionnelle ;
+# `params` limite les champs renvoyés par l'API aux colonnes consolidées.
+FEEDS = {
+    **ingestion_feeds(),
+    "communes": {
+        "url": COMMUNES_URL,
+        "params": {"fields": "code,nom,population"},
+        "file_name": "communes_data.json",
+        "timeout": (5, 120),
+        "ttl_hours": 24,
+    },
+}
+
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 1.0
+# Erreurs réseau relancées : connexion impossible ou coupée, délai dépassé.
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+CHUNK_SIZE = 64 * 1024
+
+_session = None
+
+
+def get_session(pool_size: int = len(FEEDS)) -> requests.Session:
+    """
+    Retourne la session HTTP partagée du processus.
+
+    - Les connexions sont gardées ouvertes (keep-alive) et réutilisées d'un appel à l'autre.
+    - La taille du pool permet de télécharger tous les flux en parallèle.
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+
+def fetch_feed(feed: dict, ctx, session: requests.Session = None) -> int:
+    """
+    Télécharge un flux et le stocke dans la partition de l'exécution, en streaming.
+
+    - Le corps de la réponse est compressé et hashé par blocs de `CHUNK_SIZE` octets, sans être gardé en mémoire.
+    - L'écriture est atomique (fichier temporaire puis renommage) : un fichier à moitié écrit n'est jamais consolidé.
+    - Un contenu identique à un objet déjà stocké n'est pas réécrit (voir `raw_store.RawStore`).
+    - En cas d'erreur réseau, de statut 5xx ou 429, la requête est relancée
+      jusqu'à `MAX_RETRIES` fois avec un délai exponentiel (`BACKOFF_FACTOR`) ;
+      les autres erreurs (ex. 404, 400) sont relevées immédiatement.
+    - Flux de référence (`ttl_hours`) : pendant la durée de validité du cache, aucune requête n'est faite et la partition
+      référence l'objet déjà stocké ; ensuite la requête est conditionnelle (If-None-Match / If-Modified-Since)
+      et une réponse 304 réutilise aussi l'objet stocké.
+    - Retourne le nombre d'octets (non compressés) reçus.
+    """
+    session = session or get_session()
+    store = ctx.raw_store
+    reference = store.read_reference(feed["file_name"]) if "ttl_hours" in feed else None
+
+    if reference is not None and datetime.now() - datetime.fromisoformat(reference["fetched_at"]) < timedelta(hours = feed["ttl_hours"]):
+        store.update_manifest(ctx.partition, feed["file_name"], reference["entry"])
+        return 0
+
+    headers = {}
+    if reference is not None and reference.get("etag"):
+        headers["If-None-Match"] = reference["etag"]
+    if reference is not None and reference.get("last_modified"):
+        headers["If-Modified-Since"] = reference["last_modified"]
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with session.get(
+                feed["url"], params = feed.get("params"), headers = headers, timeout = feed["timeout"], stream = True
+            ) as response:
+                if response.status_code == 304 and reference is not None:
+                    entry, size = reference["entry"], 0
+                    store.update_manifest(ctx.partition, feed["file_name"], entry)
+                else:
+                    response.raise_for_status()
+                    entry = store.write(response.iter_content(chunk_size = CHUNK_SIZE), ctx.partition, feed["file_name"])
+                    size = entry["size"]
+                    ctx.record(bytes_downloaded = size)
+
+                if "ttl_hours" in feed:
+                    store.write_reference(feed["file_name"], {
+                        "entry": entry,
+                        "etag": response.headers.get("ETag", headers.get("If-None-Match")),
+                        "last_modified": response.headers.get("Last-Modified", headers.get("If-Modified-Since")),
+                        "fetched_at": datetime.now().isoformat(timespec = "seconds"),
+                    })
+                return size
+        except requests.RequestException as error:
+            if attempt == MAX_RETRIES or not is_retryable(error):
+                raise
+            delay = BACKOFF_FACTOR * 2 ** attempt
+            print(f"Erreur lors de la récupération de {feed['url']} ({error}), nouvel essai dans {delay}s.")
+            time.sleep(delay)
+
+
+def is_retryable(error: requests.RequestException) -> bool:
+    """Erreur passagère : erreur réseau (`RETRY_EXCEPTIONS`) ou statut HTTP 5xx / 429."""
+    if isinstance(error, requests.HTTPError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, RETRY_EXCEPTIONS)
+
+
+def ingest_all_feeds(ctx, feeds: dict = None, max_workers: int = None, session: requests.Session = None) -> dict:
+    """
+    Récupère tous les flux en parallèle (un thread par flux) sur la session HTTP partagée (ou `session`).
+
+    - Chaque flux est stocké dans la partition de données brutes de l'exécution.
+    - Les flux en succès sont conservés même si un autre flux échoue ; l'erreur est relevée à la fin.
+    - Retourne le nombre d'octets (non compressés) reçus par flux.
+    """
+    feeds = feeds or FEEDS
+    session = session or get_session()
+    written = {}
+    errors = {}
+
+    with ThreadPoolExecutor(max_workers = max_workers or len(feeds)) as executor:
+        futures = {
+            name: executor.submit(fetch_feed, feed, ctx, session)
+            for name, feed in feeds.items()
+        }
+        for name, future in futures.items():
+            try:
+                written[name] = future.result()
+            except Exception as error:
+                errors[name] = error
+
+    if errors:
+        raise RuntimeError(f"Échec de l'ingestion des flux : {errors}")
+    return written
+
+
+def get_paris_realtime_bicycle_data(ctx):
     """
     Récupère les données en temps réel de la disponibilité des vélos à Paris.
 
     - Fait une requête HTTP GET pour récupérer les données JSON depuis l'API OpenData Paris.
     - Les données récupérées concernent la disponibilité en temps réel des vélos Vélib' à Paris.
-    - Sérialise les données JSON et les enregistre dans un fichier local sous forme de fichier `.json`.
+    - Enregistre les données JSON en streaming dans le stockage local compressé (`raw_store`).
 
     """
-    
-    url = "https://opendata.paris.fr/api/explore/v2.1/catalog/datasets/velib-disponibilite-en-temps-reel/exports/json"
-    
-    response = requests.request("GET", url)
-    
-    utils.serialize_data(response.text, "paris_realtime_bicycle_data.json")
-
-def get_nantes_realtime_bicycle_data():
+
+    fetch_feed(FEEDS["paris_realtime"], ctx)
+
+def get_nantes_realtime_bicycle_data(ctx):
     """
     Récupère les données en temps réel de la disponibilité des vélos à Nantes.
 
     - Fait une requête HTTP GET pour récupérer les données JSON depuis l'API OpenData Nantes.
     - Les données récupérées concernent la disponibilité en temps réel des vélos ' à Nantes.
-    - Sérialise les données JSON et les enregistre dans un fichier local sous forme de fichier `.json`.
+    - Enregistre les données JSON en streaming dans le stockage local compressé (`raw_store`).
 
     """
-    
-    url = "https://data.nantesmetropole.fr/api/explore/v2.1/catalog/datasets/244400404_disponibilite-temps-reel-velos-libre-service-naolib-nantes-metropole/exports/json"
-    
-    response = requests.request("GET", url)
-    
-    utils.serialize_data(response.text, "nantes_realtime_bicycle_data.json")
-
-def get_nantes_realtime_bicycle_station_localisation_data():
+
+    fetch_feed(FEEDS["nantes_realtime"], ctx)
+
+def get_nantes_realtime_bicycle_station_localisation_data(ctx):
     """
     Récupère les données en temps réel de la localisation des stations de vélos à Nantes.
 
     - Fait une requête HTTP GET pour récupérer les données JSON depuis l'API OpenData Nantes.
     - Les données récupérées concernent la localisation en temps réel des vélos à Nantes.
-    - Sérialise les données JSON et les enregistre dans un fichier local sous forme de fichier `.json`.
+    - Enregistre les données JSON en streaming dans le stockage local compressé (`raw_store`).
 
     """
-    
-    url = "https://data.nantesmetropole.fr/api/explore/v2.1/catalog/datasets/244400404_stations-velos-libre-service-nantes-metropole/exports/json"
-    
-    response = requests.request("GET", url)
-    
-    utils.serialize_data(response.text, "nantes_bicycle_station_localisation_data.json")
 
+    fetch_feed(FEEDS["nantes_localisation"], ctx)
 
-def get_communes_data():
-    """
-    Récupère les données en temps réel de la disponibilité des vélos à Nantes.
-
-    - Fait une requête HTTP GET pour récupérer les données JSON depuis l'API OpenData Nantes.
-    - Les données récupérées concernent la disponibilité en temps réel des vélos ' à Nantes.
-    - Sérialise les données JSON et les enregistre dans un fichier local sous forme de fichier `.json`.
 
+def get_communes_data(ctx):
     """
-    
-    url = "https://geo.api.gouv.fr/communes"
-    
-    response = requests.request("GET", url)
-    
-    utils.serialize_data(response.text, "communes_data.json")
+    Récupère les données des communes de France.
 
+    - Fait une requête HTTP GET pour récupérer les données JSON depuis l'API geo.api.gouv.fr.
+    - Seuls les champs consolidés sont demandés (code INSEE, nom, population).
+    - Les communes changent rarement : le fichier est gardé en cache 24 h, puis revalidé par une requête conditionnelle.
+    - Enregistre les données JSON en streaming dans le stockage local compressé (`raw_store`).
 
+    """
 
+    fetch_feed(FEEDS["communes"], ctx)
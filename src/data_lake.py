@@ -0,0 +1,199 @@
+"""
+Lac de données Parquet : export des données consolidées en fichiers Parquet partitionnés (Hive)
+et lecture de ces fichiers par les requêtes d'agrégation, sans passer par `mobility_analysis.duckdb`.
+
+    data/lake/city/CREATED_DATE=<date>/city_0.parquet
+    data/lake/station/CITY_CODE=<code insee>/CREATED_DATE=<date>/station_0.parquet
+    data/lake/station_statement/CITY_ID=<code insee>/CREATED_DATE=<date>/snapshot_<%H%M%S>_0.parquet
+
+Chaque fichier est immuable une fois la partition exportée : plusieurs processus peuvent lire le lac en même temps.
+"""
+
+import argparse
+import os
+
+import utils
+from data_agregation import (
+    ROLLUP_CITY_SNAPSHOT_SQL,
+    ROLLUP_STATION_DAILY_SQL,
+    ROLLUP_STATION_TOTAL_SQL,
+    get_average_bikes_available_per_station,
+    get_bicycle_dock_availability_by_city,
+)
+from pipeline_context import PipelineContext
+
+LAKE_DIR = "data/lake"
+
+# Colonnes de partition de chaque jeu de données du lac, avec leur type
+# (sinon DuckDB déduit un entier pour les codes INSEE).
+LAKE_PARTITIONS = {
+    "city": {"CREATED_DATE": "DATE"},
+    "station": {"CITY_CODE": "VARCHAR", "CREATED_DATE": "DATE"},
+    "station_statement": {"CITY_ID": "VARCHAR", "CREATED_DATE": "DATE"},
+}
+
+
+def export_lake(ctx, lake_dir: str = LAKE_DIR):
+    """
+    Exporte dans le lac les partitions consolidées écrites depuis le dernier export.
+
+    - Les communes et les stations sont exportées par date (`CREATED_DATE`) ; chaque station porte sa source
+      (registre STATION_KEY_REGISTRY), qui délimite son dernier snapshot dans l'état courant.
+    - Les relevés sont exportés par snapshot (`SNAPSHOT_TS`) depuis FACT_STATION_STATEMENT,
+      partitionnés par ville (`CITY_ID`) et par date.
+    - Le nom des fichiers dépend de la partition exportée : un nouvel export remplace les mêmes fichiers.
+    """
+    con = ctx.con
+
+    for partition_key, _ in utils.pending_partitions(con, "LAKE_CITY", "CONSOLIDATE_CITY"):
+        ctx.record(rows_written = copy_to_lake(
+            con,
+            "SELECT * FROM CONSOLIDATE_CITY WHERE CREATED_DATE = ?",
+            [partition_key],
+            lake_dir,
+            "city",
+            file_name = "city",
+        ))
+    mark_exported(con, "LAKE_CITY", "CONSOLIDATE_CITY")
+
+    for partition_key, _ in utils.pending_partitions(con, "LAKE_STATION", "CONSOLIDATE_STATION"):
+        ctx.record(rows_written = copy_to_lake(
+            con,
+            """
+            SELECT s.*, k.SOURCE
+            FROM CONSOLIDATE_STATION s
+            LEFT JOIN STATION_KEY_REGISTRY k ON k.ID = s.ID
+            WHERE s.CREATED_DATE = CAST(? AS DATE)
+            """,
+            [partition_key],
+            lake_dir,
+            "station",
+            file_name = "station",
+        ))
+    mark_exported(con, "LAKE_STATION", "CONSOLIDATE_STATION")
+
+    for partition_key, _ in utils.pending_partitions(con, "LAKE_STATION_STATEMENT", "CONSOLIDATE_STATION_STATEMENT"):
+        snapshot_time = partition_key.split(" ")[1].replace(":", "")
+        ctx.record(rows_written = copy_to_lake(
+            con,
+            "SELECT * FROM FACT_STATION_STATEMENT WHERE SNAPSHOT_TS = CAST(? AS TIMESTAMP)",
+            [partition_key],
+            lake_dir,
+            "station_statement",
+            file_name = f"snapshot_{snapshot_time}",
+        ))
+    mark_exported(con, "LAKE_STATION_STATEMENT", "CONSOLIDATE_STATION_STATEMENT")
+
+
+def copy_to_lake(con, query: str, parameters: list, lake_dir: str, dataset: str, file_name: str):
+    """Écrit le résultat d'une requête en Parquet partitionné (Hive), en remplaçant les fichiers de même nom ; retourne le nombre de lignes."""
+    folder = f"{lake_dir}/{dataset}"
+    partition_by = ", ".join(LAKE_PARTITIONS[dataset])
+    os.makedirs(folder, exist_ok = True)
+    return con.execute(
+        f"""
+        COPY ({query}) TO '{folder}' (
+            FORMAT PARQUET,
+            PARTITION_BY ({partition_by}),
+            OVERWRITE_OR_IGNORE,
+            FILENAME_PATTERN '{file_name}_{{i}}'
+        );
+        """,
+        parameters,
+    ).fetchone()[0]
+
+
+def mark_exported(con, lake_table: str, source_table: str):
+    """Enregistre la high-water mark des partitions exportées (toutes les partitions en attente)."""
+    utils.mark_loaded(con, lake_table, source_table, utils.pending_partitions(con, lake_table, source_table))
+
+
+def read_lake_sql(lake_dir: str, dataset: str) -> str:
+    """Appel `read_parquet` sur un jeu de données du lac, avec lecture des colonnes de partition (colonnes absentes des anciens fichiers : NULL)."""
+    folder = f"{lake_dir}/{dataset}"
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(f"Le lac ne contient pas encore de données '{dataset}' ({folder}).")
+    return f"read_parquet('{folder}/**/*.parquet', hive_partitioning = true, hive_types = {LAKE_PARTITIONS[dataset]}, union_by_name = true)"
+
+
+def attach_lake(ctx, lake_dir: str = LAKE_DIR):
+    """
+    Crée des vues DIM_CITY, DIM_STATION, FACT_STATION_STATEMENT et CURRENT_STATION_STATE sur les fichiers du lac.
+
+    - Les requêtes d'agrégation de `data_agregation.py` s'exécutent telles quelles sur ces vues.
+    - Les agrégats (ROLLUP_*) sont des vues calculées à la volée sur FACT_STATION_STATEMENT.
+    - Les filtres sur `CITY_ID` / `CREATED_DATE` ne lisent que les dossiers de partition concernés.
+    - Les dimensions gardent la ligne la plus récente de chaque ID, comme DIM_CITY et DIM_STATION.
+    - L'état courant des stations est lu dans les relevés du dernier snapshot de chaque source, comme la table
+      CURRENT_STATION_STATE (sans heure de mise à jour, absente du lac) ; les stations exportées sans source
+      (lac antérieur) sont regroupées par ville.
+    """
+    con = ctx.con
+    con.execute(f"""
+        CREATE OR REPLACE VIEW DIM_CITY AS
+        SELECT ID, NAME, NB_INHABITANTS
+        FROM {read_lake_sql(lake_dir, "city")}
+        QUALIFY row_number() OVER (PARTITION BY ID ORDER BY CREATED_DATE DESC) = 1;
+    """)
+    con.execute(f"""
+        CREATE OR REPLACE VIEW DIM_STATION AS
+        SELECT ID, CODE, NAME, ADDRESS, LONGITUDE, LATITUDE, STATUS, CAPACITTY
+        FROM {read_lake_sql(lake_dir, "station")}
+        QUALIFY row_number() OVER (PARTITION BY ID ORDER BY CREATED_DATE DESC) = 1;
+    """)
+    con.execute(f"""
+        CREATE OR REPLACE VIEW FACT_STATION_STATEMENT AS
+        SELECT
+            STATION_ID,
+            CITY_ID,
+            BICYCLE_DOCKS_AVAILABLE,
+            BICYCLE_AVAILABLE,
+            LAST_STATEMENT_DATE,
+            CREATED_DATE,
+            SNAPSHOT_TS
+        FROM {read_lake_sql(lake_dir, "station_statement")};
+    """)
+    station_sql = read_lake_sql(lake_dir, "station")
+    station_columns = [column for column, *_ in con.execute(f"DESCRIBE SELECT * FROM {station_sql}").fetchall()]
+    source_sql = "SOURCE" if "SOURCE" in station_columns else "CAST(NULL AS VARCHAR) AS SOURCE"
+    con.execute(f"""
+        CREATE OR REPLACE VIEW CURRENT_STATION_STATE AS
+        SELECT
+            f.STATION_ID,
+            s.SOURCE,
+            f.CITY_ID,
+            s.CAPACITTY,
+            f.BICYCLE_DOCKS_AVAILABLE,
+            f.BICYCLE_AVAILABLE,
+            f.LAST_STATEMENT_DATE,
+            f.SNAPSHOT_TS,
+            CAST(NULL AS TIMESTAMP) AS UPDATED_AT
+        FROM FACT_STATION_STATEMENT f
+        LEFT JOIN (
+            SELECT ID, {source_sql}, CAPACITTY
+            FROM {station_sql}
+            QUALIFY row_number() OVER (PARTITION BY ID ORDER BY CREATED_DATE DESC) = 1
+        ) s ON s.ID = f.STATION_ID
+        QUALIFY f.SNAPSHOT_TS = MAX(f.SNAPSHOT_TS) OVER (PARTITION BY coalesce(s.SOURCE, f.CITY_ID))
+            AND row_number() OVER (PARTITION BY f.STATION_ID ORDER BY f.SNAPSHOT_TS DESC) = 1;
+    """)
+    con.execute(f"CREATE OR REPLACE VIEW ROLLUP_CITY_SNAPSHOT AS {ROLLUP_CITY_SNAPSHOT_SQL.format(where = 'TRUE')};")
+    con.execute(f"CREATE OR REPLACE VIEW ROLLUP_STATION_DAILY AS {ROLLUP_STATION_DAILY_SQL.format(where = 'TRUE')};")
+    con.execute(f"CREATE OR REPLACE VIEW ROLLUP_STATION_TOTAL AS {ROLLUP_STATION_TOTAL_SQL};")
+
+
+def open_lake(lake_dir: str = LAKE_DIR) -> PipelineContext:
+    """Contexte en mémoire dont les tables d'agrégation sont des vues sur le lac (aucun fichier DuckDB ouvert)."""
+    ctx = PipelineContext(duckdb_path = ":memory:")
+    attach_lake(ctx, lake_dir)
+    return ctx
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Requêtes d'agrégation exécutées sur le lac Parquet.")
+    parser.add_argument("--lake-dir", default = LAKE_DIR, help = "Dossier du lac Parquet.")
+    args = parser.parse_args()
+
+    with open_lake(args.lake_dir) as ctx:
+        ctx.run(get_average_bikes_available_per_station)
+        ctx.run(get_bicycle_dock_availability_by_city)
@@ -0,0 +1,191 @@
+"""
+Validation des relevés de disponibilité avant leur chargement dans CONSOLIDATE_STATION_STATEMENT.
+
+- Les règles (`QUALITY_RULES`) sont des expressions SQL évaluées en une seule requête sur tout un snapshot
+  (ou tout un lot du moteur "streaming") : aucune boucle Python sur les lignes.
+- Règle `reject` : la ligne n'est pas chargée ; règle `flag` : la ligne est chargée mais signalée.
+- Chaque ligne en échec est copiée dans QUARANTINE_STATION_STATEMENT avec ses codes de règle (`REASONS`).
+- Les compteurs par snapshot, source et règle sont publiés dans DATA_QUALITY_METRICS
+  (`CHECKED`, `LOADED`, `REJECTED` et un compteur par règle).
+"""
+
+import statement_delta
+import station_state
+
+# Écart maximal entre la date d'un relevé et le relevé le plus récent de la même source dans le snapshot.
+STALE_AFTER = "24 HOURS"
+
+QUALITY_RULES = {
+    "UNKNOWN_STATION": {
+        "action": "reject",
+        "condition": "STATION_ID IS NULL",
+    },
+    "MISSING_COUNT": {
+        "action": "reject",
+        "condition": "RAW_BICYCLE_AVAILABLE IS NULL OR RAW_BICYCLE_DOCKS_AVAILABLE IS NULL",
+    },
+    "INVALID_COUNT": {
+        "action": "reject",
+        "condition": (
+            "(RAW_BICYCLE_AVAILABLE IS NOT NULL AND BICYCLE_AVAILABLE IS NULL)"
+            " OR (RAW_BICYCLE_DOCKS_AVAILABLE IS NOT NULL AND BICYCLE_DOCKS_AVAILABLE IS NULL)"
+        ),
+    },
+    "NEGATIVE_COUNT": {
+        "action": "reject",
+        "condition": "BICYCLE_AVAILABLE < 0 OR BICYCLE_DOCKS_AVAILABLE < 0",
+    },
+    "OVER_CAPACITY": {
+        "action": "flag",
+        "condition": "BICYCLE_AVAILABLE + BICYCLE_DOCKS_AVAILABLE > CAPACITTY",
+    },
+    "STALE_STATEMENT": {
+        "action": "flag",
+        "condition": f"LAST_STATEMENT_DATE < FRESHEST_STATEMENT_DATE - INTERVAL {STALE_AFTER}",
+    },
+}
+
+REJECT_RULES = [name for name, rule in QUALITY_RULES.items() if rule["action"] == "reject"]
+
+# Relevés candidats (`{candidates}` : SOURCE, CODE, STATION_ID, compteurs bruts, LAST_STATEMENT_DATE, CREATED_DATE, SNAPSHOT_TS)
+# typés, complétés par la capacité et la ville de la station le même jour, puis évalués par toutes les règles.
+CHECK_SQL = """
+    SELECT *, list_filter([{reasons}], reason -> reason IS NOT NULL) AS REASONS
+    FROM (
+        SELECT
+            c.SOURCE,
+            CAST(c.CODE AS VARCHAR) AS CODE,
+            c.STATION_ID,
+            CAST(c.BICYCLE_DOCKS_AVAILABLE AS VARCHAR) AS RAW_BICYCLE_DOCKS_AVAILABLE,
+            CAST(c.BICYCLE_AVAILABLE AS VARCHAR) AS RAW_BICYCLE_AVAILABLE,
+            TRY_CAST(c.BICYCLE_DOCKS_AVAILABLE AS INTEGER) AS BICYCLE_DOCKS_AVAILABLE,
+            TRY_CAST(c.BICYCLE_AVAILABLE AS INTEGER) AS BICYCLE_AVAILABLE,
+            CAST(c.LAST_STATEMENT_DATE AS TIMESTAMP) AS LAST_STATEMENT_DATE,
+            c.CREATED_DATE,
+            CAST(c.SNAPSHOT_TS AS TIMESTAMP) AS SNAPSHOT_TS,
+            s.CAPACITTY,
+            s.CITY_CODE,
+            MAX(CAST(c.LAST_STATEMENT_DATE AS TIMESTAMP)) OVER (PARTITION BY c.SOURCE, c.SNAPSHOT_TS) AS FRESHEST_STATEMENT_DATE
+        FROM ({candidates}) c
+        LEFT JOIN CONSOLIDATE_STATION s ON s.ID = c.STATION_ID AND s.CREATED_DATE = CAST(c.CREATED_DATE AS DATE)
+    )
+"""
+
+
+def check_sql(candidates_sql: str) -> str:
+    """Requête de validation des relevés candidats : une colonne REASONS avec les règles en échec de chaque ligne."""
+    reasons = ", ".join(
+        f"CASE WHEN {rule['condition']} THEN '{name}' END" for name, rule in QUALITY_RULES.items()
+    )
+    return CHECK_SQL.format(reasons = reasons, candidates = candidates_sql)
+
+
+def load_statements(con, candidates_sql: str, parameters: list = None, storage: str = "full") -> int:
+    """
+    Valide des relevés candidats et charge ceux qui passent les règles `reject` dans CONSOLIDATE_STATION_STATEMENT.
+
+    - Les relevés sont évalués une seule fois (table temporaire), puis répartis entre consolidation et quarantaine.
+    - Les compteurs s'ajoutent à ceux du snapshot (plusieurs lots ou plusieurs villes par snapshot).
+    - `storage = "delta"` : seuls les changements sont écrits, en intervalles (`statement_delta`).
+    - L'état courant des stations (CURRENT_STATION_STATE) est mis à jour avec les relevés chargés, dans les deux modes.
+    - Retourne le nombre de lignes écrites.
+    """
+    con.execute(f"CREATE OR REPLACE TEMP TABLE CHECKED_STATION_STATEMENT AS {check_sql(candidates_sql)};", parameters)
+
+    con.execute(
+        """
+        INSERT INTO QUARANTINE_STATION_STATEMENT
+        SELECT
+            SOURCE,
+            CODE,
+            STATION_ID,
+            RAW_BICYCLE_DOCKS_AVAILABLE,
+            RAW_BICYCLE_AVAILABLE,
+            CAPACITTY,
+            LAST_STATEMENT_DATE,
+            CREATED_DATE,
+            SNAPSHOT_TS,
+            REASONS,
+            list_has_any(REASONS, ?) AS REJECTED,
+            current_localtimestamp() AS QUARANTINED_AT
+        FROM CHECKED_STATION_STATEMENT
+        WHERE len(REASONS) > 0;
+        """,
+        [REJECT_RULES],
+    )
+
+    con.execute(
+        """
+        INSERT INTO DATA_QUALITY_METRICS
+        SELECT SNAPSHOT_TS, SOURCE, METRIC, COUNT(*) AS NB_ROWS, current_localtimestamp() AS UPDATED_AT
+        FROM (
+            SELECT
+                SNAPSHOT_TS,
+                SOURCE,
+                unnest(list_concat(
+                    ['CHECKED', CASE WHEN list_has_any(REASONS, ?) THEN 'REJECTED' ELSE 'LOADED' END],
+                    REASONS
+                )) AS METRIC
+            FROM CHECKED_STATION_STATEMENT
+        )
+        GROUP BY ALL
+        ON CONFLICT DO UPDATE SET NB_ROWS = NB_ROWS + excluded.NB_ROWS, UPDATED_AT = excluded.UPDATED_AT;
+        """,
+        [REJECT_RULES],
+    )
+
+    station_state.upsert_current_state(
+        con,
+        "SELECT * FROM CHECKED_STATION_STATEMENT WHERE NOT list_has_any(REASONS, ?)",
+        [REJECT_RULES],
+    )
+
+    if storage == "delta":
+        nb_written = statement_delta.apply_statements(
+            con,
+            "SELECT * FROM CHECKED_STATION_STATEMENT WHERE NOT list_has_any(REASONS, ?)",
+            [REJECT_RULES],
+        )
+        con.execute("DROP TABLE CHECKED_STATION_STATEMENT;")
+        return nb_written
+
+    nb_written = con.execute(
+        """
+        INSERT OR REPLACE INTO CONSOLIDATE_STATION_STATEMENT
+        SELECT DISTINCT STATION_ID, BICYCLE_DOCKS_AVAILABLE, BICYCLE_AVAILABLE, LAST_STATEMENT_DATE, CREATED_DATE, SNAPSHOT_TS
+        FROM CHECKED_STATION_STATEMENT
+        WHERE NOT list_has_any(REASONS, ?);
+        """,
+        [REJECT_RULES],
+    ).fetchone()[0]
+    con.execute("DROP TABLE CHECKED_STATION_STATEMENT;")
+    return nb_written
+
+
+def clear_snapshot(con, snapshot_ts, sources: list):
+    """Supprime la quarantaine et les compteurs d'un snapshot pour des sources, avant de les recalculer (rechargement)."""
+    for table_name in ("QUARANTINE_STATION_STATEMENT", "DATA_QUALITY_METRICS"):
+        con.execute(
+            f"DELETE FROM {table_name} WHERE SNAPSHOT_TS = CAST(? AS TIMESTAMP) AND list_contains(?, SOURCE);",
+            [snapshot_ts, list(sources)],
+        )
+
+
+def report_quality(con, snapshot_ts, sources: list):
+    """Affiche, par source, les relevés vérifiés, rejetés et signalés d'un snapshot avec le détail des règles en échec."""
+    counters = con.execute(
+        """
+        SELECT SOURCE, map_from_entries(list((METRIC, NB_ROWS) ORDER BY METRIC))
+        FROM DATA_QUALITY_METRICS
+        WHERE SNAPSHOT_TS = CAST(? AS TIMESTAMP) AND list_contains(?, SOURCE)
+        GROUP BY SOURCE
+        ORDER BY SOURCE;
+        """,
+        [snapshot_ts, list(sources)],
+    ).fetchall()
+    for source, metrics in counters:
+        failures = ", ".join(f"{name} : {metrics[name]}" for name in QUALITY_RULES if name in metrics)
+        print(
+            f"Qualité des relevés {source} : {metrics.get('CHECKED', 0)} vérifiés, "
+            f"{metrics.get('REJECTED', 0)} rejetés" + (f" ({failures})." if failures else ".")
+        )
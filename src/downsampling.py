@@ -0,0 +1,228 @@
+"""
+Sous-échantillonnage et rétention de l'historique de disponibilité des stations.
+
+- STATION_STATEMENT_HOURLY et STATION_STATEMENT_DAILY résument FACT_STATION_STATEMENT par station et par heure / par jour :
+  vélos et emplacements disponibles (min, max, moyenne), part des relevés où la station est vide ou pleine.
+- Les snapshots étant pris à intervalle régulier, la part des relevés vaut la part du temps passé vide ou pleine.
+- La rétention supprime (et archive en Parquet, en option) les relevés bruts de plus de N jours déjà résumés :
+  les requêtes longue durée lisent les tables résumées et les tables de relevés restent petites.
+"""
+
+import argparse
+import os
+from datetime import timedelta
+
+import pandas as pd
+
+import utils
+from data_agregation import rollup_filters
+from pipeline_context import PipelineContext
+
+ARCHIVE_DIR = "data/archive"
+
+# Tables de relevés bruts concernées par la rétention.
+RETAINED_TABLES = ("CONSOLIDATE_STATION_STATEMENT", "FACT_STATION_STATEMENT")
+
+HOURLY_SQL = """
+    SELECT
+        STATION_ID,
+        arg_max(CITY_ID, SNAPSHOT_TS) AS CITY_ID,
+        date_trunc('hour', SNAPSHOT_TS) AS BUCKET_TS,
+        COUNT(*) AS NB_STATEMENTS,
+        MIN(BICYCLE_AVAILABLE) AS MIN_BICYCLE_AVAILABLE,
+        MAX(BICYCLE_AVAILABLE) AS MAX_BICYCLE_AVAILABLE,
+        AVG(BICYCLE_AVAILABLE) AS AVG_BICYCLE_AVAILABLE,
+        MIN(BICYCLE_DOCKS_AVAILABLE) AS MIN_BICYCLE_DOCKS_AVAILABLE,
+        MAX(BICYCLE_DOCKS_AVAILABLE) AS MAX_BICYCLE_DOCKS_AVAILABLE,
+        AVG(BICYCLE_DOCKS_AVAILABLE) AS AVG_BICYCLE_DOCKS_AVAILABLE,
+        AVG(CAST(BICYCLE_AVAILABLE = 0 AS DOUBLE)) AS EMPTY_RATIO,
+        AVG(CAST(BICYCLE_DOCKS_AVAILABLE = 0 AS DOUBLE)) AS FULL_RATIO
+    FROM FACT_STATION_STATEMENT
+    WHERE SNAPSHOT_TS >= CAST(? AS TIMESTAMP) AND SNAPSHOT_TS < CAST(? AS TIMESTAMP) + INTERVAL 1 HOUR
+        AND list_contains(?, CAST(date_trunc('hour', SNAPSHOT_TS) AS VARCHAR))
+    GROUP BY STATION_ID, BUCKET_TS
+"""
+
+# Le résumé journalier est calculé depuis le résumé horaire (moyennes pondérées par le nombre de relevés) :
+# il reste juste même si une partie des relevés bruts de la journée a déjà été supprimée.
+DAILY_SQL = """
+    SELECT
+        STATION_ID,
+        arg_max(CITY_ID, BUCKET_TS) AS CITY_ID,
+        CAST(BUCKET_TS AS DATE) AS BUCKET_DATE,
+        SUM(NB_STATEMENTS) AS NB_STATEMENTS,
+        MIN(MIN_BICYCLE_AVAILABLE) AS MIN_BICYCLE_AVAILABLE,
+        MAX(MAX_BICYCLE_AVAILABLE) AS MAX_BICYCLE_AVAILABLE,
+        SUM(AVG_BICYCLE_AVAILABLE * NB_STATEMENTS) / SUM(NB_STATEMENTS) AS AVG_BICYCLE_AVAILABLE,
+        MIN(MIN_BICYCLE_DOCKS_AVAILABLE) AS MIN_BICYCLE_DOCKS_AVAILABLE,
+        MAX(MAX_BICYCLE_DOCKS_AVAILABLE) AS MAX_BICYCLE_DOCKS_AVAILABLE,
+        SUM(AVG_BICYCLE_DOCKS_AVAILABLE * NB_STATEMENTS) / SUM(NB_STATEMENTS) AS AVG_BICYCLE_DOCKS_AVAILABLE,
+        SUM(EMPTY_RATIO * NB_STATEMENTS) / SUM(NB_STATEMENTS) AS EMPTY_RATIO,
+        SUM(FULL_RATIO * NB_STATEMENTS) / SUM(NB_STATEMENTS) AS FULL_RATIO
+    FROM STATION_STATEMENT_HOURLY
+    WHERE BUCKET_TS >= CAST(? AS DATE) AND BUCKET_TS < CAST(? AS DATE) + INTERVAL 1 DAY
+        AND list_contains(?, CAST(CAST(BUCKET_TS AS DATE) AS VARCHAR))
+    GROUP BY STATION_ID, BUCKET_DATE
+"""
+
+
+def create_downsampling_tables(ctx):
+    """
+    Crée les tables de résumés horaires et journaliers si elles n'existent pas.
+
+    - Lit le fichier SQL situé dans `data/sql_statements/create_downsampling_tables.sql`.
+    - À la première exécution, tout l'historique de FACT_STATION_STATEMENT est en attente et sera résumé.
+    """
+    ctx.execute_script("create_downsampling_tables.sql")
+
+
+def downsample_station_statements(ctx):
+    """
+    Résume par heure et par jour les relevés chargés dans FACT_STATION_STATEMENT depuis le dernier passage.
+
+    - Les heures des snapshots en attente sont recalculées en entier depuis FACT_STATION_STATEMENT.
+    - Les jours de ces heures sont ensuite recalculés depuis STATION_STATEMENT_HOURLY.
+    - Les snapshots résumés sont marqués (ETL_WATERMARK) : la rétention ne supprime que ceux-là.
+    """
+    con = ctx.con
+
+    pending = utils.pending_partitions(con, "STATION_STATEMENT_HOURLY", "CONSOLIDATE_STATION_STATEMENT")
+    if not pending:
+        return
+
+    # clé de partition = str(SNAPSHOT_TS), ex. "2025-12-04 08:05:00" -> heure "2025-12-04 08:00:00"
+    hours = sorted({key[:13] + ":00:00" for key, _ in pending})
+    ctx.record(rows_written = con.execute(
+        f"INSERT OR REPLACE INTO STATION_STATEMENT_HOURLY {HOURLY_SQL}", [hours[0], hours[-1], hours]
+    ).fetchone()[0])
+
+    dates = sorted({hour[:10] for hour in hours})
+    ctx.record(rows_written = con.execute(
+        f"INSERT OR REPLACE INTO STATION_STATEMENT_DAILY {DAILY_SQL}", [dates[0], dates[-1], dates]
+    ).fetchone()[0])
+
+    utils.mark_loaded(con, "STATION_STATEMENT_HOURLY", "CONSOLIDATE_STATION_STATEMENT", pending)
+
+
+def apply_retention(ctx, retention_days: int, archive_dir: str = None):
+    """
+    Supprime les relevés bruts antérieurs à `retention_days` jours avant la date d'exécution, une fois résumés.
+
+    - Seuls les snapshots déjà chargés dans FACT_STATION_STATEMENT et résumés par `downsample_station_statements` sont supprimés.
+    - Avec `archive_dir`, les lignes sont d'abord copiées en Parquet dans `<archive_dir>/<table>/CREATED_DATE=<date>/`.
+    - Les marques de chargement (ETL_WATERMARK) sont conservées : les snapshots supprimés ne sont pas rechargés.
+      Un backfill plus ancien que la rétention recalcule des heures dont une partie des relevés n'existe plus :
+      garder une rétention plus longue que la fenêtre de backfill.
+    - Les intervalles du stockage delta (STATION_STATEMENT_INTERVAL) fermés au plus tard au dernier snapshot supprimé
+      ne couvrent plus que des snapshots supprimés : ils sont supprimés (et archivés) de la même façon.
+    """
+    con = ctx.con
+    cutoff = ctx.run_date - timedelta(days = retention_days)
+
+    snapshots = [
+        key for key, in con.execute(
+            """
+            SELECT PARTITION_KEY FROM ETL_WATERMARK
+            WHERE TARGET_TABLE = 'STATION_STATEMENT_HOURLY' AND SOURCE_TABLE = 'CONSOLIDATE_STATION_STATEMENT'
+                AND CAST(PARTITION_KEY AS TIMESTAMP) < CAST(? AS TIMESTAMP)
+            INTERSECT
+            SELECT PARTITION_KEY FROM ETL_WATERMARK
+            WHERE TARGET_TABLE = 'FACT_STATION_STATEMENT' AND SOURCE_TABLE = 'CONSOLIDATE_STATION_STATEMENT'
+            ORDER BY 1;
+            """,
+            [cutoff],
+        ).fetchall()
+    ]
+    if not snapshots:
+        return
+
+    where = "SNAPSHOT_TS < CAST(? AS TIMESTAMP) AND list_contains(?, CAST(SNAPSHOT_TS AS VARCHAR))"
+    parameters = [cutoff, snapshots]
+    for table_name in RETAINED_TABLES:
+        if archive_dir is not None:
+            folder = f"{archive_dir}/{table_name.lower()}"
+            os.makedirs(folder, exist_ok = True)
+            con.execute(
+                f"""
+                COPY (SELECT * FROM {table_name} WHERE {where}) TO '{folder}' (
+                    FORMAT PARQUET,
+                    PARTITION_BY (CREATED_DATE),
+                    APPEND,
+                    FILENAME_PATTERN 'archive_{{uuid}}'
+                );
+                """,
+                parameters,
+            )
+        nb_deleted = con.execute(f"DELETE FROM {table_name} WHERE {where}", parameters).fetchone()[0]
+        ctx.record(rows_written = nb_deleted)
+        archived = f", archivés dans {archive_dir}" if archive_dir is not None else ""
+        print(f"Rétention {table_name} : {nb_deleted} relevés antérieurs au {cutoff} supprimés{archived}.")
+
+    where, parameters = "VALID_TO <= CAST(? AS TIMESTAMP)", [snapshots[-1]]
+    if archive_dir is not None:
+        folder = f"{archive_dir}/station_statement_interval"
+        os.makedirs(folder, exist_ok = True)
+        con.execute(
+            f"""
+            COPY (SELECT *, CAST(VALID_TO AS DATE) AS VALID_TO_DATE FROM STATION_STATEMENT_INTERVAL WHERE {where}) TO '{folder}' (
+                FORMAT PARQUET,
+                PARTITION_BY (VALID_TO_DATE),
+                APPEND,
+                FILENAME_PATTERN 'archive_{{uuid}}'
+            );
+            """,
+            parameters,
+        )
+    nb_deleted = con.execute(f"DELETE FROM STATION_STATEMENT_INTERVAL WHERE {where}", parameters).fetchone()[0]
+    ctx.record(rows_written = nb_deleted)
+    if nb_deleted:
+        print(f"Rétention STATION_STATEMENT_INTERVAL : {nb_deleted} intervalles fermés avant le {snapshots[-1]} supprimés.")
+
+
+def query_station_history(
+    ctx,
+    granularity: str = "hour",
+    station_ids: list = None,
+    cities: list = None,
+    start_date = None,
+    end_date = None,
+) -> pd.DataFrame:
+    """
+    Historique résumé de la disponibilité des stations, lu dans STATION_STATEMENT_HOURLY (`hour`) ou STATION_STATEMENT_DAILY (`day`).
+
+    - `station_ids` : IDs permanents des stations ; toutes par défaut.
+    - `cities` : noms ou codes INSEE des villes ; `start_date` / `end_date` : bornes incluses.
+    """
+    if granularity not in ("hour", "day"):
+        raise ValueError(f"Granularité inconnue : {granularity} (choix : hour, day)")
+    table_name, bucket = ("STATION_STATEMENT_HOURLY", "BUCKET_TS") if granularity == "hour" else ("STATION_STATEMENT_DAILY", "BUCKET_DATE")
+
+    where, parameters = rollup_filters(cities, start_date, end_date, date_column = f"CAST(h.{bucket} AS DATE)")
+    if station_ids is not None:
+        where += " AND list_contains(?, h.STATION_ID)"
+        parameters.append([str(station_id) for station_id in station_ids])
+
+    return ctx.con.execute(
+        f"""
+        SELECT ds.NAME AS STATION_NAME, c.NAME AS CITY_NAME, h.*
+        FROM {table_name} h
+        LEFT JOIN DIM_STATION ds ON ds.ID = h.STATION_ID
+        LEFT JOIN DIM_CITY c ON c.ID = h.CITY_ID
+        WHERE {where}
+        ORDER BY h.STATION_ID, h.{bucket};
+        """,
+        parameters,
+    ).fetchdf()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Résumés horaires et journaliers des relevés, puis rétention des relevés bruts.")
+    parser.add_argument("--retention-days", type = int, default = None, help = "Âge (en jours) au-delà duquel les relevés bruts résumés sont supprimés.")
+    parser.add_argument("--archive-dir", default = None, help = f"Archive Parquet des relevés supprimés (ex. {ARCHIVE_DIR}).")
+    args = parser.parse_args()
+
+    with PipelineContext() as ctx:
+        ctx.run(create_downsampling_tables)
+        ctx.run(downsample_station_statements)
+        if args.retention_days is not None:
+            ctx.run(apply_retention, args.retention_days, args.archive_dir)
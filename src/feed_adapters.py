@@ -0,0 +1,110 @@
+"""
+Registre des flux de vélos en libre-service, une entrée par ville (source).
+
+Chaque adaptateur déclare, sans code spécifique à la ville :
+
+- `label` : nom affiché dans les messages ;
+- `realtime` : flux temps réel (nom du flux d'ingestion, URL, fichier brut, timeout (connexion, lecture) en secondes) ;
+- `localisation` : flux de référence optionnel, rapproché du temps réel par identifiant puis par distance
+  (voir `spatial.match_localisation`) ;
+- `station_columns` / `statement_columns` : colonne cible -> champ du flux (après `pd.json_normalize`),
+  les colonnes cibles absentes restent vides ;
+- `coercions` : conversions de type appliquées après le renommage (`datetime` ou type pandas, dans l'ordre) ;
+- `statement_join` : jointure des relevés vers le registre des stations (`LEFT` : relevé d'une station inconnue
+  mis en quarantaine, voir `data_quality`, `INNER` : relevé ignoré).
+
+Ajouter une ville revient à ajouter une entrée à `FEED_ADAPTERS` : l'ingestion (`data_ingestion.FEEDS`)
+et la consolidation (`data_consolidation`) la prennent en compte.
+"""
+
+PARIS_REALTIME_URL = "https://opendata.paris.fr/api/explore/v2.1/catalog/datasets/velib-disponibilite-en-temps-reel/exports/json"
+NANTES_REALTIME_URL = "https://data.nantesmetropole.fr/api/explore/v2.1/catalog/datasets/244400404_disponibilite-temps-reel-velos-libre-service-naolib-nantes-metropole/exports/json"
+NANTES_LOCALISATION_URL = "https://data.nantesmetropole.fr/api/explore/v2.1/catalog/datasets/244400404_stations-velos-libre-service-nantes-metropole/exports/json"
+
+FEED_ADAPTERS = {
+    "paris": {
+        "label": "Paris",
+        "realtime": {
+            "feed": "paris_realtime",
+            "url": PARIS_REALTIME_URL,
+            "file_name": "paris_realtime_bicycle_data.json",
+            "timeout": (5, 60),
+        },
+        "localisation": None,
+        "station_columns": {
+            "CODE": "stationcode",
+            "NAME": "name",
+            "CITY_NAME": "nom_arrondissement_communes",
+            "CITY_CODE": "code_insee_commune",
+            "LONGITUDE": "coordonnees_geo.lon",
+            "LATITUDE": "coordonnees_geo.lat",
+            "STATUS": "is_installed",
+            "CAPACITTY": "capacity",
+        },
+        "statement_columns": {
+            "CODE": "stationcode",
+            "BICYCLE_DOCKS_AVAILABLE": "numdocksavailable",
+            "BICYCLE_AVAILABLE": "numbikesavailable",
+            "LAST_STATEMENT_DATE": "duedate",
+        },
+        "coercions": {
+            "LAST_STATEMENT_DATE": ["datetime"],
+        },
+        "statement_join": "LEFT",
+    },
+    "nantes": {
+        "label": "Nantes",
+        "realtime": {
+            "feed": "nantes_realtime",
+            "url": NANTES_REALTIME_URL,
+            "file_name": "nantes_realtime_bicycle_data.json",
+            "timeout": (5, 30),
+        },
+        "localisation": {
+            "feed": "nantes_localisation",
+            "url": NANTES_LOCALISATION_URL,
+            "file_name": "nantes_bicycle_station_localisation_data.json",
+            "timeout": (5, 30),
+            "code_column": "number",
+            "id_column": "idobj",
+            "realtime_coordinates": ("position.lon", "position.lat"),
+            "localisation_coordinates": ("geo_point_2d.lon", "geo_point_2d.lat"),
+        },
+        "station_columns": {
+            "CODE": "number",
+            "NAME": "name",
+            "CITY_NAME": "commune",
+            "CITY_CODE": "insee",
+            "ADDRESS": "address",
+            "LONGITUDE": "position.lon",
+            "LATITUDE": "position.lat",
+            "CAPACITTY": "bike_stands",
+        },
+        "statement_columns": {
+            "CODE": "number",
+            "BICYCLE_DOCKS_AVAILABLE": "available_bike_stands",
+            "BICYCLE_AVAILABLE": "available_bikes",
+            "LAST_STATEMENT_DATE": "last_update",
+        },
+        "coercions": {
+            # entier nullable : pas de "44109.0" si une station est non localisée
+            "CITY_CODE": ["Int64"],
+            "LAST_STATEMENT_DATE": ["datetime"],
+        },
+        "statement_join": "INNER",
+    },
+}
+
+
+def adapter_feeds(adapter: dict) -> list:
+    """Flux à télécharger pour un adaptateur (temps réel, puis localisation s'il y en a une)."""
+    return [feed for feed in (adapter["realtime"], adapter["localisation"]) if feed is not None]
+
+
+def ingestion_feeds() -> dict:
+    """Flux de toutes les villes au format de `data_ingestion.FEEDS` : nom -> URL, fichier et timeout."""
+    return {
+        feed["feed"]: {"url": feed["url"], "file_name": feed["file_name"], "timeout": feed["timeout"]}
+        for adapter in FEED_ADAPTERS.values()
+        for feed in adapter_feeds(adapter)
+    }
@@ -1,3 +1,5 @@
+import argparse
+
 from data_agregation import (
     create_agregate_tables,
     agregate_dim_station,
@@ -9,59 +11,102 @@ from data_agregation import (
 from data_consolidation import (
     create_consolidate_tables,
 
-    consolidate_station_paris_data ,
-    consolidate_station_nantes_data, 
-
     consolidate_city_data,
 
-    consolidate_station_statement_nantes_data,
-    consolidate_station_statement_paris_data,
-)
-from data_ingestion import (
-    get_paris_realtime_bicycle_data,
-    get_nantes_realtime_bicycle_data,
-    get_nantes_realtime_bicycle_station_localisation_data,
-    get_communes_data,
+    consolidate_station_data,
+    consolidate_station_statement_data,
 )
+from data_ingestion import ingest_all_feeds
+from data_lake import export_lake
+from downsampling import apply_retention, create_downsampling_tables, downsample_station_statements
+from pipeline_context import STATEMENT_STORAGE, PipelineContext
+from publish import publish_snapshot
+from run_metrics import PROFILERS
+from statement_delta import STATEMENT_STORAGES
 
-def main():
+def main(
+    metrics_log: str = None,
+    profile_stage: str = None,
+    profiler: str = "cprofile",
+    retention_days: int = None,
+    archive_dir: str = None,
+    publish: bool = True,
+    statement_storage: str = STATEMENT_STORAGE,
+):
     print("Process start.")
-    # data ingestion
-
-    print("Data ingestion started.")
-    get_paris_realtime_bicycle_data()
-    get_nantes_realtime_bicycle_data()
-    get_nantes_realtime_bicycle_station_localisation_data()
-    get_communes_data()
-    print("Data ingestion ended.")
-
-    # data consolidation
-    print("Consolidation data started.")
-    create_consolidate_tables()
-
-    consolidate_city_data()
-
-    consolidate_station_paris_data()
-    consolidate_station_nantes_data()
-     
-    consolidate_station_statement_nantes_data()
-    consolidate_station_statement_paris_data()
-
-    
-    print("Consolidation data ended.")
-
-    #data agregation
-    print("Agregate data started.")
-    create_agregate_tables()
-    agregate_dim_station()
-    agregate_dim_city()
-
-    build_fact_station_statement()
-    
-    get_average_bikes_available_per_station()
-    get_bicycle_dock_availability_by_city()
-    # Other agregations here
-    print("Agregate data ended.")
+    # une seule connexion DuckDB pour toute l'exécution, chaque étape dans sa transaction
+    # (mesures de chaque étape dans PIPELINE_RUN_METRICS)
+    with PipelineContext(
+        statement_storage = statement_storage,
+        metrics_log = metrics_log,
+        profile_stage = profile_stage,
+        profiler = profiler,
+    ) as ctx:
+        # data ingestion
+
+        print("Data ingestion started.")
+        # tous les flux sont récupérés en parallèle
+        ctx.run(ingest_all_feeds)
+        print("Data ingestion ended.")
+
+        # data consolidation
+        print("Consolidation data started.")
+        ctx.run(create_consolidate_tables)
+
+        ctx.run(consolidate_city_data)
+
+        # toutes les villes du registre feed_adapters.FEED_ADAPTERS en une étape par table
+        ctx.run(consolidate_station_data)
+        ctx.run(consolidate_station_statement_data)
+
+        
+        print("Consolidation data ended.")
+
+        #data agregation
+        print("Agregate data started.")
+        ctx.run(create_agregate_tables)
+        ctx.run(agregate_dim_station)
+        ctx.run(agregate_dim_city)
+
+        ctx.run(build_fact_station_statement)
+
+        # résumés horaires et journaliers des nouveaux relevés
+        ctx.run(create_downsampling_tables)
+        ctx.run(downsample_station_statements)
+
+        # export des nouvelles partitions vers le lac Parquet (data/lake)
+        ctx.run(export_lake)
+
+        # rétention des relevés bruts déjà résumés et exportés
+        if retention_days is not None:
+            ctx.run(apply_retention, retention_days, archive_dir)
+        
+        ctx.run(get_average_bikes_available_per_station)
+        ctx.run(get_bicycle_dock_availability_by_city)
+        # Other agregations here
+        print("Agregate data ended.")
+
+        # version en lecture seule pour les lecteurs (data/published, voir publish.open_published)
+        if publish:
+            ctx.run(publish_snapshot)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description = "Pipeline quotidien : ingestion, consolidation et agrégation.")
+    parser.add_argument("--metrics-log", default = None, help = "Fichier JSON lines des mesures par étape (`-` pour la sortie standard).")
+    parser.add_argument("--profile-stage", default = None, help = "Nom de l'étape à profiler (ex. consolidate_station_data).")
+    parser.add_argument("--profiler", choices = PROFILERS, default = "cprofile", help = "Profileur de l'étape choisie.")
+    parser.add_argument("--retention-days", type = int, default = None, help = "Âge (en jours) au-delà duquel les relevés bruts résumés sont supprimés.")
+    parser.add_argument("--archive-dir", default = None, help = "Archive Parquet des relevés supprimés par la rétention.")
+    parser.add_argument("--statement-storage", choices = STATEMENT_STORAGES, default = STATEMENT_STORAGE, help = "Stockage des relevés : complet ou changements seulement.")
+    parser.add_argument("--no-publish", action = "store_true", help = "Ne pas publier de version en lecture seule à la fin de l'exécution.")
+    args = parser.parse_args()
+
+    main(
+        metrics_log = args.metrics_log,
+        profile_stage = args.profile_stage,
+        profiler = args.profiler,
+        retention_days = args.retention_days,
+        archive_dir = args.archive_dir,
+        publish = not args.no_publish,
+        statement_storage = args.statement_storage,
+    )
\ No newline at end of file
@@ -0,0 +1,250 @@
+import copy
+import itertools
+import os
+import time as clock
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, time
+
+import duckdb
+
+import raw_store
+import run_metrics
+import snapshot_cache
+import statement_delta
+
+DUCKDB_PATH = "data/duckdb/mobility_analysis.duckdb"
+RAW_DATA_DIR = "data/raw_data"
+SQL_STATEMENTS_DIR = "data/sql_statements"
+
+# Moteur de consolidation par source : "pandas" (json.load + pandas), "duckdb" (read_json + SQL)
+# ou "streaming" (lecture en flux par lots Arrow, pyarrow requis ; les communes restent consolidées par pandas).
+CONSOLIDATION_ENGINES = {
+    "communes": "pandas",
+    "paris": "pandas",
+    "nantes": "pandas",
+}
+
+# Stockage des relevés : "full" (une ligne par station et par snapshot) ou "delta" (changements seulement, voir `statement_delta`).
+STATEMENT_STORAGE = "full"
+
+
+class PipelineContext:
+    """
+    Contexte partagé par toutes les étapes d'une exécution du pipeline.
+
+    - Ouvre une seule connexion DuckDB pour toute l'exécution (au lieu d'une par fonction).
+    - Porte la date d'exécution et les chemins utilisés par l'ingestion, la consolidation et l'agrégation.
+    - Exécute chaque étape dans une transaction explicite (`run`) et en mesure le coût (PIPELINE_RUN_METRICS).
+    - Fait un unique CHECKPOINT à la fermeture.
+    """
+
+    def __init__(
+        self,
+        run_date: datetime = None,
+        snapshot_time: datetime = None,
+        duckdb_path: str = DUCKDB_PATH,
+        raw_data_dir: str = RAW_DATA_DIR,
+        sql_statements_dir: str = SQL_STATEMENTS_DIR,
+        read_only: bool = False,
+        consolidation_engines: dict = None,
+        statement_storage: str = STATEMENT_STORAGE,
+        snapshots: snapshot_cache.SnapshotCache = None,
+        metrics_log: str = None,
+        profile_stage: str = None,
+        profiler: str = "cprofile",
+    ):
+        self.run_datetime = run_date or snapshot_time or datetime.now()
+        self.snapshot_time = snapshot_time
+        self.run_date = self.run_datetime.date()
+        self.duckdb_path = duckdb_path
+        self.raw_data_dir = raw_data_dir
+        self.sql_statements_dir = sql_statements_dir
+        self.read_only = read_only
+        self.consolidation_engines = {**CONSOLIDATION_ENGINES, **(consolidation_engines or {})}
+        if statement_storage not in statement_delta.STATEMENT_STORAGES:
+            raise ValueError(f"Stockage des relevés inconnu : {statement_storage} (choix : {', '.join(statement_delta.STATEMENT_STORAGES)})")
+        self.statement_storage = statement_storage
+        self.snapshots = snapshots or snapshot_cache.default_cache
+        self.raw_store = raw_store.RawStore(raw_data_dir)
+        self.run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.metrics = run_metrics.StageMetrics()
+        self.metrics_log = metrics_log
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        self.nb_stages = 0
+        self.stage_counter = itertools.count(1)
+        self.is_fork = False
+
+        if duckdb_path != ":memory:" and not read_only:
+            os.makedirs(os.path.dirname(duckdb_path) or ".", exist_ok = True)
+        self.con = duckdb.connect(database = duckdb_path, read_only = read_only)
+        if not read_only:
+            # Le checkpoint est fait une seule fois, à la fermeture du contexte.
+            self.con.execute("SET checkpoint_threshold = '1GB';")
+
+    def fork(self):
+        """
+        Contexte de la même exécution sur un curseur DuckDB séparé, pour exécuter des étapes en parallèle (`cli.py`).
+
+        - Partage la base, la date d'exécution, le cache des snapshots et la numérotation des étapes (PIPELINE_RUN_METRICS).
+        - Chaque curseur a ses propres transactions : deux étapes parallèles ne doivent pas écrire les mêmes lignes.
+        - La fermeture ne ferme que le curseur, sans CHECKPOINT.
+        """
+        forked = copy.copy(self)
+        forked.con = self.con.cursor()
+        forked.metrics = run_metrics.StageMetrics()
+        forked.is_fork = True
+        return forked
+
+    @property
+    def partition(self) -> str:
+        """
+        Nom du dossier de données brutes de l'exécution.
+
+        - `%Y-%m-%d` pour une exécution quotidienne.
+        - `%Y-%m-%d/%H%M%S` pour un snapshot intra-journalier (mode polling).
+        """
+        if self.snapshot_time is not None:
+            return self.snapshot_time.strftime("%Y-%m-%d/%H%M%S")
+        return self.run_date.strftime("%Y-%m-%d")
+
+    @property
+    def snapshot_ts(self) -> datetime:
+        """Horodatage du snapshot (minuit de la date d'exécution pour une exécution quotidienne)."""
+        if self.snapshot_time is not None:
+            return self.snapshot_time.replace(microsecond = 0)
+        return datetime.combine(self.run_date, time.min)
+
+    @property
+    def raw_data_path(self) -> str:
+        """Dossier des données brutes de l'exécution : `data/raw_data/<partition>`."""
+        return f"{self.raw_data_dir}/{self.partition}"
+
+    def engine(self, source: str) -> str:
+        """Moteur de consolidation choisi pour une source (`paris`, `nantes`, `communes`) ; "pandas" par défaut."""
+        engine = self.consolidation_engines.get(source, "pandas")
+        if engine not in ("pandas", "duckdb", "streaming"):
+            raise ValueError(f"Moteur de consolidation inconnu pour {source} : {engine}")
+        return engine
+
+    def raw_file(self, file_name: str) -> str:
+        """Chemin à lire pour un fichier de données brutes de la date d'exécution (objet compressé ou ancien JSON)."""
+        return self.raw_store.resolve(self.partition, file_name)
+
+    def raw_hash(self, file_name: str) -> str:
+        """SHA-256 du contenu d'un fichier de données brutes de la date d'exécution."""
+        return self.raw_store.content_hash(self.partition, file_name)
+
+    def load_snapshot(self, city: str, file_name: str):
+        """DataFrame normalisé d'un fichier brut de la date d'exécution, parsé une seule fois par exécution."""
+        snapshot_df = self.snapshots.load(city, self.partition, self.raw_file(file_name))
+        self.record(rows_read = len(snapshot_df))
+        return snapshot_df
+
+    def record(self, rows_read: int = 0, rows_written: int = 0, bytes_downloaded: int = 0):
+        """Ajoute des lignes lues / écrites ou des octets téléchargés aux mesures de l'étape en cours."""
+        self.metrics.add(rows_read = rows_read, rows_written = rows_written, bytes_downloaded = bytes_downloaded)
+
+    def sql_file(self, file_name: str) -> str:
+        """Chemin d'un fichier SQL de `data/sql_statements`."""
+        return f"{self.sql_statements_dir}/{file_name}"
+
+    def execute_script(self, file_name: str):
+        """
+        Exécute un fichier SQL de `data/sql_statements`.
+
+        - Découpe le fichier en instructions SQL individuelles.
+        - Exécute chaque instruction sur la connexion partagée.
+        """
+        with open(self.sql_file(file_name)) as fd:
+            statements = fd.read()
+            for statement in statements.split(";"):
+                self.con.execute(statement)
+
+    @contextmanager
+    def transaction(self):
+        """Ouvre une transaction explicite, validée en fin de bloc ou annulée en cas d'erreur."""
+        self.con.begin()
+        try:
+            yield self.con
+        except BaseException:
+            self.con.rollback()
+            raise
+        self.con.commit()
+
+    def run(self, stage, *args, **kwargs):
+        """
+        Exécute une étape du pipeline dans une transaction.
+
+        - `stage` est une fonction qui prend le contexte en premier argument.
+        - Mesure le temps réel, le temps CPU, les lignes lues / écrites, les octets téléchargés et le pic
+          de mémoire de l'étape (`run_metrics.StagePeakRss`), enregistrés dans PIPELINE_RUN_METRICS (même si l'étape échoue).
+        - L'étape nommée `profile_stage` est profilée (`profiler` : cprofile ou tracemalloc).
+        - Retourne le résultat de l'étape.
+        """
+        self.metrics = run_metrics.StageMetrics(stage.__name__)
+        profiler = None
+        if stage.__name__ == self.profile_stage:
+            profiler = run_metrics.StageProfiler(stage.__name__, self.profiler)
+            profiler.start()
+
+        started_at = datetime.now()
+        peak_rss = run_metrics.StagePeakRss()
+        wall_started_at = clock.perf_counter()
+        cpu_started_at = clock.process_time()
+        status = "error"
+        try:
+            with self.transaction():
+                result = stage(self, *args, **kwargs)
+            status = "ok"
+            return result
+        finally:
+            wall_seconds = clock.perf_counter() - wall_started_at
+            cpu_seconds = clock.process_time() - cpu_started_at
+            if profiler is not None:
+                profiler.stop()
+            self.save_metrics(started_at, status, wall_seconds, cpu_seconds, peak_rss.stop())
+
+    def save_metrics(self, started_at: datetime, status: str, wall_seconds: float, cpu_seconds: float, peak_rss_mb: float = None):
+        """Enregistre les mesures de l'étape en cours dans PIPELINE_RUN_METRICS et dans le journal JSON."""
+        self.nb_stages = next(self.stage_counter)
+        record = {
+            "run_id": self.run_id,
+            "stage_index": self.nb_stages,
+            "stage": self.metrics.stage,
+            "snapshot_ts": self.snapshot_ts,
+            "started_at": started_at,
+            "status": status,
+            "wall_seconds": round(wall_seconds, 6),
+            "cpu_seconds": round(cpu_seconds, 6),
+            "rows_read": self.metrics.rows_read,
+            "rows_written": self.metrics.rows_written,
+            "bytes_downloaded": self.metrics.bytes_downloaded,
+            "peak_rss_mb": round(peak_rss_mb, 3) if peak_rss_mb is not None else None,
+        }
+        if self.metrics_log:
+            run_metrics.write_log_line(self.metrics_log, record)
+        if self.read_only:
+            return
+        if self.nb_stages == 1:
+            self.execute_script("create_metrics_tables.sql")
+        self.con.execute(
+            "INSERT INTO PIPELINE_RUN_METRICS VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+            list(record.values()),
+        )
+
+    def close(self):
+        """Fait le CHECKPOINT de fin d'exécution et ferme la connexion."""
+        if self.con is None:
+            return
+        if not self.read_only and not self.is_fork:
+            self.con.execute("CHECKPOINT;")
+        self.con.close()
+        self.con = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
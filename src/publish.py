@@ -0,0 +1,108 @@
+"""
+Publication de versions en lecture seule de la base, pour les tableaux de bord et les requêtes ad hoc.
+
+- À la fin d'une exécution, la base est copiée (`COPY FROM DATABASE`) dans un nouveau fichier versionné
+  `data/published/mobility_<run_id>.duckdb`, jamais modifié ensuite.
+- Le fichier `LATEST` désigne la dernière version complète ; il est remplacé de façon atomique après la copie.
+- Les lecteurs ouvrent la dernière version en lecture seule (`open_published`) : autant de processus que voulu
+  peuvent lire en parallèle pendant que l'exécution suivante écrit dans `mobility_analysis.duckdb`.
+- Les versions les plus anciennes sont supprimées (`keep` versions gardées) ; un lecteur qui a déjà ouvert
+  une version supprimée continue de la lire (sauf sous Windows, où la suppression est reportée).
+"""
+
+import argparse
+import os
+import time
+
+from data_agregation import (
+    get_average_bikes_available_per_station,
+    get_bicycle_dock_availability_by_city,
+)
+from pipeline_context import PipelineContext
+
+PUBLISH_DIR = "data/published"
+LATEST_FILE_NAME = "LATEST"
+KEEP_VERSIONS = 3
+
+
+def publish_snapshot(ctx, publish_dir: str = PUBLISH_DIR, keep: int = KEEP_VERSIONS) -> str:
+    """
+    Publie l'état validé de la base dans une nouvelle version en lecture seule ; retourne son chemin.
+
+    - La copie passe par un curseur séparé, hors de la transaction de l'étape : elle ne voit que des données validées
+      (une transaction DuckDB n'écrit que dans une seule base attachée).
+    - `LATEST` n'est mis à jour qu'une fois la version complète et fermée.
+    """
+    os.makedirs(publish_dir, exist_ok = True)
+    file_name = f"mobility_{ctx.run_id}.duckdb"
+    path = f"{publish_dir}/{file_name}"
+
+    cursor = ctx.con.cursor()
+    try:
+        database_name = cursor.execute("SELECT current_database();").fetchone()[0]
+        cursor.execute(f"ATTACH '{path}' AS PUBLISHED;")
+        try:
+            cursor.execute(f"COPY FROM DATABASE {database_name} TO PUBLISHED;")
+        finally:
+            cursor.execute("DETACH PUBLISHED;")
+    finally:
+        cursor.close()
+
+    tmp_path = f"{publish_dir}/.{LATEST_FILE_NAME}.{ctx.run_id}"
+    with open(tmp_path, "w") as fd:
+        fd.write(file_name)
+    os.replace(tmp_path, f"{publish_dir}/{LATEST_FILE_NAME}")
+
+    prune_versions(publish_dir, keep)
+    print(f"Version publiée : {path}")
+    return path
+
+
+def latest_version(publish_dir: str = PUBLISH_DIR) -> str:
+    """Chemin de la dernière version publiée (FileNotFoundError si rien n'a encore été publié)."""
+    latest_path = f"{publish_dir}/{LATEST_FILE_NAME}"
+    if not os.path.exists(latest_path):
+        raise FileNotFoundError(f"Aucune version publiée dans {publish_dir} (lancer d'abord le pipeline).")
+    with open(latest_path) as fd:
+        return f"{publish_dir}/{fd.read().strip()}"
+
+
+def published_within(minutes: float, publish_dir: str = PUBLISH_DIR) -> bool:
+    """Indique si une version a été publiée il y a moins de `minutes` minutes (date de mise à jour de `LATEST`)."""
+    latest_path = f"{publish_dir}/{LATEST_FILE_NAME}"
+    return os.path.exists(latest_path) and time.time() - os.path.getmtime(latest_path) < minutes * 60
+
+
+def prune_versions(publish_dir: str = PUBLISH_DIR, keep: int = KEEP_VERSIONS):
+    """Supprime les versions publiées au-delà des `keep` plus récentes (jamais celle désignée par `LATEST`)."""
+    latest = os.path.basename(latest_version(publish_dir))
+    versions = sorted(
+        name for name in os.listdir(publish_dir)
+        if name.startswith("mobility_") and name.endswith(".duckdb")
+    )
+    for name in versions[:-keep] if keep > 0 else versions:
+        if name == latest:
+            continue
+        for suffix in ("", ".wal"):
+            try:
+                os.remove(f"{publish_dir}/{name}{suffix}")
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # fichier encore ouvert par un lecteur (Windows) : supprimé lors d'une prochaine publication
+                break
+
+
+def open_published(publish_dir: str = PUBLISH_DIR) -> PipelineContext:
+    """Contexte en lecture seule sur la dernière version publiée (aucun verrou sur la base du pipeline)."""
+    return PipelineContext(duckdb_path = latest_version(publish_dir), read_only = True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Requêtes d'agrégation exécutées sur la dernière version publiée, en lecture seule.")
+    parser.add_argument("--publish-dir", default = PUBLISH_DIR, help = "Dossier des versions publiées.")
+    args = parser.parse_args()
+
+    with open_published(args.publish_dir) as ctx:
+        ctx.run(get_average_bikes_available_per_station)
+        ctx.run(get_bicycle_dock_availability_by_city)
@@ -0,0 +1,201 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+MANIFEST_FILE_NAME = "manifest.json"
+OBJECTS_DIR_NAME = "objects"
+REFERENCES_FILE_NAME = "references.json"
+
+_manifest_lock = threading.Lock()
+
+
+class RawStore:
+    """
+    Stockage des données brutes compressé et adressé par contenu.
+
+    - Chaque fichier ingéré est compressé (gzip) et identifié par le SHA-256 de son contenu brut :
+      `data/raw_data/objects/<2 premiers caractères>/<sha256>.json.gz`.
+    - Un contenu identique (ex. la localisation des stations de Nantes, identique chaque jour) n'est stocké qu'une fois.
+    - Chaque partition datée (`data/raw_data/<date>`) contient un `manifest.json` qui référence ses objets.
+    - Les anciens fichiers JSON non compressés d'une partition restent lisibles.
+    - Les données de référence mises en cache (ex. communes) sont décrites dans `objects/references.json`
+      (objet stocké, ETag, Last-Modified, date de récupération).
+    """
+
+    def __init__(self, raw_data_dir: str):
+        self.raw_data_dir = raw_data_dir
+        self.objects_dir = f"{raw_data_dir}/{OBJECTS_DIR_NAME}"
+
+    def partition_path(self, partition: str) -> str:
+        """Dossier d'une partition : `data/raw_data/<partition>`."""
+        return f"{self.raw_data_dir}/{partition}"
+
+    def object_path(self, sha256: str) -> str:
+        """Chemin de l'objet compressé correspondant à un hash."""
+        return f"{self.objects_dir}/{sha256[:2]}/{sha256}.json.gz"
+
+    def read_manifest(self, partition: str) -> dict:
+        """Manifest d'une partition (vide si la partition n'en a pas)."""
+        manifest_path = f"{self.partition_path(partition)}/{MANIFEST_FILE_NAME}"
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path) as fd:
+            return json.load(fd)
+
+    def write(self, chunks, partition: str, file_name: str) -> dict:
+        """
+        Stocke un flux d'octets dans une partition.
+
+        - Les blocs sont hashés et compressés à la volée dans un fichier temporaire.
+        - Si l'objet existe déjà (même contenu), le fichier temporaire est supprimé (déduplication),
+          sinon il est renommé atomiquement en objet.
+        - Le manifest de la partition est ensuite mis à jour atomiquement.
+        - Retourne l'entrée du manifest (`sha256`, `size`, `object`, `stored_at`).
+        """
+        os.makedirs(self.objects_dir, exist_ok = True)
+        sha256 = hashlib.sha256()
+        size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir = self.objects_dir, prefix = f".{file_name}.", suffix = ".part")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file, gzip.GzipFile(fileobj = tmp_file, mode = "wb", mtime = 0) as gz_file:
+                for chunk in chunks:
+                    if chunk:
+                        sha256.update(chunk)
+                        gz_file.write(chunk)
+                        size += len(chunk)
+
+            object_path = self.object_path(sha256.hexdigest())
+            if os.path.exists(object_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok = True)
+                os.replace(tmp_path, object_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        entry = {
+            "sha256": sha256.hexdigest(),
+            "size": size,
+            "object": os.path.relpath(object_path, self.raw_data_dir),
+            "stored_at": datetime.now().isoformat(timespec = "seconds"),
+        }
+        self.update_manifest(partition, file_name, entry)
+        return entry
+
+    def update_manifest(self, partition: str, file_name: str, entry: dict):
+        """Ajoute ou remplace l'entrée d'un fichier dans le manifest d'une partition (écriture atomique)."""
+        folder = self.partition_path(partition)
+        os.makedirs(folder, exist_ok = True)
+        with _manifest_lock:
+            manifest = self.read_manifest(partition)
+            manifest[file_name] = entry
+            fd, tmp_path = tempfile.mkstemp(dir = folder, prefix = f".{MANIFEST_FILE_NAME}.", suffix = ".part")
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(manifest, tmp_file, indent = 2, sort_keys = True)
+            os.replace(tmp_path, f"{folder}/{MANIFEST_FILE_NAME}")
+
+    def read_reference(self, file_name: str) -> dict:
+        """État du cache d'un fichier de référence (None s'il n'a jamais été récupéré ou si son objet n'existe plus)."""
+        references_path = f"{self.objects_dir}/{REFERENCES_FILE_NAME}"
+        if not os.path.exists(references_path):
+            return None
+        with open(references_path) as fd:
+            reference = json.load(fd).get(file_name)
+        if reference is None or not os.path.exists(f"{self.raw_data_dir}/{reference['entry']['object']}"):
+            return None
+        return reference
+
+    def write_reference(self, file_name: str, reference: dict):
+        """Enregistre l'état du cache d'un fichier de référence (écriture atomique)."""
+        os.makedirs(self.objects_dir, exist_ok = True)
+        references_path = f"{self.objects_dir}/{REFERENCES_FILE_NAME}"
+        with _manifest_lock:
+            references = {}
+            if os.path.exists(references_path):
+                with open(references_path) as fd:
+                    references = json.load(fd)
+            references[file_name] = reference
+            fd, tmp_path = tempfile.mkstemp(dir = self.objects_dir, prefix = f".{REFERENCES_FILE_NAME}.", suffix = ".part")
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(references, tmp_file, indent = 2, sort_keys = True)
+            os.replace(tmp_path, references_path)
+
+    def resolve(self, partition: str, file_name: str) -> str:
+        """
+        Chemin à lire pour un fichier d'une partition.
+
+        - L'objet compressé référencé par le manifest s'il existe.
+        - Sinon l'ancien fichier JSON non compressé de la partition.
+        """
+        entry = self.read_manifest(partition).get(file_name)
+        if entry is not None:
+            return f"{self.raw_data_dir}/{entry['object']}"
+        return f"{self.partition_path(partition)}/{file_name}"
+
+    def files(self, partition: str) -> list:
+        """Noms des fichiers JSON d'une partition (référencés par le manifest ou anciens fichiers non compressés)."""
+        folder = self.partition_path(partition)
+        legacy_files = [
+            name for name in os.listdir(folder)
+            if name.endswith(".json") and name != MANIFEST_FILE_NAME and os.path.isfile(f"{folder}/{name}")
+        ]
+        return sorted(set(self.read_manifest(partition)) | set(legacy_files))
+
+    def content_hash(self, partition: str, file_name: str) -> str:
+        """SHA-256 du contenu brut d'un fichier (lu dans le manifest, ou calculé pour un ancien fichier)."""
+        entry = self.read_manifest(partition).get(file_name)
+        if entry is not None:
+            return entry["sha256"]
+
+        sha256 = hashlib.sha256()
+        with open_raw(self.resolve(partition, file_name), "rb") as fd:
+            for chunk in iter(lambda: fd.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def partitions(self) -> list:
+        """
+        Liste triée des partitions présentes dans `data/raw_data` (hors dossier des objets).
+
+        - Une partition quotidienne `<date>` contient directement des fichiers.
+        - Les snapshots intra-journaliers sont des sous-dossiers `<date>/<%H%M%S>`.
+        """
+        if not os.path.isdir(self.raw_data_dir):
+            return []
+        partitions = []
+        for name in os.listdir(self.raw_data_dir):
+            folder = self.partition_path(name)
+            if name == OBJECTS_DIR_NAME or not os.path.isdir(folder):
+                continue
+            entries = os.listdir(folder)
+            if any(os.path.isfile(f"{folder}/{entry}") and not entry.startswith(".") for entry in entries):
+                partitions.append(name)
+            partitions.extend(
+                f"{name}/{entry}" for entry in entries if os.path.isdir(f"{folder}/{entry}")
+            )
+        return sorted(partitions)
+
+    def previous_hash(self, partition: str, file_name: str) -> str:
+        """Hash du même fichier dans la partition précédente qui le contient (None s'il n'y en a pas)."""
+        for previous in reversed([p for p in self.partitions() if p < partition]):
+            if os.path.exists(self.resolve(previous, file_name)):
+                return self.content_hash(previous, file_name)
+        return None
+
+    def has_changed(self, partition: str, file_name: str) -> bool:
+        """Indique si le contenu d'un fichier diffère de celui de la partition précédente."""
+        return self.content_hash(partition, file_name) != self.previous_hash(partition, file_name)
+
+
+def open_raw(path: str, mode: str = "rt"):
+    """Ouvre un fichier brut, compressé (`.gz`) ou non, de façon transparente."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
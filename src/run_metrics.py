@@ -0,0 +1,134 @@
+"""
+Instrumentation des étapes du pipeline (voir `PipelineContext.run`).
+
+- Chaque étape mesure son temps réel, son temps CPU, les lignes lues et écrites, les octets téléchargés
+  et son pic de mémoire résidente (`StagePeakRss`).
+- Les mesures sont enregistrées dans la table PIPELINE_RUN_METRICS et, en option, en une ligne JSON par étape.
+- Une étape nommée peut être profilée avec cProfile (temps par fonction) ou tracemalloc (allocations mémoire).
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows : pas de mesure du pic de mémoire
+    resource = None
+
+PROFILERS = ("cprofile", "tracemalloc")
+PROFILES_DIR = "data/profiles"
+# Linux : écrire "5" dans clear_refs remet le pic de mémoire résidente (VmHWM de status) à la mémoire actuelle.
+PROC_CLEAR_REFS = "/proc/self/clear_refs"
+PROC_STATUS = "/proc/self/status"
+
+
+class StageMetrics:
+    """Compteurs d'une étape, alimentés par les fonctions du pipeline via `ctx.record(...)` (thread-safe)."""
+
+    def __init__(self, stage: str = None):
+        self.stage = stage
+        self.rows_read = 0
+        self.rows_written = 0
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+
+    def add(self, rows_read: int = 0, rows_written: int = 0, bytes_downloaded: int = 0):
+        with self._lock:
+            self.rows_read += rows_read
+            self.rows_written += rows_written
+            self.bytes_downloaded += bytes_downloaded
+
+
+def peak_rss_mb() -> float:
+    """Pic de mémoire résidente du processus depuis son démarrage, en Mo (None si non mesurable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+class StagePeakRss:
+    """
+    Pic de mémoire résidente d'une étape, en Mo (`ru_maxrss` ne donne que le pic depuis le démarrage du processus).
+
+    - Linux : le pic du processus est remis à la mémoire actuelle au début de l'étape, puis lu à la fin (VmHWM).
+    - Ailleurs : hausse du pic du processus pendant l'étape (0 si l'étape n'a pas dépassé le pic précédent).
+    - Des étapes exécutées en parallèle (`cli.py`) partagent la mémoire du processus : leur pic est approché.
+    """
+
+    def __init__(self):
+        try:
+            with open(PROC_CLEAR_REFS, "w") as fd:
+                fd.write("5")
+            self.started_peak = None
+        except OSError:
+            self.started_peak = peak_rss_mb()
+
+    def stop(self) -> float:
+        if self.started_peak is None:
+            with open(PROC_STATUS) as fd:
+                return int(re.search(r"VmHWM:\s+(\d+) kB", fd.read()).group(1)) / 1024
+        peak = peak_rss_mb()
+        return None if peak is None else peak - self.started_peak
+
+
+def write_log_line(metrics_log: str, record: dict):
+    """Ajoute une ligne JSON au journal des étapes (`-` = sortie standard)."""
+    line = json.dumps(record, default = str)
+    if metrics_log == "-":
+        print(line)
+        return
+    os.makedirs(os.path.dirname(metrics_log) or ".", exist_ok = True)
+    with open(metrics_log, "a") as fd:
+        fd.write(line + "\n")
+
+
+class StageProfiler:
+    """
+    Profilage d'une étape, activé pour une seule étape nommée.
+
+    - `cprofile` : affiche les 25 fonctions les plus coûteuses (temps cumulé) et écrit le profil
+      dans `data/profiles/<étape>_<horodatage>.prof` (lisible avec `pstats` ou snakeviz).
+    - `tracemalloc` : affiche le pic de mémoire Python de l'étape et les 15 lignes qui allouent le plus.
+    """
+
+    def __init__(self, stage: str, profiler: str):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Profileur inconnu : {profiler} (choix : {', '.join(PROFILERS)})")
+        self.stage = stage
+        self.profiler = profiler
+        self._profile = None
+
+    def start(self):
+        if self.profiler == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            tracemalloc.start()
+
+    def stop(self):
+        if self.profiler == "cprofile":
+            self._profile.disable()
+            os.makedirs(PROFILES_DIR, exist_ok = True)
+            path = f"{PROFILES_DIR}/{self.stage}_{datetime.now():%Y%m%d_%H%M%S}.prof"
+            self._profile.dump_stats(path)
+            output = io.StringIO()
+            pstats.Stats(self._profile, stream = output).sort_stats("cumulative").print_stats(25)
+            print(f"Profil cProfile de l'étape {self.stage} (écrit dans {path}) :")
+            print(output.getvalue())
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"Profil tracemalloc de l'étape {self.stage} : pic {peak / 1024 ** 2:.1f} Mo")
+            for statistic in snapshot.statistics("lineno")[:15]:
+                print(f"  {statistic}")
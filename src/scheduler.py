@@ -0,0 +1,179 @@
+import argparse
+import functools
+import os
+import threading
+import time
+from datetime import datetime
+
+from data_agregation import (
+    create_agregate_tables,
+    agregate_dim_city,
+    agregate_dim_station,
+    build_fact_station_statement,
+)
+from data_consolidation import (
+    create_consolidate_tables,
+    consolidate_city_data,
+    consolidate_station_data,
+    consolidate_station_statement_data,
+)
+from data_ingestion import FEEDS, ingest_all_feeds
+from feed_adapters import ingestion_feeds
+from data_lake import export_lake
+from downsampling import apply_retention, create_downsampling_tables, downsample_station_statements
+from pipeline_context import STATEMENT_STORAGE, PipelineContext
+from publish import publish_snapshot, published_within
+from statement_delta import STATEMENT_STORAGES
+from station_locator import refresh_station_locator
+
+# Flux récupérés à chaque tick : les flux de toutes les villes du registre (temps réel et localisation).
+SNAPSHOT_FEEDS = ingestion_feeds()
+# Les communes ne changent pas en cours de journée : ingérées au premier tick du jour seulement.
+CITY_FEEDS = {"communes": FEEDS["communes"]}
+# Une publication copie toute la base : au plus une version publiée par intervalle (en minutes), pas une par tick.
+PUBLISH_INTERVAL_MINUTES = 60
+
+
+def cities_refreshed(ctx) -> bool:
+    """
+    Indique si les communes du jour du snapshot ont déjà été traitées par un tick précédent.
+
+    - DIM_CITY est alimentée et le fichier des communes a été ingéré dans une autre partition du même jour.
+    - Tant que DIM_CITY est vide (nouvelle base, échec du premier tick), les communes sont retraitées à chaque tick.
+    """
+    if ctx.con.execute("SELECT COUNT(*) FROM DIM_CITY").fetchone()[0] == 0:
+        return False
+    day = ctx.run_date.strftime("%Y-%m-%d")
+    folder = ctx.raw_store.partition_path(day)
+    if not os.path.isdir(folder):
+        return False
+    return any(
+        CITY_FEEDS["communes"]["file_name"] in ctx.raw_store.files(f"{day}/{name}")
+        for name in os.listdir(folder)
+        if f"{day}/{name}" != ctx.partition and os.path.isdir(f"{folder}/{name}")
+    )
+
+
+def run_tick(
+    snapshot_time: datetime = None,
+    ingest: bool = True,
+    retention_days: int = None,
+    archive_dir: str = None,
+    publish: bool = True,
+    publish_interval_minutes: float = PUBLISH_INTERVAL_MINUTES,
+    **context_options,
+):
+    """
+    Exécute un tick du mode polling : un snapshot intra-journalier consolidé de façon incrémentale.
+
+    - Crée les tables manquantes sans supprimer les tables existantes (FACT_STATION_STATEMENT comprise).
+    - Ingère les flux temps réel dans la partition `data/raw_data/<date>/<%H%M%S>`.
+    - Au premier tick du jour (ou tant que DIM_CITY est vide), ingère aussi les communes puis consolide
+      CONSOLIDATE_CITY et DIM_CITY : les relevés trouvent leur ville dans FACT_STATION_STATEMENT dès une nouvelle base.
+    - Consolide les stations à chaque snapshot (requêtes idempotentes) : une station apparue en cours de journée
+      reçoit son ID dès son premier relevé, qui n'est pas mis en quarantaine (UNKNOWN_STATION).
+    - Consolide la disponibilité des stations ; FACT_STATION_STATEMENT n'est alimentée que pour ce nouveau snapshot (`SNAPSHOT_TS`),
+      qui est ensuite résumé par heure et par jour puis exporté dans le lac Parquet.
+    - Reconstruit l'index en mémoire des stations les plus proches (`station_locator`) avec la disponibilité de ce snapshot.
+    - Avec `retention_days`, supprime (et archive dans `archive_dir`) les relevés bruts déjà résumés plus anciens.
+    - Avec `publish`, publie une version en lecture seule de la base à jour (`publish.publish_snapshot`),
+      sauf si la dernière version publiée a moins de `publish_interval_minutes` minutes.
+    """
+    snapshot_time = snapshot_time or datetime.now()
+
+    with PipelineContext(snapshot_time = snapshot_time, **context_options) as ctx:
+        ctx.run(create_consolidate_tables)
+        ctx.run(create_agregate_tables)
+        ctx.run(create_downsampling_tables)
+
+        refresh_cities = not cities_refreshed(ctx)
+        if ingest:
+            ctx.run(ingest_all_feeds, {**SNAPSHOT_FEEDS, **CITY_FEEDS} if refresh_cities else SNAPSHOT_FEEDS)
+        if refresh_cities and CITY_FEEDS["communes"]["file_name"] in ctx.raw_store.files(ctx.partition):
+            ctx.run(consolidate_city_data)
+            ctx.run(agregate_dim_city)
+
+        ctx.run(consolidate_station_data)
+        ctx.run(agregate_dim_station)
+
+        ctx.run(consolidate_station_statement_data)
+        ctx.run(build_fact_station_statement)
+        ctx.run(refresh_station_locator)
+        ctx.run(downsample_station_statements)
+        ctx.run(export_lake)
+        if retention_days is not None:
+            ctx.run(apply_retention, retention_days, archive_dir)
+        if publish and published_within(publish_interval_minutes):
+            print(f"Publication ignorée : dernière version publiée il y a moins de {publish_interval_minutes} min.")
+        elif publish:
+            ctx.run(publish_snapshot)
+
+    print(f"Snapshot {ctx.snapshot_ts} consolidé.")
+
+
+def poll(interval_minutes: float, max_ticks: int = None, tick = run_tick):
+    """
+    Lance un tick toutes les `interval_minutes` minutes (mode polling longue durée).
+
+    - Chaque tick s'exécute dans un thread ; la boucle reste calée sur l'intervalle.
+    - Si le tick précédent n'est pas terminé, le nouveau tick est ignoré (pas d'empilement).
+    - Les créneaux manqués (machine en veille, tick très long) ne sont pas rattrapés.
+    - Une erreur dans un tick est affichée sans arrêter le polling.
+    - `max_ticks` limite le nombre de créneaux (utile pour les tests), sinon la boucle tourne indéfiniment.
+    """
+    interval = interval_minutes * 60
+    running = threading.Lock()
+    worker = None
+    nb_ticks = 0
+    next_tick = time.monotonic()
+
+    while max_ticks is None or nb_ticks < max_ticks:
+        if running.acquire(blocking = False):
+            worker = threading.Thread(target = run_locked, args = (running, tick, datetime.now()))
+            worker.start()
+        else:
+            print("Tick ignoré : le tick précédent est toujours en cours.")
+        nb_ticks += 1
+
+        if max_ticks is not None and nb_ticks >= max_ticks:
+            break
+        next_tick += interval
+        now = time.monotonic()
+        while next_tick <= now:
+            next_tick += interval
+        time.sleep(next_tick - now)
+
+    if worker is not None:
+        worker.join()
+
+
+def run_locked(running: threading.Lock, tick, snapshot_time: datetime):
+    """Exécute un tick et libère le verrou du polling à la fin, même en cas d'erreur."""
+    try:
+        tick(snapshot_time)
+    except Exception as error:
+        print(f"Erreur lors du tick {snapshot_time} : {error}")
+    finally:
+        running.release()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Ingestion et consolidation intra-journalières en continu.")
+    parser.add_argument("--interval", type = float, default = 5, help = "Intervalle entre deux snapshots, en minutes.")
+    parser.add_argument("--max-ticks", type = int, default = None, help = "Nombre de snapshots avant arrêt.")
+    parser.add_argument("--retention-days", type = int, default = None, help = "Âge (en jours) au-delà duquel les relevés bruts résumés sont supprimés.")
+    parser.add_argument("--archive-dir", default = None, help = "Archive Parquet des relevés supprimés par la rétention.")
+    parser.add_argument("--statement-storage", choices = STATEMENT_STORAGES, default = STATEMENT_STORAGE, help = "Stockage des relevés : complet ou changements seulement.")
+    parser.add_argument("--no-publish", action = "store_true", help = "Ne pas publier de version en lecture seule.")
+    parser.add_argument("--publish-interval", type = float, default = PUBLISH_INTERVAL_MINUTES, help = "Intervalle minimal entre deux publications, en minutes.")
+    args = parser.parse_args()
+
+    tick = functools.partial(
+        run_tick,
+        retention_days = args.retention_days,
+        archive_dir = args.archive_dir,
+        publish = not args.no_publish,
+        publish_interval_minutes = args.publish_interval,
+        statement_storage = args.statement_storage,
+    )
+    poll(args.interval, args.max_ticks, tick = tick)
@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from raw_store import open_raw
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class SnapshotCache:
+    """
+    Cache des fichiers bruts parsés, partagé entre les étapes de consolidation.
+
+    - Chaque fichier est lu, parsé (`json.load`) et normalisé (`pd.json_normalize`) une seule fois.
+    - La clé est (ville, date, empreinte du fichier) : un fichier réécrit est reparsé.
+    - La taille totale des DataFrames en mémoire est bornée (`max_bytes`) :
+      les snapshots les moins récemment utilisés sont évincés en premier.
+
+    Les DataFrames retournés sont partagés : ils ne doivent pas être modifiés en place.
+    Le cache peut être utilisé par des étapes exécutées en parallèle (`cli.py`) ; pandas n'est importé qu'au premier parsing.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(path: str) -> tuple:
+        """Empreinte d'un fichier : chemin, taille et date de modification."""
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    def load(self, city: str, snapshot_date, path: str) -> "pd.DataFrame":
+        """
+        Retourne le DataFrame normalisé d'un fichier brut.
+
+        - Si le fichier est déjà en cache avec la même empreinte, aucun parsing n'est fait.
+        - Sinon le fichier est parsé, mis en cache, puis le cache est réduit à `max_bytes`.
+        """
+        import pandas as pd
+
+        key = (city, str(snapshot_date), self.fingerprint(path))
+        with self._lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            self.misses += 1
+
+        with open_raw(path) as fd:
+            data = json.load(fd)
+        df = pd.json_normalize(data)
+        del data
+
+        size = int(df.memory_usage(index = True, deep = True).sum())
+        with self._lock:
+            if key not in self.entries:
+                self.entries[key] = (df, size)
+                self.total_bytes += size
+            self.evict()
+        return df
+
+    def evict(self):
+        """Évince les snapshots les plus anciens tant que la taille dépasse `max_bytes` (le dernier est gardé)."""
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, size) = self.entries.popitem(last = False)
+            self.total_bytes -= size
+
+    def clear(self):
+        """Vide le cache."""
+        self.entries.clear()
+        self.total_bytes = 0
+
+
+# Cache partagé par défaut par tous les contextes du processus (utile pour les rattrapages multi-dates).
+default_cache = SnapshotCache()
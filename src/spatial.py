@@ -0,0 +1,219 @@
+"""
+Outils géographiques : index spatial en grille et rapprochement de stations par coordonnées.
+
+Les coordonnées sont projetées localement en mètres (équirectangulaire), ce qui est assez précis
+pour des distances de quelques centaines de mètres. Les distances retournées sont des distances
+orthodromiques (haversine).
+"""
+
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_M = 6_371_008.8
+METERS_PER_DEGREE = 111_320
+
+# Distance maximale entre la position temps réel d'une station et sa localisation de référence.
+LOCALISATION_MAX_DISTANCE_M = 50
+
+
+def project(lon, lat):
+    """Projection locale en mètres (x vers l'est, y vers le nord) de coordonnées en degrés."""
+    lon = np.asarray(lon, dtype = float)
+    lat = np.asarray(lat, dtype = float)
+    return lon * METERS_PER_DEGREE * np.cos(np.radians(lat)), lat * METERS_PER_DEGREE
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    """Distance orthodromique en mètres entre deux points (ou deux tableaux de points)."""
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(value, dtype = float)) for value in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def grid_cell_sql(lon: str, lat: str, cell_size_m: float) -> tuple:
+    """Expressions SQL (DuckDB) des coordonnées de cellule d'un point, identiques à `GridIndex`."""
+    return (
+        f"CAST(floor({lon} * {METERS_PER_DEGREE} * cos(radians({lat})) / {cell_size_m}) AS BIGINT)",
+        f"CAST(floor({lat} * {METERS_PER_DEGREE} / {cell_size_m}) AS BIGINT)",
+    )
+
+
+def haversine_sql(lon1: str, lat1: str, lon2: str, lat2: str) -> str:
+    """Expression SQL (DuckDB) de la distance haversine en mètres, identique à `haversine_m`."""
+    return (
+        f"2 * {EARTH_RADIUS_M} * asin(sqrt("
+        f"pow(sin((radians({lat2}) - radians({lat1})) / 2), 2)"
+        f" + cos(radians({lat1})) * cos(radians({lat2})) * pow(sin((radians({lon2}) - radians({lon1})) / 2), 2)"
+        f"))"
+    )
+
+
+class GridIndex:
+    """
+    Index spatial en grille régulière sur un ensemble de points (lon, lat).
+
+    - Chaque point est rangé dans une cellule carrée de `cell_size_m` mètres.
+    - Une recherche dans un rayon ne parcourt que les cellules qui recoupent ce rayon,
+      au lieu de calculer la distance à tous les points.
+    - Les résultats sont des positions dans les tableaux d'origine.
+    """
+
+    def __init__(self, lon, lat, cell_size_m: float = LOCALISATION_MAX_DISTANCE_M):
+        self.lon = np.asarray(lon, dtype = float)
+        self.lat = np.asarray(lat, dtype = float)
+        self.cell_size_m = cell_size_m
+
+        valid = ~(np.isnan(self.lon) | np.isnan(self.lat))
+        cell_x, cell_y = self.cell(self.lon, self.lat)
+        self.cells = {}
+        for position in np.flatnonzero(valid):
+            self.cells.setdefault((cell_x[position], cell_y[position]), []).append(position)
+        self.cells = {key: np.array(positions) for key, positions in self.cells.items()}
+        keys = np.array(list(self.cells), dtype = np.int64).reshape(-1, 2)
+        self.bounds = (keys.min(axis = 0), keys.max(axis = 0)) if len(keys) else None
+
+    def __len__(self):
+        return len(self.lon)
+
+    def cell(self, lon, lat):
+        """Coordonnées de cellule d'un point (ou d'un tableau de points)."""
+        x, y = project(lon, lat)
+        return np.floor(x / self.cell_size_m).astype(np.int64), np.floor(y / self.cell_size_m).astype(np.int64)
+
+    def candidates(self, lon: float, lat: float, radius_m: float) -> np.ndarray:
+        """Positions (triées) des points des cellules qui recoupent le cercle de rayon `radius_m`."""
+        cell_x, cell_y = self.cell(lon, lat)
+        ring = max(1, math.ceil(radius_m / self.cell_size_m))
+        if (2 * ring + 1) ** 2 > len(self.cells):
+            # grand rayon : moins de cellules occupées que de cellules à tester
+            found = [
+                positions for (x, y), positions in self.cells.items()
+                if abs(x - cell_x) <= ring and abs(y - cell_y) <= ring
+            ]
+        else:
+            found = [
+                self.cells[(cell_x + dx, cell_y + dy)]
+                for dx in range(-ring, ring + 1)
+                for dy in range(-ring, ring + 1)
+                if (cell_x + dx, cell_y + dy) in self.cells
+            ]
+        if not found:
+            return np.array([], dtype = np.int64)
+        return np.sort(np.concatenate(found))
+
+    def within(self, lon: float, lat: float, radius_m: float):
+        """Positions et distances des points à moins de `radius_m` mètres, du plus proche au plus éloigné."""
+        positions = self.candidates(lon, lat, radius_m)
+        distances = haversine_m(lon, lat, self.lon[positions], self.lat[positions])
+        keep = distances <= radius_m
+        order = np.argsort(distances[keep], kind = "stable")
+        return positions[keep][order], distances[keep][order]
+
+    def k_nearest(self, lon: float, lat: float, k: int, max_distance_m: float = math.inf, mask: np.ndarray = None):
+        """
+        Positions et distances des `k` points les plus proches à moins de `max_distance_m`, du plus proche au plus éloigné.
+
+        - `mask` : booléens alignés sur les points ; seuls les points retenus sont cherchés (ex. stations avec des vélos).
+        - Le rayon de recherche double jusqu'à contenir `k` points retenus (ou toute la grille) : le résultat est exact,
+          seules les cellules proches sont parcourues quand les points retenus sont denses.
+        """
+        empty = np.array([], dtype = np.int64), np.array([], dtype = float)
+        if np.isnan(lon) or np.isnan(lat) or self.bounds is None or k <= 0:
+            return empty
+        cell_x, cell_y = self.cell(lon, lat)
+        ring = 1
+        while True:
+            radius_m = ring * self.cell_size_m
+            covers_grid = bool(
+                cell_x - ring <= self.bounds[0][0] and cell_x + ring >= self.bounds[1][0]
+                and cell_y - ring <= self.bounds[0][1] and cell_y + ring >= self.bounds[1][1]
+            )
+            # distance jusqu'à laquelle tous les points sont parmi les candidats
+            complete_m = max_distance_m if covers_grid else min(radius_m, max_distance_m)
+            positions = self.candidates(lon, lat, min(radius_m, max_distance_m))
+            if mask is not None:
+                positions = positions[mask[positions]]
+            distances = haversine_m(lon, lat, self.lon[positions], self.lat[positions])
+            keep = distances <= complete_m
+            if keep.sum() >= k or complete_m >= max_distance_m:
+                order = np.argsort(distances[keep], kind = "stable")[:k]
+                return positions[keep][order], distances[keep][order]
+            ring *= 2
+
+    def nearest(self, lon: float, lat: float, max_distance_m: float):
+        """Position et distance du point le plus proche à moins de `max_distance_m` (-1 et NaN sinon)."""
+        if np.isnan(lon) or np.isnan(lat):
+            return -1, np.nan
+        positions, distances = self.within(lon, lat, max_distance_m)
+        if len(positions) == 0:
+            return -1, np.nan
+        return int(positions[0]), float(distances[0])
+
+
+def match_localisation(
+    realtime_df: pd.DataFrame,
+    localisation_df: pd.DataFrame,
+    code_column: str,
+    id_column: str,
+    realtime_coordinates: tuple,
+    localisation_coordinates: tuple,
+    max_distance_m: float = LOCALISATION_MAX_DISTANCE_M,
+):
+    """
+    Associe chaque station temps réel à sa ligne du référentiel de localisation (jointure gauche).
+
+    - Chemin rapide : même identifiant (`code_column` = `id_column`, comparés en texte).
+    - Sinon : localisation la plus proche à moins de `max_distance_m` mètres, via un index en grille.
+    - Retourne les données temps réel enrichies des colonnes de localisation (colonnes `MATCH_METHOD`
+      et `MATCH_DISTANCE_M` comprises) et les statistiques du rapprochement.
+    """
+    started_at = time.perf_counter()
+    realtime_lon, realtime_lat = (realtime_df[column].to_numpy(dtype = float) for column in realtime_coordinates)
+    localisation_lon, localisation_lat = (localisation_df[column].to_numpy(dtype = float) for column in localisation_coordinates)
+
+    localisation_positions = pd.Series(range(len(localisation_df)), index = localisation_df[id_column].astype(str))
+    localisation_positions = localisation_positions[~localisation_positions.index.duplicated()]
+    positions = realtime_df[code_column].astype(str).map(localisation_positions).fillna(-1).to_numpy(dtype = np.int64)
+    methods = np.where(positions >= 0, "id", None).astype(object)
+    distances = np.full(len(realtime_df), np.nan)
+    by_id = positions >= 0
+    distances[by_id] = haversine_m(
+        realtime_lon[by_id], realtime_lat[by_id], localisation_lon[positions[by_id]], localisation_lat[positions[by_id]]
+    )
+
+    index = GridIndex(localisation_lon, localisation_lat, cell_size_m = max_distance_m)
+    for row in np.flatnonzero(~by_id):
+        positions[row], distances[row] = index.nearest(realtime_lon[row], realtime_lat[row], max_distance_m)
+        if positions[row] >= 0:
+            methods[row] = "distance"
+
+    matched_df = realtime_df.assign(
+        MATCH_POSITION = positions, MATCH_METHOD = methods, MATCH_DISTANCE_M = distances
+    ).merge(
+        localisation_df.reset_index(drop = True).rename_axis("MATCH_POSITION").reset_index(),
+        how = "left",
+        on = "MATCH_POSITION",
+    ).drop(columns = "MATCH_POSITION")
+
+    stats = {
+        "nb_stations": len(realtime_df),
+        "by_id": int(by_id.sum()),
+        "by_distance": int((methods == "distance").sum()),
+        "unmatched": int((positions < 0).sum()),
+        "max_distance_m": float(np.nanmax(distances)) if (positions >= 0).any() else None,
+        "duration_ms": (time.perf_counter() - started_at) * 1000,
+    }
+    return matched_df, stats
+
+
+def report_match(source: str, stats: dict):
+    """Affiche la qualité et la durée d'un rapprochement de localisation."""
+    max_distance = "-" if stats["max_distance_m"] is None else f"{stats['max_distance_m']:.1f} m"
+    print(
+        f"Localisation {source} : {stats['nb_stations']} stations, {stats['by_id']} par identifiant, "
+        f"{stats['by_distance']} par distance, {stats['unmatched']} non localisées "
+        f"(écart max {max_distance}, {stats['duration_ms']:.1f} ms)."
+    )
@@ -0,0 +1,156 @@
+"""
+Stockage delta des relevés de disponibilité : seules les stations dont la disponibilité a changé sont écrites.
+
+- Mode choisi par `PipelineContext(statement_storage = "delta")` ("full" par défaut : une ligne par station et par snapshot
+  dans CONSOLIDATE_STATION_STATEMENT).
+- Chaque relevé d'un snapshot est comparé, en une seule jointure, à l'état courant de sa station
+  (intervalle ouvert de STATION_STATEMENT_INTERVAL) : vélos et emplacements disponibles.
+- Un changement ferme l'intervalle ouvert (`VALID_TO`) et en ouvre un nouveau (`VALID_FROM` = snapshot) :
+  le volume écrit dépend du nombre de changements, pas du nombre de stations.
+- Une station absente d'un snapshot (sortie du flux ou relevé rejeté) voit son intervalle ouvert fermé à ce snapshot,
+  comme en stockage complet où elle n'a pas de ligne : elle n'est plus reconstruite pour les snapshots suivants.
+- `STATION_STATEMENT_AS_OF([horodatages])` (macro DuckDB) reconstruit la disponibilité de toutes les stations
+  à n'importe quel instant, avec les colonnes de CONSOLIDATE_STATION_STATEMENT ; FACT_STATION_STATEMENT est alimentée ainsi
+  pour les snapshots stockés en delta.
+- Les snapshots d'une ville doivent être chargés dans l'ordre chronologique (le dernier peut être rechargé) :
+  un historique chargé dans le désordre (backfill) passe par le stockage complet.
+"""
+
+STATEMENT_STORAGES = ("full", "delta")
+
+
+def apply_statements(con, statements_sql: str, parameters: list = None) -> int:
+    """
+    Écrit les relevés validés (`statements_sql` : STATION_ID, SOURCE, compteurs, LAST_STATEMENT_DATE, SNAPSHOT_TS) en intervalles.
+
+    - Les snapshots présents dans les relevés sont appliqués dans l'ordre chronologique.
+    - Un snapshot antérieur au dernier snapshot chargé d'une ville lève une ValueError.
+    - Premier lot d'un snapshot pour une ville : les intervalles ouverts de ses stations absentes du lot sont fermés.
+      Les lots suivants du même snapshot (moteur "streaming") ne ferment rien ; une station fermée par un lot précédent
+      et présente dans le lot courant repart d'un nouvel intervalle ouvert au snapshot.
+    - Retourne le nombre d'intervalles ouverts (relevés modifiés ou nouvelles stations).
+    """
+    snapshots = con.execute(
+        f"SELECT SNAPSHOT_TS, list(DISTINCT SOURCE) FROM ({statements_sql}) GROUP BY SNAPSHOT_TS ORDER BY SNAPSHOT_TS;",
+        parameters,
+    ).fetchall()
+
+    nb_written = 0
+    for snapshot_ts, sources in snapshots:
+        late = con.execute(
+            "SELECT SOURCE, LAST_SNAPSHOT_TS FROM STATION_STATEMENT_DELTA WHERE LAST_SNAPSHOT_TS > ? AND list_contains(?, SOURCE);",
+            [snapshot_ts, sources],
+        ).fetchall()
+        if late:
+            raise ValueError(
+                f"Stockage delta : le snapshot {snapshot_ts} est antérieur au dernier snapshot chargé ({dict(late)}) ; "
+                "charger cet historique en stockage complet (statement_storage = 'full')."
+            )
+        continued = [
+            source for source, in con.execute(
+                "SELECT SOURCE FROM STATION_STATEMENT_DELTA WHERE LAST_SNAPSHOT_TS = CAST(? AS TIMESTAMP) AND list_contains(?, SOURCE);",
+                [snapshot_ts, sources],
+            ).fetchall()
+        ]
+        first_sources = [source for source in sources if source not in continued]
+
+        # stations sorties du flux : intervalle ouvert fermé au premier lot du snapshot de leur ville
+        if first_sources:
+            con.execute(
+                f"""
+                UPDATE STATION_STATEMENT_INTERVAL i SET VALID_TO = ?
+                WHERE i.VALID_TO IS NULL
+                    AND list_contains(?, i.SOURCE)
+                    AND NOT EXISTS (
+                        SELECT 1 FROM ({statements_sql}) n
+                        WHERE n.SNAPSHOT_TS = ? AND n.STATION_ID = i.STATION_ID
+                    );
+                """,
+                [snapshot_ts, first_sources] + (parameters or []) + [snapshot_ts],
+            )
+
+        # relevés différents de l'état courant de leur station (ou station sans état courant)
+        con.execute(
+            f"""
+            CREATE OR REPLACE TEMP TABLE CHANGED_STATION_STATEMENT AS
+            SELECT n.*
+            FROM (
+                SELECT * FROM ({statements_sql})
+                WHERE SNAPSHOT_TS = ?
+                QUALIFY row_number() OVER (PARTITION BY STATION_ID ORDER BY LAST_STATEMENT_DATE DESC) = 1
+            ) n
+            LEFT JOIN STATION_STATEMENT_INTERVAL i ON i.STATION_ID = n.STATION_ID AND i.VALID_TO IS NULL
+            WHERE i.STATION_ID IS NULL
+                OR i.BICYCLE_AVAILABLE IS DISTINCT FROM n.BICYCLE_AVAILABLE
+                OR i.BICYCLE_DOCKS_AVAILABLE IS DISTINCT FROM n.BICYCLE_DOCKS_AVAILABLE;
+            """,
+            (parameters or []) + [snapshot_ts],
+        )
+        con.execute(
+            """
+            UPDATE STATION_STATEMENT_INTERVAL i SET VALID_TO = ?
+            FROM CHANGED_STATION_STATEMENT c
+            WHERE i.STATION_ID = c.STATION_ID AND i.VALID_TO IS NULL;
+            """,
+            [snapshot_ts],
+        )
+        nb_written += con.execute(
+            """
+            INSERT INTO STATION_STATEMENT_INTERVAL
+            SELECT STATION_ID, SOURCE, BICYCLE_DOCKS_AVAILABLE, BICYCLE_AVAILABLE, LAST_STATEMENT_DATE, SNAPSHOT_TS, NULL
+            FROM CHANGED_STATION_STATEMENT;
+            """
+        ).fetchone()[0]
+        con.execute(
+            """
+            INSERT INTO STATION_STATEMENT_DELTA
+            SELECT unnest(?), CAST(? AS TIMESTAMP), current_localtimestamp()
+            ON CONFLICT DO UPDATE SET LAST_SNAPSHOT_TS = excluded.LAST_SNAPSHOT_TS, UPDATED_AT = excluded.UPDATED_AT;
+            """,
+            [sources, snapshot_ts],
+        )
+        con.execute("DROP TABLE CHANGED_STATION_STATEMENT;")
+    return nb_written
+
+
+def undo_snapshot(con, snapshot_ts, sources: list):
+    """
+    Annule le dernier snapshot appliqué d'une ville avant de le recharger : intervalles ouverts supprimés, intervalles fermés rouverts.
+
+    - Le dernier snapshot chargé de la ville est oublié : le rechargement est traité comme un premier lot.
+    - Sans effet pour les villes dont le dernier snapshot chargé en delta est un autre snapshot.
+    """
+    sources = [
+        source for source, in con.execute(
+            "SELECT SOURCE FROM STATION_STATEMENT_DELTA WHERE LAST_SNAPSHOT_TS = CAST(? AS TIMESTAMP) AND list_contains(?, SOURCE);",
+            [snapshot_ts, list(sources)],
+        ).fetchall()
+    ]
+    if not sources:
+        return
+    con.execute(
+        "DELETE FROM STATION_STATEMENT_INTERVAL WHERE VALID_FROM = CAST(? AS TIMESTAMP) AND list_contains(?, SOURCE);",
+        [snapshot_ts, sources],
+    )
+    con.execute(
+        "UPDATE STATION_STATEMENT_INTERVAL SET VALID_TO = NULL WHERE VALID_TO = CAST(? AS TIMESTAMP) AND list_contains(?, SOURCE);",
+        [snapshot_ts, sources],
+    )
+    con.execute("DELETE FROM STATION_STATEMENT_DELTA WHERE list_contains(?, SOURCE);", [sources])
+
+
+def report_delta(con, snapshot_ts, sources: list):
+    """Affiche, par ville, le nombre de stations modifiées par un snapshot sur le nombre de relevés chargés (DATA_QUALITY_METRICS)."""
+    counters = con.execute(
+        """
+        SELECT m.SOURCE, m.NB_ROWS, COUNT(i.STATION_ID)
+        FROM DATA_QUALITY_METRICS m
+        LEFT JOIN STATION_STATEMENT_INTERVAL i ON i.SOURCE = m.SOURCE AND i.VALID_FROM = m.SNAPSHOT_TS
+        WHERE m.SNAPSHOT_TS = CAST(? AS TIMESTAMP) AND m.METRIC = 'LOADED' AND list_contains(?, m.SOURCE)
+        GROUP BY m.SOURCE, m.NB_ROWS
+        ORDER BY m.SOURCE;
+        """,
+        [snapshot_ts, list(sources)],
+    ).fetchall()
+    for source, nb_loaded, nb_changed in counters:
+        print(f"Stockage delta {source} : {nb_changed} stations modifiées sur {nb_loaded} relevés.")
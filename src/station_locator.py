@@ -0,0 +1,276 @@
+"""
+Recherche des stations les plus proches d'un point avec des vélos (ou des emplacements) disponibles.
+
+- Un index spatial en grille (`spatial.GridIndex`) sur les coordonnées de DIM_STATION est gardé en mémoire
+  avec la dernière disponibilité connue de chaque station (état courant CURRENT_STATION_STATE, une ligne par station) :
+  seules les stations du dernier snapshot de leur source sont indexées.
+- Une requête ne parcourt que les cellules proches du point : pas de lecture de l'historique ni de calcul
+  de distance à toutes les stations.
+- L'index est reconstruit quand de nouvelles stations ou de nouveaux relevés ont été chargés
+  (marque de chargement ETL_WATERMARK de DIM_STATION, date de mise à jour de CURRENT_STATION_STATE).
+- Requêtes : k plus proches (`nearest`), dans un rayon (`within`), et k plus proches de nombreux points (`nearest_batch`).
+
+    python src/station_locator.py --lon 2.3522 --lat 48.8566 --k 5 --min-bikes 2
+    python src/station_locator.py --benchmark --stations 20000 --queries 2000
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import spatial
+
+# Taille des cellules de l'index : quelques stations par cellule en centre-ville.
+LOCATOR_CELL_SIZE_M = 250
+
+# Stations de l'état courant (dernier snapshot de leur source) avec leurs coordonnées dans DIM_STATION.
+STATION_AVAILABILITY_SQL = """
+    SELECT
+        ds.ID AS STATION_ID,
+        ds.CODE,
+        ds.NAME,
+        ds.ADDRESS,
+        s.CITY_ID,
+        ds.LONGITUDE,
+        ds.LATITUDE,
+        ds.CAPACITTY,
+        s.BICYCLE_AVAILABLE,
+        s.BICYCLE_DOCKS_AVAILABLE,
+        s.SNAPSHOT_TS
+    FROM DIM_STATION ds
+    JOIN CURRENT_STATION_STATE s ON s.STATION_ID = ds.ID
+    WHERE ds.LONGITUDE IS NOT NULL AND ds.LATITUDE IS NOT NULL
+    ORDER BY ds.ID
+"""
+
+# Version des données indexées : change à chaque chargement de DIM_STATION ou de relevés.
+LOCATOR_VERSION_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM ETL_WATERMARK WHERE TARGET_TABLE = 'DIM_STATION'),
+        (SELECT MAX(HIGH_WATER_MARK) FROM ETL_WATERMARK WHERE TARGET_TABLE = 'DIM_STATION'),
+        (SELECT MAX(UPDATED_AT) FROM CURRENT_STATION_STATE),
+        (SELECT COUNT(*) FROM CURRENT_STATION_STATE)
+"""
+
+RESULT_COLUMNS = ["STATION_ID", "CODE", "NAME", "ADDRESS", "CITY_ID", "LONGITUDE", "LATITUDE", "BICYCLE_AVAILABLE", "BICYCLE_DOCKS_AVAILABLE", "SNAPSHOT_TS"]
+
+
+class StationLocator:
+    """
+    Index en mémoire des stations et de leur dernière disponibilité.
+
+    - `min_bikes` / `min_docks` : seules les stations avec au moins autant de vélos / d'emplacements disponibles
+      sont retenues (0 : toutes les stations indexées).
+    - Les résultats sont des DataFrames triés par distance (colonne `DISTANCE_M`, en mètres).
+    """
+
+    def __init__(self, stations_df: pd.DataFrame, cell_size_m: float = LOCATOR_CELL_SIZE_M, version = None):
+        self.stations = stations_df.reset_index(drop = True)
+        self.results = self.stations[RESULT_COLUMNS]
+        self.version = version
+        self.index = spatial.GridIndex(self.stations["LONGITUDE"], self.stations["LATITUDE"], cell_size_m = cell_size_m)
+        self.bikes = self.stations["BICYCLE_AVAILABLE"].to_numpy(dtype = float, na_value = np.nan)
+        self.docks = self.stations["BICYCLE_DOCKS_AVAILABLE"].to_numpy(dtype = float, na_value = np.nan)
+
+    @classmethod
+    def from_database(cls, con, cell_size_m: float = LOCATOR_CELL_SIZE_M):
+        """Index construit depuis l'état courant des stations et leurs coordonnées dans DIM_STATION."""
+        version = con.execute(LOCATOR_VERSION_SQL).fetchone()
+        return cls(con.execute(STATION_AVAILABILITY_SQL).fetchdf(), cell_size_m = cell_size_m, version = version)
+
+    def __len__(self):
+        return len(self.stations)
+
+    def mask(self, min_bikes: int = 0, min_docks: int = 0):
+        """Stations retenues par les filtres de disponibilité (None sans filtre)."""
+        if min_bikes <= 0 and min_docks <= 0:
+            return None
+        keep = np.ones(len(self.stations), dtype = bool)
+        if min_bikes > 0:
+            keep &= self.bikes >= min_bikes
+        if min_docks > 0:
+            keep &= self.docks >= min_docks
+        return keep
+
+    def result(self, positions: np.ndarray, distances: np.ndarray) -> pd.DataFrame:
+        """Lignes des stations trouvées, avec leur distance."""
+        return self.results.iloc[positions].assign(DISTANCE_M = distances).reset_index(drop = True)
+
+    def nearest(self, lon: float, lat: float, k: int = 5, min_bikes: int = 0, min_docks: int = 0, max_distance_m: float = math.inf) -> pd.DataFrame:
+        """Les `k` stations retenues les plus proches du point (à moins de `max_distance_m`)."""
+        return self.result(*self.index.k_nearest(lon, lat, k, max_distance_m, self.mask(min_bikes, min_docks)))
+
+    def within(self, lon: float, lat: float, radius_m: float, min_bikes: int = 0, min_docks: int = 0) -> pd.DataFrame:
+        """Les stations retenues à moins de `radius_m` mètres du point."""
+        positions, distances = self.index.within(lon, lat, radius_m)
+        keep = self.mask(min_bikes, min_docks)
+        if keep is not None:
+            positions, distances = positions[keep[positions]], distances[keep[positions]]
+        return self.result(positions, distances)
+
+    def nearest_batch(self, lon, lat, k: int = 5, min_bikes: int = 0, min_docks: int = 0, max_distance_m: float = math.inf) -> pd.DataFrame:
+        """
+        Les `k` stations retenues les plus proches de chacun des points (`lon`, `lat` : tableaux).
+
+        - Le filtre de disponibilité est calculé une seule fois pour tous les points.
+        - Retourne un seul DataFrame avec la position du point d'origine (`ORIGIN`) et le rang de la station (`RANK`, à partir de 1).
+        """
+        keep = self.mask(min_bikes, min_docks)
+        lon = np.asarray(lon, dtype = float)
+        lat = np.asarray(lat, dtype = float)
+        found = [self.index.k_nearest(lon[origin], lat[origin], k, max_distance_m, keep) for origin in range(len(lon))]
+        counts = [len(positions) for positions, _ in found]
+        if not any(counts):
+            return self.result(np.array([], dtype = np.int64), np.array([], dtype = float)).assign(ORIGIN = [], RANK = [])
+        batch_df = self.result(np.concatenate([positions for positions, _ in found]), np.concatenate([distances for _, distances in found]))
+        batch_df.insert(0, "ORIGIN", np.repeat(np.arange(len(lon)), counts))
+        batch_df.insert(1, "RANK", np.concatenate([np.arange(1, count + 1) for count in counts]))
+        return batch_df
+
+
+# Index gardés en mémoire par base DuckDB : chemin -> StationLocator.
+_locators = {}
+_locators_lock = threading.Lock()
+
+
+def get_station_locator(ctx, cell_size_m: float = LOCATOR_CELL_SIZE_M) -> StationLocator:
+    """Index des stations de la base du contexte, reconstruit seulement si une agrégation a chargé des données depuis."""
+    version = ctx.con.execute(LOCATOR_VERSION_SQL).fetchone()
+    with _locators_lock:
+        locator = _locators.get(ctx.duckdb_path)
+        if locator is None or locator.version != version or locator.index.cell_size_m != cell_size_m:
+            locator = _locators[ctx.duckdb_path] = StationLocator.from_database(ctx.con, cell_size_m)
+    return locator
+
+
+def refresh_station_locator(ctx):
+    """Étape du pipeline : reconstruit l'index des stations après l'agrégation (processus de longue durée, ex. scheduler)."""
+    started_at = time.perf_counter()
+    with _locators_lock:
+        locator = _locators[ctx.duckdb_path] = StationLocator.from_database(ctx.con)
+    nb_available = int(np.sum(locator.bikes > 0))
+    print(
+        f"Index des stations : {len(locator)} stations, {nb_available} avec des vélos disponibles "
+        f"({(time.perf_counter() - started_at) * 1000:.1f} ms)."
+    )
+    return locator
+
+
+def brute_force_nearest(station_lon: np.ndarray, station_lat: np.ndarray, keep: np.ndarray, lon: float, lat: float, k: int):
+    """Référence du microbenchmark : distance à toutes les stations retenues (`keep`) puis tri ; positions et distances."""
+    positions = np.flatnonzero(keep)
+    distances = spatial.haversine_m(lon, lat, station_lon[positions], station_lat[positions])
+    order = np.argsort(distances, kind = "stable")[:k]
+    return positions[order], distances[order]
+
+
+def benchmark_locator(nb_stations: int = 20000, nb_queries: int = 2000, k: int = 5, min_bikes: int = 1, seed: int = 0) -> dict:
+    """
+    Microbenchmark de l'index sur des stations synthétiques (autour de Paris), comparé au calcul exhaustif.
+
+    - `brute_force` : distance à toutes les stations en numpy (sans DataFrame de résultat) ; `sql_scan` : requête DuckDB ORDER BY distance LIMIT k
+      (sur 1 requête sur 20, la plus lente) ; `grid` : `StationLocator.nearest` ; `grid_batch` : `nearest_batch` sur tous les points.
+    - Les résultats de l'index sont vérifiés contre le calcul exhaustif.
+    """
+    import duckdb
+
+    from benchmark import summarize
+
+    rng = np.random.default_rng(seed)
+    capacity = rng.integers(10, 60, nb_stations)
+    bikes = rng.integers(0, capacity + 1)
+    stations_df = pd.DataFrame({
+        "STATION_ID": [f"S{index}" for index in range(nb_stations)],
+        "CODE": [str(index) for index in range(nb_stations)],
+        "NAME": [f"Station {index}" for index in range(nb_stations)],
+        "ADDRESS": None,
+        "CITY_ID": "75056",
+        "LONGITUDE": 2.35 + rng.uniform(-0.15, 0.15, nb_stations),
+        "LATITUDE": 48.86 + rng.uniform(-0.08, 0.08, nb_stations),
+        "CAPACITTY": capacity,
+        "BICYCLE_AVAILABLE": bikes,
+        "BICYCLE_DOCKS_AVAILABLE": capacity - bikes,
+        "SNAPSHOT_TS": pd.Timestamp("2025-01-01"),
+    })
+    query_lon = 2.35 + rng.uniform(-0.15, 0.15, nb_queries)
+    query_lat = 48.86 + rng.uniform(-0.08, 0.08, nb_queries)
+
+    started_at = time.perf_counter()
+    locator = StationLocator(stations_df)
+    build_ms = (time.perf_counter() - started_at) * 1000
+
+    station_lon, station_lat = stations_df["LONGITUDE"].to_numpy(), stations_df["LATITUDE"].to_numpy()
+    durations = {"brute_force": [], "sql_scan": [], "grid": []}
+    mismatches = 0
+    for lon, lat in zip(query_lon, query_lat):
+        started_at = time.perf_counter()
+        _, expected_distances = brute_force_nearest(station_lon, station_lat, locator.mask(min_bikes), lon, lat, k)
+        durations["brute_force"].append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        found_df = locator.nearest(lon, lat, k, min_bikes = min_bikes)
+        durations["grid"].append(time.perf_counter() - started_at)
+        if not np.allclose(found_df["DISTANCE_M"].to_numpy(), expected_distances):
+            mismatches += 1
+
+    con = duckdb.connect()
+    con.register("stations_df", stations_df)
+    con.execute("CREATE TABLE STATIONS AS SELECT * FROM stations_df")
+    distance_sql = spatial.haversine_sql("$lon", "$lat", "LONGITUDE", "LATITUDE")
+    for lon, lat in zip(query_lon[::20], query_lat[::20]):
+        started_at = time.perf_counter()
+        con.execute(
+            f"SELECT STATION_ID, {distance_sql} AS DISTANCE_M FROM STATIONS WHERE BICYCLE_AVAILABLE >= $min_bikes ORDER BY DISTANCE_M LIMIT $k",
+            {"lon": lon, "lat": lat, "min_bikes": min_bikes, "k": k},
+        ).fetchall()
+        durations["sql_scan"].append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    batch_df = locator.nearest_batch(query_lon, query_lat, k, min_bikes = min_bikes)
+    batch_seconds = time.perf_counter() - started_at
+
+    return {
+        "config": {"stations": nb_stations, "queries": nb_queries, "k": k, "min_bikes": min_bikes, "seed": seed},
+        "build_ms": round(build_ms, 2),
+        "mismatches": mismatches,
+        "queries": {name: summarize(stage_durations, len(stage_durations)) for name, stage_durations in durations.items()},
+        "grid_batch": {
+            "total_s": round(batch_seconds, 4),
+            "rows": len(batch_df),
+            "queries_per_s": round(nb_queries / batch_seconds, 1),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Stations les plus proches d'un point, lues dans la dernière version publiée.")
+    parser.add_argument("--lon", type = float, default = 2.3522, help = "Longitude du point.")
+    parser.add_argument("--lat", type = float, default = 48.8566, help = "Latitude du point.")
+    parser.add_argument("--k", type = int, default = 5, help = "Nombre de stations.")
+    parser.add_argument("--radius", type = float, default = None, help = "Rayon en mètres (toutes les stations du rayon au lieu des k plus proches).")
+    parser.add_argument("--min-bikes", type = int, default = 0, help = "Vélos disponibles au minimum.")
+    parser.add_argument("--min-docks", type = int, default = 0, help = "Emplacements disponibles au minimum.")
+    parser.add_argument("--publish-dir", default = None, help = "Dossier des versions publiées (data/published par défaut).")
+    parser.add_argument("--benchmark", action = "store_true", help = "Microbenchmark sur des stations synthétiques.")
+    parser.add_argument("--stations", type = int, default = 20000, help = "Microbenchmark : nombre de stations.")
+    parser.add_argument("--queries", type = int, default = 2000, help = "Microbenchmark : nombre de requêtes.")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(json.dumps(benchmark_locator(args.stations, args.queries, args.k, max(args.min_bikes, 1)), indent = 2))
+        raise SystemExit(0)
+
+    from publish import PUBLISH_DIR, open_published
+
+    with open_published(args.publish_dir or PUBLISH_DIR) as ctx:
+        locator = get_station_locator(ctx)
+        if args.radius is not None:
+            stations_df = locator.within(args.lon, args.lat, args.radius, args.min_bikes, args.min_docks)
+        else:
+            stations_df = locator.nearest(args.lon, args.lat, args.k, args.min_bikes, args.min_docks)
+        print(stations_df)
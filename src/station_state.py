@@ -0,0 +1,100 @@
+"""
+État courant des stations : une ligne par station dans CURRENT_STATION_STATE, mise à jour à chaque consolidation.
+
+- Dernier relevé validé de chaque station : vélos et emplacements disponibles, date du relevé, snapshot,
+  capacité et ville (code INSEE) de la station le jour du relevé.
+- Mise à jour en un seul upsert par lot de relevés (`data_quality.load_statements`), quel que soit le moteur
+  ou le mode de stockage ; un relevé plus ancien que l'état connu (backfill) ne le remplace pas.
+- Seules les stations du dernier snapshot de leur source sont gardées : une station sortie du flux
+  (ou rejetée par les règles de qualité) n'est plus comptée dans la disponibilité actuelle.
+- Les questions sur la disponibilité actuelle lisent cette table (une ligne par station) plutôt que l'historique.
+"""
+
+# colonnes de CURRENT_STATION_STATE mises à jour par un relevé plus récent
+STATE_COLUMNS = ("SOURCE", "CITY_ID", "CAPACITTY", "BICYCLE_DOCKS_AVAILABLE", "BICYCLE_AVAILABLE", "LAST_STATEMENT_DATE", "SNAPSHOT_TS", "UPDATED_AT")
+
+
+def upsert_current_state(con, statements_sql: str, parameters: list = None) -> int:
+    """
+    Met à jour l'état courant à partir de relevés validés (`statements_sql` : STATION_ID, SOURCE, CITY_CODE, CAPACITTY,
+    compteurs, LAST_STATEMENT_DATE, SNAPSHOT_TS).
+
+    - Seul le relevé le plus récent de chaque station est retenu (plusieurs snapshots dans un même lot) ;
+      les relevés antérieurs au dernier snapshot connu de leur source (backfill) sont ignorés.
+    - Les stations des sources du lot dont l'état est antérieur au dernier snapshot chargé de leur source sont supprimées :
+      elles sont absentes de ce snapshot (un lot suivant du même snapshot, moteur "streaming", les réinsère).
+    - Retourne le nombre de stations insérées ou mises à jour.
+    """
+    updates = ", ".join(f"{column} = excluded.{column}" for column in STATE_COLUMNS)
+    nb_written = con.execute(
+        f"""
+        INSERT INTO CURRENT_STATION_STATE
+        SELECT
+            STATION_ID,
+            SOURCE,
+            CITY_CODE,
+            CAPACITTY,
+            BICYCLE_DOCKS_AVAILABLE,
+            BICYCLE_AVAILABLE,
+            LAST_STATEMENT_DATE,
+            SNAPSHOT_TS,
+            current_localtimestamp()
+        FROM ({statements_sql}) n
+        WHERE n.SNAPSHOT_TS >= coalesce((SELECT MAX(SNAPSHOT_TS) FROM CURRENT_STATION_STATE c WHERE c.SOURCE = n.SOURCE), n.SNAPSHOT_TS)
+        QUALIFY row_number() OVER (PARTITION BY STATION_ID ORDER BY SNAPSHOT_TS DESC, LAST_STATEMENT_DATE DESC) = 1
+        ON CONFLICT DO UPDATE SET {updates}
+        WHERE excluded.SNAPSHOT_TS >= CURRENT_STATION_STATE.SNAPSHOT_TS;
+        """,
+        parameters,
+    ).fetchone()[0]
+    con.execute(
+        f"""
+        DELETE FROM CURRENT_STATION_STATE s
+        USING (SELECT SOURCE, MAX(SNAPSHOT_TS) AS SNAPSHOT_TS FROM ({statements_sql}) GROUP BY SOURCE) l
+        WHERE s.SOURCE = l.SOURCE AND s.SNAPSHOT_TS < l.SNAPSHOT_TS;
+        """,
+        parameters,
+    )
+    return nb_written
+
+
+def seed_current_state(con) -> int:
+    """
+    Initialise l'état courant d'une base existante à partir de l'historique (une seule fois, table vide).
+
+    - Dernier relevé de chaque station, stocké en complet (CONSOLIDATE_STATION_STATEMENT) ou en delta (intervalle ouvert),
+      limité aux stations du dernier snapshot de leur source.
+    - En delta, un intervalle ouvert vaut pour le dernier snapshot chargé de sa source (STATION_STATEMENT_DELTA)
+      (l'intervalle d'une station sortie du flux est fermé) ; `LAST_STATEMENT_DATE` est celle du début de l'intervalle.
+    - Retourne le nombre de stations écrites.
+    """
+    if con.execute("SELECT COUNT(*) FROM CURRENT_STATION_STATE").fetchone()[0]:
+        return 0
+    return con.execute(
+        """
+        INSERT INTO CURRENT_STATION_STATE
+        SELECT
+            ss.STATION_ID,
+            k.SOURCE,
+            s.CITY_CODE,
+            s.CAPACITTY,
+            ss.BICYCLE_DOCKS_AVAILABLE,
+            ss.BICYCLE_AVAILABLE,
+            ss.LAST_STATEMENT_DATE,
+            ss.SNAPSHOT_TS,
+            current_localtimestamp()
+        FROM (
+            SELECT STATION_ID, BICYCLE_DOCKS_AVAILABLE, BICYCLE_AVAILABLE, LAST_STATEMENT_DATE, CAST(CREATED_DATE AS DATE) AS CREATED_DATE, SNAPSHOT_TS
+            FROM CONSOLIDATE_STATION_STATEMENT
+            UNION ALL
+            SELECT i.STATION_ID, i.BICYCLE_DOCKS_AVAILABLE, i.BICYCLE_AVAILABLE, i.LAST_STATEMENT_DATE, CAST(i.VALID_FROM AS DATE), d.LAST_SNAPSHOT_TS
+            FROM STATION_STATEMENT_INTERVAL i
+            JOIN STATION_STATEMENT_DELTA d ON d.SOURCE = i.SOURCE
+            WHERE i.VALID_TO IS NULL
+        ) ss
+        LEFT JOIN STATION_KEY_REGISTRY k ON k.ID = ss.STATION_ID
+        LEFT JOIN CONSOLIDATE_STATION s ON s.ID = ss.STATION_ID AND s.CREATED_DATE = ss.CREATED_DATE
+        QUALIFY row_number() OVER (PARTITION BY ss.STATION_ID ORDER BY ss.SNAPSHOT_TS DESC, ss.LAST_STATEMENT_DATE DESC) = 1
+            AND ss.SNAPSHOT_TS = MAX(ss.SNAPSHOT_TS) OVER (PARTITION BY k.SOURCE);
+        """
+    ).fetchone()[0]
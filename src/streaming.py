@@ -0,0 +1,145 @@
+"""
+Lecture en flux des fichiers bruts JSON (tableau d'objets au premier niveau) par lots Arrow de taille fixe.
+
+- Le fichier est lu par blocs et décodé objet par objet : ni le texte complet, ni la liste Python complète
+  ne sont en mémoire, le pic de mémoire dépend de la taille des lots et non de celle du flux.
+- Chaque objet est aplati comme par `pd.json_normalize` (`coordonnees_geo.lon`) et seuls les champs demandés sont gardés.
+- Les lots (`pyarrow.RecordBatch`) sont lus par DuckDB sans copie (replacement scan sur l'objet Arrow).
+
+pyarrow est optionnel : sans lui, le moteur de consolidation "streaming" n'est pas disponible.
+"""
+
+import json
+
+from raw_store import open_raw
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # moteur "streaming" indisponible
+    pa = None
+    pc = None
+
+DEFAULT_BATCH_SIZE = 10_000
+READ_SIZE = 1024 * 1024
+
+# Conversions de type des adaptateurs (`coercions`, noms pandas) vers les types Arrow.
+ARROW_TYPES = {
+    "Int64": "int64",
+    "float": "float64",
+    "string": "string",
+}
+
+
+def require_pyarrow():
+    """Lève une erreur explicite si pyarrow n'est pas installé."""
+    if pa is None:
+        raise ImportError("Le moteur de consolidation 'streaming' nécessite pyarrow (pip install pyarrow).")
+
+
+def iter_json_array(path: str, read_size: int = READ_SIZE):
+    """
+    Itère sur les objets d'un tableau JSON de premier niveau sans charger tout le fichier.
+
+    - Le texte est lu par blocs de `read_size` caractères (fichier compressé ou non, voir `open_raw`).
+    - Un objet coupé entre deux blocs est décodé après lecture du bloc suivant.
+    """
+    decoder = json.JSONDecoder()
+    with open_raw(path) as fd:
+        buffer, position, eof, started = "", 0, False, False
+        while True:
+            # séparateurs (espaces, virgules) ; lecture d'un nouveau bloc si le tampon est épuisé
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n,":
+                    position += 1
+                if position < len(buffer) or eof:
+                    break
+                chunk = fd.read(read_size)
+                buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+
+            if position >= len(buffer):
+                raise ValueError(f"Tableau JSON incomplet : {path}")
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError(f"Le fichier {path} ne contient pas un tableau JSON.")
+                started, position = True, position + 1
+                continue
+            if buffer[position] == "]":
+                return
+
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = fd.read(read_size)
+                buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+                continue
+            yield record
+
+
+def flatten_record(record: dict, prefix: str = "") -> dict:
+    """Aplatit les objets imbriqués d'un enregistrement (`{"a": {"b": 1}}` -> `{"a.b": 1}`), comme `pd.json_normalize`."""
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def iter_record_batches(path: str, fields: list, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Lots Arrow de `batch_size` lignes au plus, avec une colonne par champ demandé (NULL si absent de l'objet).
+
+    - Le type de chaque colonne est déduit lot par lot par pyarrow.
+    """
+    require_pyarrow()
+    columns = {field: [] for field in fields}
+    nb_rows = 0
+    for record in iter_json_array(path):
+        flat = flatten_record(record)
+        for field, values in columns.items():
+            values.append(flat.get(field))
+        nb_rows += 1
+        if nb_rows == batch_size:
+            yield pa.RecordBatch.from_pydict(columns)
+            columns = {field: [] for field in fields}
+            nb_rows = 0
+    if nb_rows:
+        yield pa.RecordBatch.from_pydict(columns)
+
+
+def map_batch(batch, columns: dict, coercions: dict, target_columns: list, constants: dict):
+    """
+    Équivalent Arrow de `data_consolidation.map_columns` pour un lot lu par `iter_record_batches`.
+
+    - Renomme les champs du flux vers les colonnes cibles, sans copie ; les colonnes non déclarées sont NULL.
+    - Applique les conversions déclarées (`datetime` : horodatage UTC, ou type pandas de `ARROW_TYPES`).
+    - CODE et CITY_CODE sont convertis en texte ; les colonnes constantes sont ajoutées (`SOURCE`, `CREATED_DATE`, ...).
+    """
+    names = target_columns + [column for column in constants if column not in target_columns]
+    arrays = []
+    for column in names:
+        if column in constants:
+            arrays.append(pa.array([constants[column]] * batch.num_rows))
+            continue
+        if column not in columns:
+            arrays.append(pa.nulls(batch.num_rows))
+            continue
+        array = batch.column(columns[column])
+        for conversion in coercions.get(column, []):
+            target_type = pa.timestamp("us", tz = "UTC") if conversion == "datetime" else pa.type_for_alias(ARROW_TYPES[conversion])
+            array = pc.cast(array, target_type)
+        if column in ("CODE", "CITY_CODE"):
+            array = pc.cast(array, pa.string())
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, names = names)
+
+
+def first_rows(table, key: str):
+    """Garde la première ligne de chaque valeur de `key` (équivalent de `drop_duplicates(subset = [key])`)."""
+    keys = table.column(key)
+    first_indices = pc.index_in(pc.unique(keys), value_set = keys)
+    return table.take(pc.take(first_indices, pc.sort_indices(first_indices)))
@@ -1,39 +1,175 @@
-import json
-from datetime import datetime, date
+from datetime import datetime
 
-import duckdb
-import os
 import pandas as pd
 
-def get_max_station_id(con):
+from raw_store import RawStore
+
+def init_station_key_registry(con):
+    """
+    Crée la séquence des IDs de station au premier lancement.
+
+    - Si des stations ont déjà été consolidées avec les anciens IDs, le registre est initialisé
+      avec les IDs de la dernière date consolidée (Paris : stations sans adresse), pour garder les mêmes IDs.
+    - La séquence démarre après le plus grand ID existant.
+    """
+    if con.execute("SELECT COUNT(*) FROM duckdb_sequences() WHERE sequence_name = 'STATION_ID_SEQ'").fetchone()[0]:
+        return
+
+    con.execute("""
+        INSERT OR IGNORE INTO STATION_KEY_REGISTRY
+        SELECT
+            CASE WHEN ADDRESS IS NULL THEN 'paris' ELSE 'nantes' END AS SOURCE,
+            CODE,
+            ID,
+            current_localtimestamp() AS CREATED_AT
+        FROM CONSOLIDATE_STATION
+        WHERE CREATED_DATE = (SELECT MAX(CREATED_DATE) FROM CONSOLIDATE_STATION)
+        QUALIFY row_number() OVER (PARTITION BY SOURCE, CODE ORDER BY CAST(ID AS INTEGER)) = 1;
+    """)
+    max_id = con.execute("SELECT MAX(CAST(ID AS INTEGER)) FROM STATION_KEY_REGISTRY").fetchone()[0]
+    con.execute(f"CREATE SEQUENCE STATION_ID_SEQ START {(max_id or 0) + 1};")
+
+
+def register_station_keys(con, source, codes):
+    """
+    Attribue un ID permanent aux stations encore absentes du registre.
+
+    - `source` : une source (`paris`, `nantes`) pour tous les codes, ou une source par code (stations de plusieurs villes).
+    - Un seul INSERT pour toutes les nouvelles stations, dans l'ordre du flux.
+    - Les stations déjà connues gardent leur ID, quel que soit l'ordre du flux.
+    """
+    new_codes_df = pd.DataFrame({
+        "SOURCE": source if isinstance(source, str) else column_series(source),
+        "CODE": column_series(codes).astype("string"),
+    }).dropna().drop_duplicates(ignore_index = True)
+    new_codes_df["POSITION"] = range(len(new_codes_df))
+    # l'anti-jointure ne garde pas l'ordre des lignes : les IDs sont tirés après un tri sur la position dans le flux
+    con.execute(
+        """
+        INSERT INTO STATION_KEY_REGISTRY
+        SELECT SOURCE, CODE, CAST(nextval('STATION_ID_SEQ') AS VARCHAR), current_localtimestamp()
+        FROM (
+            SELECT n.SOURCE, n.CODE
+            FROM new_codes_df n
+            WHERE NOT EXISTS (SELECT 1 FROM STATION_KEY_REGISTRY k WHERE k.SOURCE = n.SOURCE AND k.CODE = n.CODE)
+            ORDER BY n.POSITION
+        );
+        """
+    )
+
+
+def column_series(values) -> pd.Series:
+    """
+    Colonne pandas, colonne Arrow ou séquence, en Series pandas indexée à partir de 0.
+
+    - Les entiers avec des valeurs manquantes restent des entiers (type objet) : pas de conversion en flottants.
+    """
+    if isinstance(values, pd.Series):
+        return values.reset_index(drop = True)
+    if hasattr(values, "to_pandas"):
+        return values.to_pandas(integer_object_nulls = True).reset_index(drop = True)
+    return pd.Series(values, dtype = object)
+
+
+def station_key_join_sql(code_expression: str, join_type: str = "INNER", source_expression: str = "?") -> str:
+    """Jointure vers le registre des stations (alias `k`) sur la source (`?` par défaut) et le code station de la source."""
+    return (
+        f"{join_type} JOIN STATION_KEY_REGISTRY k "
+        f"ON k.SOURCE = {source_expression} AND k.CODE = CAST({code_expression} AS VARCHAR)"
+    )
+
+
+def drop_legacy_table(con, table_name: str, required_column: str):
     """
-    Récupère l'ID maximum existant dans la table CONSOLIDATE_STATION.
-    Si la table est vide, retourne 0.
+    Supprime une table créée avec un ancien schéma (colonne `required_column` absente).
+    La table est ensuite recréée par le script SQL de création.
     """
-    result = con.execute("SELECT MAX(CAST(ID AS INTEGER)) FROM CONSOLIDATE_STATION;").fetchone()
-    return result[0] if result[0] is not None else 0
+    columns = con.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = ?;", [table_name]
+    ).fetchall()
+    if columns and required_column not in [column[0] for column in columns]:
+        con.execute(f"DROP TABLE {table_name};")
 
 
-def serialize_data(raw_json: str, file_name: str):
+def mark_partition(con, table_name: str, partition_key):
+    """
+    Enregistre dans ETL_PARTITION qu'une partition d'une table de consolidation vient d'être écrite.
+
+    - `partition_key` est la date (`CREATED_DATE`) ou l'horodatage du snapshot (`SNAPSHOT_TS`) écrit.
+    - L'heure d'écriture sert de high-water mark aux agrégations incrémentales (`pending_partitions`).
+    """
+    con.execute(
+        "INSERT OR REPLACE INTO ETL_PARTITION VALUES (?, ?, current_localtimestamp());",
+        [table_name, str(partition_key)],
+    )
+
+
+def pending_partitions(con, target_table: str, source_table: str) -> list:
+    """
+    Partitions de `source_table` écrites depuis leur dernier chargement dans `target_table`.
 
+    - Compare l'heure d'écriture de chaque partition (ETL_PARTITION) à la high-water mark
+      enregistrée pour la table cible (ETL_WATERMARK).
+    - Retourne une liste triée de tuples (clé de partition, heure d'écriture).
     """
-    Sérialise et enregistre des données JSON dans un fichier local.
+    return con.execute(
+        """
+        SELECT p.PARTITION_KEY, p.UPDATED_AT
+        FROM ETL_PARTITION p
+        LEFT JOIN ETL_WATERMARK w
+            ON w.TARGET_TABLE = ? AND w.SOURCE_TABLE = p.TABLE_NAME AND w.PARTITION_KEY = p.PARTITION_KEY
+        WHERE p.TABLE_NAME = ?
+            AND (w.HIGH_WATER_MARK IS NULL OR w.HIGH_WATER_MARK < p.UPDATED_AT)
+        ORDER BY p.PARTITION_KEY;
+        """,
+        [target_table, source_table],
+    ).fetchall()
+
+
+def latest_loaded_partition(con, target_table: str, source_table: str):
+    """Clé de la partition la plus récente déjà chargée dans `target_table` (None si aucune)."""
+    return con.execute(
+        "SELECT MAX(PARTITION_KEY) FROM ETL_WATERMARK WHERE TARGET_TABLE = ? AND SOURCE_TABLE = ?;",
+        [target_table, source_table],
+    ).fetchone()[0]
+
+
+def mark_loaded(con, target_table: str, source_table: str, partitions: list):
+    """Enregistre la high-water mark de chaque partition chargée dans `target_table`."""
+    if partitions:
+        con.executemany(
+            "INSERT OR REPLACE INTO ETL_WATERMARK VALUES (?, ?, ?, ?);",
+            [[target_table, source_table, key, updated_at] for key, updated_at in partitions],
+        )
+
+
+def table_exists(con, table_name: str) -> bool:
+    """Indique si une table existe dans la base."""
+    result = con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?;", [table_name]
+    ).fetchone()
+    return result[0] > 0
+
+
+def serialize_data(raw_json: str, file_name: str, partition: str = None, raw_data_dir: str = "data/raw_data"):
+
+    """
+    Sérialise et enregistre des données JSON dans le stockage local des données brutes.
     
     Arguments:
     - raw_json (str) : Les données JSON brutes à sérialiser et enregistrer.
     - file_name (str) : Le nom du fichier de destination.
+    - partition (str) : La partition de destination (par défaut la date du jour `%Y-%m-%d`).
+    - raw_data_dir (str) : Le dossier racine des données brutes.
 
 
-    - Crée un dossier dans `data/raw_data/` si ce dernier n'existe pas déjà.
-    - Sauvegarde le contenu JSON (raw_json) dans un fichier dont le nom est spécifié (`file_name`).
-    - Le dossier utilisé pour l'enregistrement est daté en fonction de la date actuelle (`today_date`).
+    - Compresse le contenu JSON (raw_json) et le stocke une seule fois par contenu dans `data/raw_data/objects/`.
+    - Référence le fichier (`file_name`) dans le manifest de la partition `data/raw_data/<partition>/`.
+    - Sans partition explicite, la partition utilisée est datée en fonction de la date actuelle (`today_date`).
 
     """
 
-    today_date = datetime.now().strftime("%Y-%m-%d")
-    
-    if not os.path.exists(f"data/raw_data/{today_date}"):
-        os.makedirs(f"data/raw_data/{today_date}")
-    
-    with open(f"data/raw_data/{today_date}/{file_name}", "w") as fd:
-        fd.write(raw_json)
+    if partition is None:
+        partition = datetime.now().strftime("%Y-%m-%d")
+
+    RawStore(raw_data_dir).write([raw_json.encode()], partition, file_name)
@@ -0,0 +1,26 @@
+"""
+Configuration commune des tests : modules de `src` importables et contexte de pipeline sur une base temporaire.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+from pipeline_context import PipelineContext  # noqa: E402
+
+SQL_STATEMENTS_DIR = os.path.join(ROOT_DIR, "data", "sql_statements")
+
+
+@pytest.fixture
+def ctx(tmp_path):
+    """Contexte de pipeline sur une base DuckDB et un dossier de données brutes temporaires."""
+    with PipelineContext(
+        duckdb_path = str(tmp_path / "mobility_analysis.duckdb"),
+        raw_data_dir = str(tmp_path / "raw_data"),
+        sql_statements_dir = SQL_STATEMENTS_DIR,
+    ) as ctx:
+        yield ctx
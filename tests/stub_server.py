@@ -0,0 +1,57 @@
+"""
+Serveur HTTP local pour les tests d'ingestion : réponses programmées et requêtes reçues enregistrées.
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    """
+    Serveur `http.server` sur un port libre de localhost.
+
+    - `routes` : chemin -> liste de réponses (statut, en-têtes, corps) servies dans l'ordre ;
+      la dernière est répétée une fois la liste épuisée. Un en-tête `Content-Length` fourni remplace la taille du corps
+      (réponse tronquée).
+    - `requests` : (chemin, en-têtes) de chaque requête reçue.
+    - `on_request` : appelé avec le chemin avant chaque réponse (ex. attendre d'autres requêtes en cours).
+    """
+
+    def __init__(self, routes: dict, on_request = None):
+        self.routes = {path: list(responses) for path, responses in routes.items()}
+        self.requests = []
+        self.on_request = on_request
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                stub.requests.append((path, dict(self.headers)))
+                if stub.on_request is not None:
+                    stub.on_request(path)
+                responses = stub.routes.get(path) or [(404, {}, b"")]
+                status, headers, body = responses.pop(0) if len(responses) > 1 else responses[0]
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if "Content-Length" not in headers:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,43 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import duckdb
+
+import backfill
+from benchmark import PARIS_INSEE_CODES, generate_paris_feed, generate_stations
+from feed_adapters import FEED_ADAPTERS
+from raw_store import RawStore
+
+
+def write_paris_partition(raw_data_dir: str, partition: str, stations: list, rng: random.Random):
+    """Partition de données brutes avec un flux Paris synthétique pour les stations données, dans cet ordre."""
+    content = json.dumps(generate_paris_feed(stations, rng, datetime.strptime(partition, "%Y-%m-%d"))).encode()
+    RawStore(raw_data_dir).write([content], partition, FEED_ADAPTERS["paris"]["realtime"]["file_name"])
+
+
+def test_dates_are_loaded_in_order_whatever_the_completion_order(tmp_path, monkeypatch):
+    """La première date finit sa normalisation en dernier : ses stations reçoivent quand même les premiers IDs."""
+    rng = random.Random(0)
+    stations = generate_stations(rng, 10, PARIS_INSEE_CODES, (2.35, 48.86), 1001)
+    new_stations = generate_stations(rng, 5, PARIS_INSEE_CODES, (2.35, 48.86), 2001)
+    raw_data_dir, duckdb_path = str(tmp_path / "raw_data"), str(tmp_path / "mobility_analysis.duckdb")
+    write_paris_partition(raw_data_dir, "2025-12-03", stations, rng)
+    write_paris_partition(raw_data_dir, "2025-12-04", new_stations + stations, rng)
+
+    normalize_date = backfill.normalize_date
+
+    def slow_first_date(raw_data_dir, day, partitions):
+        if day == "2025-12-03":
+            time.sleep(0.5)
+        return normalize_date(raw_data_dir, day, partitions)
+
+    monkeypatch.setattr(backfill, "normalize_date", slow_first_date)
+    monkeypatch.setattr(backfill, "ProcessPoolExecutor", lambda max_workers, mp_context: ThreadPoolExecutor(2))
+    backfill.backfill(raw_data_dir, duckdb_path, max_workers = 2)
+
+    with duckdb.connect(duckdb_path, read_only = True) as con:
+        registry = con.execute("SELECT CODE FROM STATION_KEY_REGISTRY ORDER BY CAST(ID AS INTEGER)").fetchall()
+    assert [code for code, in registry] == [station["code"] for station in stations + new_stations]
@@ -0,0 +1,26 @@
+import threading
+import time
+
+import cli
+
+
+def test_print_only_stages_run_one_after_the_other(ctx, monkeypatch):
+    """Les deux requêtes qui affichent un tableau ne s'exécutent jamais en même temps, même avec plusieurs workers."""
+    running, overlaps = set(), []
+    lock = threading.Lock()
+
+    def fake_run_stage(ctx, name, options, force = False):
+        with lock:
+            if running:
+                overlaps.append((name, set(running)))
+            running.add(name)
+        time.sleep(0.05)
+        with lock:
+            running.discard(name)
+        return True
+
+    monkeypatch.setattr(cli, "run_stage", fake_run_stage)
+    names = ["get_average_bikes_available_per_station", "get_bicycle_dock_availability_by_city"]
+    cli.run_stages(ctx, names, max_workers = 4)
+
+    assert overlaps == []
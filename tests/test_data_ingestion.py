@@ -0,0 +1,156 @@
+import gzip
+import hashlib
+import os
+import threading
+from datetime import datetime
+
+import pytest
+import requests
+
+import data_ingestion
+from stub_server import StubServer
+
+BODY = b'[{"code": "75056", "nom": "Paris", "population": 2100000}]'
+
+
+def feed(server: StubServer, path: str = "/feed", file_name: str = "communes_data.json") -> dict:
+    """Flux pointant vers le serveur local."""
+    return {"url": server.url(path), "file_name": file_name, "timeout": (5, 5)}
+
+
+def reference_feed(server: StubServer, ttl_hours: float) -> dict:
+    """Flux de référence (communes) mis en cache `ttl_hours` heures."""
+    return {**feed(server), "ttl_hours": ttl_hours}
+
+
+def read_manifest_bytes(ctx) -> bytes:
+    with open(f"{ctx.raw_store.partition_path(ctx.partition)}/manifest.json", "rb") as fd:
+        return fd.read()
+
+
+def stored_files(ctx) -> list:
+    """Noms de tous les fichiers du stockage brut."""
+    return [file_name for _, _, files in os.walk(ctx.raw_store.raw_data_dir) for file_name in files]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Délais d'attente demandés entre deux essais (sans attendre)."""
+    delays = []
+    monkeypatch.setattr(data_ingestion.time, "sleep", delays.append)
+    return delays
+
+
+def test_retries_with_exponential_backoff(ctx, sleeps):
+    """Les erreurs HTTP sont relancées avec un délai exponentiel, puis le flux est stocké."""
+    with StubServer({"/feed": [(503, {}, b""), (503, {}, b""), (200, {}, BODY)]}) as server:
+        size = data_ingestion.fetch_feed(feed(server), ctx, requests.Session())
+
+    assert size == len(BODY)
+    assert len(server.requests) == 3
+    assert sleeps == [data_ingestion.BACKOFF_FACTOR, data_ingestion.BACKOFF_FACTOR * 2]
+    assert ctx.raw_hash("communes_data.json") == hashlib.sha256(BODY).hexdigest()
+
+
+def test_gives_up_after_max_retries(ctx, sleeps):
+    """Après `MAX_RETRIES` nouveaux essais, l'erreur est relevée et rien n'est stocké."""
+    with StubServer({"/feed": [(500, {}, b"")]}) as server:
+        with pytest.raises(requests.HTTPError):
+            data_ingestion.fetch_feed(feed(server), ctx, requests.Session())
+
+    assert len(server.requests) == data_ingestion.MAX_RETRIES + 1
+    assert len(sleeps) == data_ingestion.MAX_RETRIES
+    assert not os.path.exists(ctx.raw_store.partition_path(ctx.partition))
+
+
+@pytest.mark.parametrize("status", [400, 403, 404])
+def test_client_error_is_not_retried(ctx, sleeps, status):
+    """Une erreur 4xx (hors 429) ne réussira pas en réessayant : elle est relevée dès la première réponse."""
+    with StubServer({"/feed": [(status, {}, b"")]}) as server:
+        with pytest.raises(requests.HTTPError):
+            data_ingestion.fetch_feed(feed(server), ctx, requests.Session())
+
+    assert len(server.requests) == 1
+    assert sleeps == []
+
+
+def test_too_many_requests_is_retried(ctx, sleeps):
+    """Une réponse 429 est relancée comme une erreur serveur."""
+    with StubServer({"/feed": [(429, {}, b""), (200, {}, BODY)]}) as server:
+        assert data_ingestion.fetch_feed(feed(server), ctx, requests.Session()) == len(BODY)
+
+    assert len(server.requests) == 2
+    assert sleeps == [data_ingestion.BACKOFF_FACTOR]
+
+
+def test_feeds_are_fetched_concurrently(ctx):
+    """Tous les flux sont demandés en même temps : chaque réponse attend que les autres requêtes soient arrivées."""
+    paths = ["/paris", "/nantes", "/communes"]
+    barrier = threading.Barrier(len(paths), timeout = 5)
+    with StubServer({path: [(200, {}, BODY)] for path in paths}, on_request = lambda path: barrier.wait()) as server:
+        feeds = {path.strip("/"): feed(server, path, f"{path.strip('/')}_data.json") for path in paths}
+        written = data_ingestion.ingest_all_feeds(ctx, feeds, session = requests.Session())
+
+    assert written == {name: len(BODY) for name in feeds}
+    assert not barrier.broken
+    assert sorted(ctx.raw_store.read_manifest(ctx.partition)) == sorted(f"{name}_data.json" for name in feeds)
+
+
+def test_failing_feed_keeps_other_feeds(ctx, sleeps):
+    """Un flux en échec fait échouer l'ingestion, mais les flux en succès restent stockés dans la partition."""
+    with StubServer({"/paris": [(200, {}, BODY)], "/nantes": [(503, {}, b"")]}) as server:
+        feeds = {"paris": feed(server, "/paris", "paris_data.json"), "nantes": feed(server, "/nantes", "nantes_data.json")}
+        with pytest.raises(RuntimeError, match = "nantes"):
+            data_ingestion.ingest_all_feeds(ctx, feeds, session = requests.Session())
+
+    assert list(ctx.raw_store.read_manifest(ctx.partition)) == ["paris_data.json"]
+
+
+def test_large_body_is_streamed_to_a_compressed_object(ctx):
+    """Un corps de plusieurs blocs est stocké compressé et intact, sans fichier temporaire restant."""
+    body = os.urandom(5 * data_ingestion.CHUNK_SIZE + 123).hex().encode()
+    with StubServer({"/feed": [(200, {}, body)]}) as server:
+        assert data_ingestion.fetch_feed(feed(server), ctx, requests.Session()) == len(body)
+
+    with gzip.open(ctx.raw_file("communes_data.json"), "rb") as fd:
+        assert fd.read() == body
+    assert not [file_name for file_name in stored_files(ctx) if file_name.endswith(".part")]
+
+
+def test_truncated_body_is_not_stored(ctx, sleeps):
+    """Une réponse coupée avant la fin est relancée puis abandonnée : ni objet, ni fichier temporaire, ni manifest."""
+    with StubServer({"/feed": [(200, {"Content-Length": str(len(BODY) + 100)}, BODY)]}) as server:
+        with pytest.raises(requests.RequestException):
+            data_ingestion.fetch_feed(feed(server), ctx, requests.Session())
+
+    assert len(server.requests) == data_ingestion.MAX_RETRIES + 1
+    assert stored_files(ctx) == []
+
+
+def test_not_modified_reuses_stored_object(ctx, sleeps):
+    """Cache expiré : requête conditionnelle, la réponse 304 réutilise l'objet stocké sans modifier le manifest."""
+    with StubServer({"/feed": [(200, {"ETag": '"v1"'}, BODY), (304, {"ETag": '"v1"'}, b"")]}) as server:
+        assert data_ingestion.fetch_feed(reference_feed(server, ttl_hours = 0), ctx, requests.Session()) == len(BODY)
+        entry = ctx.raw_store.read_manifest(ctx.partition)["communes_data.json"]
+        manifest = read_manifest_bytes(ctx)
+        nb_objects = sum(len(files) for _, _, files in os.walk(ctx.raw_store.objects_dir))
+
+        assert data_ingestion.fetch_feed(reference_feed(server, ttl_hours = 0), ctx, requests.Session()) == 0
+
+    assert server.requests[1][1].get("If-None-Match") == '"v1"'
+    assert read_manifest_bytes(ctx) == manifest
+    assert ctx.raw_store.read_manifest(ctx.partition)["communes_data.json"] == entry
+    assert sum(len(files) for _, _, files in os.walk(ctx.raw_store.objects_dir)) == nb_objects
+
+
+def test_ttl_reuses_stored_object_without_request(ctx, sleeps):
+    """Pendant la durée de validité du cache, aucune requête n'est faite : la nouvelle partition référence le même objet."""
+    with StubServer({"/feed": [(200, {"ETag": '"v1"'}, BODY)]}) as server:
+        data_ingestion.fetch_feed(reference_feed(server, ttl_hours = 24), ctx, requests.Session())
+        entry = ctx.raw_store.read_manifest(ctx.partition)["communes_data.json"]
+
+        ctx.snapshot_time = datetime(2025, 12, 5, 8)
+        assert data_ingestion.fetch_feed(reference_feed(server, ttl_hours = 24), ctx, requests.Session()) == 0
+
+    assert len(server.requests) == 1
+    assert ctx.raw_store.read_manifest(ctx.partition)["communes_data.json"] == entry
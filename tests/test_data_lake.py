@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from data_agregation import agregate_dim_station, build_fact_station_statement
+from data_consolidation import insert_station_statements, insert_stations
+from data_lake import export_lake, open_lake
+from test_station_state import RUN_DATE, load, paris_ctx, stations_df, statements_df  # noqa: F401
+from utils import mark_partition
+
+T8, T9 = datetime(2025, 12, 4, 8), datetime(2025, 12, 4, 9)
+
+CURRENT_STATE_SQL = """
+    SELECT STATION_ID, SOURCE, CITY_ID, BICYCLE_AVAILABLE, SNAPSHOT_TS
+    FROM CURRENT_STATION_STATE
+    ORDER BY ALL
+"""
+
+
+def test_lake_current_state_matches_table_for_two_sources_in_one_city(paris_ctx, tmp_path):
+    """Deux sources d'une même ville à des snapshots différents : la vue du lac garde le dernier snapshot de chaque source, comme la table."""
+    ctx = paris_ctx
+    insert_stations(ctx.con, stations_df(["1", "2"]).assign(SOURCE = "velib2"))
+    load(ctx, T8, {"1": 5, "2": 6, "3": 7})
+    insert_station_statements(ctx.con, statements_df(T9, {"1": 1, "2": 2}).assign(SOURCE = "velib2"), ctx.statement_storage)
+
+    ctx.con.execute("INSERT INTO CONSOLIDATE_CITY VALUES ('75056', 'Paris', 2100000, ?);", [str(RUN_DATE)])
+    mark_partition(ctx.con, "CONSOLIDATE_CITY", RUN_DATE)
+    mark_partition(ctx.con, "CONSOLIDATE_STATION", RUN_DATE)
+    for snapshot_ts in (T8, T9):
+        mark_partition(ctx.con, "CONSOLIDATE_STATION_STATEMENT", snapshot_ts)
+    ctx.run(agregate_dim_station)
+    ctx.run(build_fact_station_statement)
+    ctx.run(export_lake, str(tmp_path / "lake"))
+
+    current_state = ctx.con.execute(CURRENT_STATE_SQL).fetchall()
+    assert len(current_state) == 5
+    with open_lake(str(tmp_path / "lake")) as lake_ctx:
+        assert lake_ctx.con.execute(CURRENT_STATE_SQL).fetchall() == current_state
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+import requests
+
+from data_agregation import create_agregate_tables
+from data_consolidation import consolidate_station_data, consolidate_station_statement_data, create_consolidate_tables
+from data_ingestion import ingest_all_feeds
+from feed_adapters import FEED_ADAPTERS, ingestion_feeds
+from stub_server import StubServer
+
+TOULOUSE_STATIONS = [
+    {
+        "number": 1, "name": "CAPITOLE", "commune": "Toulouse", "insee": "31555", "address": "Place du Capitole",
+        "position": {"lon": 1.4437, "lat": 43.6045}, "bike_stands": 20,
+        "available_bikes": 5, "available_bike_stands": 15, "last_update": "2025-12-04T08:00:00+00:00",
+    },
+    {
+        "number": 2, "name": "JEAN JAURES", "commune": "Toulouse", "insee": "31555", "address": "Allées Jean Jaurès",
+        "position": {"lon": 1.4497, "lat": 43.6062}, "bike_stands": 15,
+        "available_bikes": 0, "available_bike_stands": 15, "last_update": "2025-12-04T07:58:00+00:00",
+    },
+]
+
+
+@pytest.fixture
+def toulouse_adapter(monkeypatch):
+    """Ville ajoutée au registre par une seule entrée, sans autre changement de code, servie par un serveur local."""
+    with StubServer({"/toulouse": [(200, {}, json.dumps(TOULOUSE_STATIONS).encode())]}) as server:
+        monkeypatch.setitem(FEED_ADAPTERS, "toulouse", {
+            "label": "Toulouse",
+            "realtime": {
+                "feed": "toulouse_realtime",
+                "url": server.url("/toulouse"),
+                "file_name": "toulouse_realtime_bicycle_data.json",
+                "timeout": (5, 5),
+            },
+            "localisation": None,
+            "station_columns": {
+                "CODE": "number",
+                "NAME": "name",
+                "CITY_NAME": "commune",
+                "CITY_CODE": "insee",
+                "ADDRESS": "address",
+                "LONGITUDE": "position.lon",
+                "LATITUDE": "position.lat",
+                "CAPACITTY": "bike_stands",
+            },
+            "statement_columns": {
+                "CODE": "number",
+                "BICYCLE_DOCKS_AVAILABLE": "available_bike_stands",
+                "BICYCLE_AVAILABLE": "available_bikes",
+                "LAST_STATEMENT_DATE": "last_update",
+            },
+            "coercions": {
+                "LAST_STATEMENT_DATE": ["datetime"],
+            },
+            "statement_join": "LEFT",
+        })
+        yield server
+
+
+def test_registered_adapter_is_ingested_and_consolidated(ctx, toulouse_adapter):
+    """Une entrée du registre suffit : le flux est ingéré, puis stations et relevés sont consolidés et validés."""
+    feeds = ingestion_feeds()
+    assert feeds["toulouse_realtime"]["url"] == toulouse_adapter.url("/toulouse")
+
+    ctx.run(create_consolidate_tables)
+    ctx.run(create_agregate_tables)
+    ctx.run(ingest_all_feeds, {"toulouse_realtime": feeds["toulouse_realtime"]}, None, requests.Session())
+    ctx.run(consolidate_station_data, ["toulouse"])
+    ctx.run(consolidate_station_statement_data, ["toulouse"])
+
+    con = ctx.con
+    assert con.execute(
+        """
+        SELECT s.CODE, s.NAME, s.CITY_CODE, s.CAPACITTY, k.SOURCE
+        FROM CONSOLIDATE_STATION s
+        JOIN STATION_KEY_REGISTRY k ON k.ID = s.ID
+        ORDER BY s.CODE
+        """
+    ).fetchall() == [("1", "CAPITOLE", "31555", 20, "toulouse"), ("2", "JEAN JAURES", "31555", 15, "toulouse")]
+    assert con.execute(
+        """
+        SELECT k.CODE, ss.BICYCLE_AVAILABLE, ss.BICYCLE_DOCKS_AVAILABLE
+        FROM CONSOLIDATE_STATION_STATEMENT ss
+        JOIN STATION_KEY_REGISTRY k ON k.ID = ss.STATION_ID
+        ORDER BY k.CODE
+        """
+    ).fetchall() == [("1", 5, 15), ("2", 0, 15)]
+    assert con.execute(
+        "SELECT METRIC, NB_ROWS FROM DATA_QUALITY_METRICS WHERE SOURCE = 'toulouse' ORDER BY METRIC"
+    ).fetchall() == [("CHECKED", 2), ("LOADED", 2)]
+    assert con.execute(
+        "SELECT COUNT(*), any_value(CITY_ID) FROM CURRENT_STATION_STATE WHERE SOURCE = 'toulouse'"
+    ).fetchone() == (2, "31555")
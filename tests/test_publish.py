@@ -0,0 +1,18 @@
+import os
+import time
+
+from publish import latest_version, publish_snapshot, published_within
+
+
+def test_published_within_throttles_on_latest_version(ctx, tmp_path):
+    """Une version publiée récemment est détectée ; après l'intervalle, une nouvelle publication est attendue."""
+    publish_dir = str(tmp_path / "published")
+    assert not published_within(60, publish_dir)
+
+    path = publish_snapshot(ctx, publish_dir)
+    assert latest_version(publish_dir) == path
+    assert published_within(60, publish_dir)
+
+    published_at = time.time() - 61 * 60
+    os.utime(f"{publish_dir}/LATEST", (published_at, published_at))
+    assert not published_within(60, publish_dir)
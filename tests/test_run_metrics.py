@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import run_metrics
+
+
+def allocate(ctx, size_mb: int):
+    """Étape qui touche `size_mb` Mo de mémoire."""
+    buffer = bytearray(size_mb * 1024 ** 2)
+    buffer[::4096] = b"\x01" * len(buffer[::4096])
+
+
+def stage_peaks(ctx) -> dict:
+    """Numéro d'étape -> pic de mémoire enregistré dans PIPELINE_RUN_METRICS."""
+    return dict(ctx.con.execute("SELECT STAGE_INDEX, PEAK_RSS_MB FROM PIPELINE_RUN_METRICS ORDER BY STAGE_INDEX").fetchall())
+
+
+def test_peak_rss_is_measured_per_stage(ctx):
+    """Une étape qui suit l'étape la plus gourmande n'hérite pas de son pic de mémoire."""
+    ctx.run(allocate, 1)
+    ctx.run(allocate, 200)
+    ctx.run(allocate, 1)
+
+    peaks = stage_peaks(ctx)
+    assert peaks[2] - peaks[3] > 150
+
+
+def test_counters_are_thread_safe():
+    """Les compteurs alimentés depuis plusieurs threads (ingestion parallèle) ne perdent aucune mise à jour."""
+    metrics = run_metrics.StageMetrics("ingest_all_feeds")
+
+    def record(_):
+        for _ in range(10_000):
+            metrics.add(rows_read = 1, bytes_downloaded = 2)
+
+    with ThreadPoolExecutor(max_workers = 8) as executor:
+        list(executor.map(record, range(8)))
+
+    assert (metrics.rows_read, metrics.bytes_downloaded) == (80_000, 160_000)
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+
+from data_agregation import agregate_dim_station, build_fact_station_statement
+from data_consolidation import insert_station_statements, insert_stations
+from statement_delta import undo_snapshot
+from test_station_state import RUN_DATE, load, paris_ctx, stations_df, statements_df  # noqa: F401
+from utils import mark_partition
+
+T8, T9, T10 = datetime(2025, 12, 4, 8), datetime(2025, 12, 4, 9), datetime(2025, 12, 4, 10)
+
+
+def fact_rows(ctx, snapshots: list) -> list:
+    """(snapshot, code station, vélos disponibles) de FACT_STATION_STATEMENT après chargement des stations et des snapshots."""
+    mark_partition(ctx.con, "CONSOLIDATE_STATION", RUN_DATE)
+    ctx.run(agregate_dim_station)
+    for snapshot_ts in snapshots:
+        mark_partition(ctx.con, "CONSOLIDATE_STATION_STATEMENT", snapshot_ts)
+    ctx.run(build_fact_station_statement)
+    return ctx.con.execute(
+        """
+        SELECT f.SNAPSHOT_TS, k.CODE, f.BICYCLE_AVAILABLE
+        FROM FACT_STATION_STATEMENT f
+        JOIN STATION_KEY_REGISTRY k ON k.ID = f.STATION_ID
+        ORDER BY ALL
+        """
+    ).fetchall()
+
+
+def as_of(ctx, snapshot_ts: datetime) -> dict:
+    """Code station -> vélos disponibles reconstruits par STATION_STATEMENT_AS_OF (stockage delta)."""
+    return dict(ctx.con.execute(
+        """
+        SELECT k.CODE, s.BICYCLE_AVAILABLE
+        FROM STATION_STATEMENT_AS_OF([?]) s
+        JOIN STATION_KEY_REGISTRY k ON k.ID = s.STATION_ID
+        """,
+        [snapshot_ts],
+    ).fetchall())
+
+
+def test_station_leaving_the_feed_gives_same_fact_in_both_storages(paris_ctx):
+    """Une station sortie du flux (puis revenue) donne les mêmes lignes de FACT_STATION_STATEMENT en complet et en delta."""
+    load(paris_ctx, T8, {"1": 5, "2": 6, "3": 7})
+    load(paris_ctx, T9, {"1": 5, "2": 6})
+    load(paris_ctx, T10, {"1": 4, "3": 7})
+
+    assert fact_rows(paris_ctx, [T8, T9, T10]) == [
+        (T8, "1", 5), (T8, "2", 6), (T8, "3", 7),
+        (T9, "1", 5), (T9, "2", 6),
+        (T10, "1", 4), (T10, "3", 7),
+    ]
+
+
+def test_snapshot_loaded_in_several_batches_gives_same_fact(paris_ctx):
+    """Les lots successifs d'un même snapshot (moteur "streaming") ne ferment que les stations absentes de tous les lots."""
+    load(paris_ctx, T8, {"1": 5, "2": 6, "3": 7})
+    load(paris_ctx, T9, {"1": 5})
+    load(paris_ctx, T9, {"3": 2})
+
+    assert fact_rows(paris_ctx, [T8, T9]) == [
+        (T8, "1", 5), (T8, "2", 6), (T8, "3", 7),
+        (T9, "1", 5), (T9, "3", 2),
+    ]
+
+
+@pytest.mark.parametrize("paris_ctx", ["delta"], indirect = True)
+def test_reloaded_snapshot_closes_missing_stations(paris_ctx):
+    """Un snapshot rechargé remplace le précédent chargement : les stations absentes du rechargement sont fermées."""
+    load(paris_ctx, T8, {"1": 5, "2": 6, "3": 7})
+    load(paris_ctx, T9, {"1": 5, "3": 2})
+
+    undo_snapshot(paris_ctx.con, T9, ["paris"])
+    load(paris_ctx, T9, {"1": 5, "2": 1})
+
+    assert as_of(paris_ctx, T8) == {"1": 5, "2": 6, "3": 7}
+    assert as_of(paris_ctx, T9) == {"1": 5, "2": 1}
+
+
+def test_sources_loaded_at_different_snapshots_give_same_fact(paris_ctx):
+    """Un snapshot ne contient que les relevés des sources chargées à ce snapshot, en complet comme en delta."""
+    insert_stations(paris_ctx.con, stations_df(["1", "2"]).assign(SOURCE = "velib2"))
+    load(paris_ctx, T8, {"1": 5, "2": 6})
+    insert_station_statements(paris_ctx.con, statements_df(T9, {"1": 1}).assign(SOURCE = "velib2"), paris_ctx.statement_storage)
+
+    assert [(snapshot_ts, bikes) for snapshot_ts, _, bikes in fact_rows(paris_ctx, [T8, T9])] == [(T8, 5), (T8, 6), (T9, 1)]
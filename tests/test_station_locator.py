@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_agregation import agregate_dim_station
+from station_locator import StationLocator, brute_force_nearest, get_station_locator
+from test_station_state import RUN_DATE, load, paris_ctx  # noqa: F401
+from utils import mark_partition
+
+POINTS = [(2.35, 48.86), (2.22, 48.80), (2.49, 48.93), (2.34, 48.87)]
+
+
+@pytest.fixture(scope = "module")
+def locator():
+    """Index sur des stations synthétiques autour de Paris, dont une partie sans vélo."""
+    rng = np.random.default_rng(0)
+    nb_stations = 2000
+    capacity = rng.integers(10, 40, nb_stations)
+    bikes = rng.integers(0, capacity + 1)
+    return StationLocator(pd.DataFrame({
+        "STATION_ID": [f"S{index}" for index in range(nb_stations)],
+        "CODE": [str(index) for index in range(nb_stations)],
+        "NAME": None,
+        "ADDRESS": None,
+        "CITY_ID": "75056",
+        "LONGITUDE": 2.35 + rng.uniform(-0.15, 0.15, nb_stations),
+        "LATITUDE": 48.86 + rng.uniform(-0.08, 0.08, nb_stations),
+        "CAPACITTY": capacity,
+        "BICYCLE_AVAILABLE": bikes,
+        "BICYCLE_DOCKS_AVAILABLE": capacity - bikes,
+        "SNAPSHOT_TS": pd.Timestamp("2025-12-04 08:00"),
+    }))
+
+
+def brute_force(locator, lon: float, lat: float, k: int, min_bikes: int = 0):
+    """Identifiants et distances des `k` stations retenues les plus proches, par calcul exhaustif."""
+    keep = locator.mask(min_bikes)
+    keep = np.ones(len(locator), dtype = bool) if keep is None else keep
+    positions, distances = brute_force_nearest(
+        locator.stations["LONGITUDE"].to_numpy(), locator.stations["LATITUDE"].to_numpy(), keep, lon, lat, k,
+    )
+    return locator.stations["STATION_ID"].to_numpy()[positions].tolist(), distances
+
+
+@pytest.mark.parametrize("min_bikes", [0, 5])
+def test_nearest_matches_brute_force(locator, min_bikes):
+    """Les k plus proches trouvées par la grille sont celles du calcul exhaustif, dans le même ordre."""
+    for lon, lat in POINTS:
+        found_df = locator.nearest(lon, lat, k = 7, min_bikes = min_bikes)
+        expected_ids, expected_distances = brute_force(locator, lon, lat, 7, min_bikes)
+        assert found_df["STATION_ID"].tolist() == expected_ids
+        assert np.allclose(found_df["DISTANCE_M"], expected_distances)
+        assert (found_df["BICYCLE_AVAILABLE"] >= min_bikes).all()
+
+
+@pytest.mark.parametrize("min_bikes", [0, 5])
+def test_within_matches_brute_force(locator, min_bikes):
+    """Les stations du rayon sont toutes celles du calcul exhaustif à moins de `radius_m`, de la plus proche à la plus éloignée."""
+    for lon, lat in POINTS:
+        found_df = locator.within(lon, lat, 600, min_bikes = min_bikes)
+        expected_ids, expected_distances = brute_force(locator, lon, lat, len(locator), min_bikes)
+        nb_within = int(np.sum(expected_distances <= 600))
+        assert found_df["STATION_ID"].tolist() == expected_ids[:nb_within]
+        assert np.allclose(found_df["DISTANCE_M"], expected_distances[:nb_within])
+
+
+def test_nearest_batch_matches_brute_force(locator):
+    """Chaque point d'un lot a les mêmes stations et rangs qu'une recherche exhaustive."""
+    lon, lat = zip(*POINTS)
+    batch_df = locator.nearest_batch(lon, lat, k = 3, min_bikes = 1)
+    for origin, (point_lon, point_lat) in enumerate(POINTS):
+        origin_df = batch_df[batch_df["ORIGIN"] == origin]
+        expected_ids, expected_distances = brute_force(locator, point_lon, point_lat, 3, min_bikes = 1)
+        assert origin_df["STATION_ID"].tolist() == expected_ids
+        assert origin_df["RANK"].tolist() == [1, 2, 3]
+        assert np.allclose(origin_df["DISTANCE_M"], expected_distances)
+
+
+def test_station_missing_from_latest_snapshot_is_not_indexed(paris_ctx):
+    """Seules les stations de l'état courant sont indexées : une station sortie du flux n'est plus proposée."""
+    mark_partition(paris_ctx.con, "CONSOLIDATE_STATION", RUN_DATE)
+    paris_ctx.run(agregate_dim_station)
+    load(paris_ctx, datetime(2025, 12, 4, 8), {"1": 5, "2": 6, "3": 7})
+    assert sorted(get_station_locator(paris_ctx).nearest(2.35, 48.85, k = 10)["CODE"]) == ["1", "2", "3"]
+
+    load(paris_ctx, datetime(2025, 12, 4, 9), {"1": 1, "2": 0})
+    locator = get_station_locator(paris_ctx)
+    assert len(locator) == 2
+    assert sorted(locator.nearest(2.35, 48.85, k = 10)["CODE"]) == ["1", "2"]
+    assert locator.within(2.35, 48.85, 100, min_bikes = 1)["CODE"].tolist() == ["1"]
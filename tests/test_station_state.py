@@ -0,0 +1,108 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from data_agregation import create_agregate_tables, query_current_availability_by_city
+from data_consolidation import create_consolidate_tables, insert_station_statements, insert_stations
+
+RUN_DATE = date(2025, 12, 4)
+
+
+def stations_df(codes: list) -> pd.DataFrame:
+    """Stations Paris normalisées (colonnes de `data_consolidation.STATION_COLUMNS`)."""
+    return pd.DataFrame({
+        "SOURCE": "paris",
+        "CODE": codes,
+        "NAME": [f"Station {code}" for code in codes],
+        "CITY_NAME": "Paris",
+        "CITY_CODE": "75056",
+        "ADDRESS": None,
+        "LONGITUDE": 2.35,
+        "LATITUDE": 48.85,
+        "STATUS": "OUI",
+        "CREATED_DATE": RUN_DATE,
+        "CAPACITTY": 20,
+    })
+
+
+def statements_df(snapshot_ts: datetime, bikes: dict) -> pd.DataFrame:
+    """Relevés Paris d'un snapshot (`bikes` : code station -> vélos disponibles)."""
+    return pd.DataFrame({
+        "SOURCE": "paris",
+        "CODE": list(bikes),
+        "BICYCLE_DOCKS_AVAILABLE": [20 - nb_bikes for nb_bikes in bikes.values()],
+        "BICYCLE_AVAILABLE": list(bikes.values()),
+        "LAST_STATEMENT_DATE": snapshot_ts,
+        "CREATED_DATE": RUN_DATE,
+        "SNAPSHOT_TS": snapshot_ts,
+    })
+
+
+def current_state(ctx) -> dict:
+    """Code station -> (vélos disponibles, snapshot) de CURRENT_STATION_STATE."""
+    return {
+        code: (nb_bikes, snapshot_ts)
+        for code, nb_bikes, snapshot_ts in ctx.con.execute(
+            """
+            SELECT k.CODE, s.BICYCLE_AVAILABLE, s.SNAPSHOT_TS
+            FROM CURRENT_STATION_STATE s
+            JOIN STATION_KEY_REGISTRY k ON k.ID = s.STATION_ID
+            """
+        ).fetchall()
+    }
+
+
+@pytest.fixture(params = ["full", "delta"])
+def paris_ctx(ctx, request):
+    """Base avec les stations Paris 1 à 4 consolidées et la ville dans DIM_CITY, dans les deux modes de stockage."""
+    ctx.statement_storage = request.param
+    ctx.run(create_consolidate_tables)
+    ctx.run(create_agregate_tables)
+    insert_stations(ctx.con, stations_df(["1", "2", "3", "4"]))
+    ctx.con.execute("INSERT INTO DIM_CITY VALUES ('75056', 'Paris', 2100000);")
+    return ctx
+
+
+def load(ctx, snapshot_ts: datetime, bikes: dict):
+    insert_station_statements(ctx.con, statements_df(snapshot_ts, bikes), ctx.statement_storage)
+
+
+def test_station_missing_from_latest_snapshot_is_dropped(paris_ctx):
+    """Une station absente du dernier snapshot n'est plus dans l'état courant ni dans la disponibilité actuelle."""
+    load(paris_ctx, datetime(2025, 12, 4, 8), {"1": 5, "2": 6, "3": 7})
+    load(paris_ctx, datetime(2025, 12, 4, 9), {"1": 1, "2": 2})
+
+    assert current_state(paris_ctx) == {
+        "1": (1, datetime(2025, 12, 4, 9)),
+        "2": (2, datetime(2025, 12, 4, 9)),
+    }
+    availability = query_current_availability_by_city(paris_ctx, cities = ["paris"])
+    assert availability[["NB_STATIONS", "SUM_BICYCLE_AVAILABLE"]].values.tolist() == [[2, 3]]
+
+
+def test_older_snapshot_does_not_replace_current_state(paris_ctx):
+    """Un snapshot antérieur (backfill) ne remplace pas l'état courant et ne réintroduit pas de station sortie du flux."""
+    load(paris_ctx, datetime(2025, 12, 4, 9), {"1": 1, "2": 2})
+    if paris_ctx.statement_storage == "delta":
+        with pytest.raises(ValueError):
+            load(paris_ctx, datetime(2025, 12, 4, 8), {"1": 5, "2": 6, "3": 7, "4": 8})
+    else:
+        load(paris_ctx, datetime(2025, 12, 4, 8), {"1": 5, "2": 6, "3": 7, "4": 8})
+
+    assert current_state(paris_ctx) == {
+        "1": (1, datetime(2025, 12, 4, 9)),
+        "2": (2, datetime(2025, 12, 4, 9)),
+    }
+
+
+def test_snapshot_loaded_in_several_batches(paris_ctx):
+    """Les lots successifs d'un même snapshot (moteur "streaming") gardent toutes leurs stations."""
+    load(paris_ctx, datetime(2025, 12, 4, 8), {"1": 5, "2": 6, "3": 7})
+    load(paris_ctx, datetime(2025, 12, 4, 9), {"1": 1})
+    load(paris_ctx, datetime(2025, 12, 4, 9), {"3": 3})
+
+    assert current_state(paris_ctx) == {
+        "1": (1, datetime(2025, 12, 4, 9)),
+        "3": (3, datetime(2025, 12, 4, 9)),
+    }